@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Strategy, Game, Round, Tournament, TournamentParticipant, TournamentMatch
+from .models import Strategy, Game, Round, StrategyStats, Tournament, TournamentParticipant, TournamentMatch, TournamentJob
 
 # Register your models here.
 
@@ -26,6 +26,12 @@ class RoundAdmin(admin.ModelAdmin):
     search_fields = ('game__id',)
     readonly_fields = ('created_at',)
 
+@admin.register(StrategyStats)
+class StrategyStatsAdmin(admin.ModelAdmin):
+    list_display = ('strategy', 'total_games', 'total_score', 'avg_score')
+    search_fields = ('strategy__name',)
+    readonly_fields = ('total_games', 'total_score', 'avg_score')
+
 # 注册锦标赛相关模型
 @admin.register(Tournament)
 class TournamentAdmin(admin.ModelAdmin):
@@ -48,3 +54,11 @@ class TournamentMatchAdmin(admin.ModelAdmin):
     list_filter = ('tournament', 'status', 'created_at')
     search_fields = ('tournament__name', 'participant1__strategy__name', 'participant2__strategy__name')
     readonly_fields = ('created_at', 'completed_at')
+
+@admin.register(TournamentJob)
+class TournamentJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tournament', 'status', 'completed_matches', 'total_matches', 
+                   'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('tournament__name',)
+    readonly_fields = ('created_at', 'updated_at', 'started_at', 'finished_at')
@@ -0,0 +1,220 @@
+"""
+锦标赛数据的列式导出（Parquet 或 Arrow IPC 文件），供 pandas / pyarrow 离线分析
+
+每个锦标赛导出三张表，列名和类型固定（见 schemas）：
+    - participants: 每个参赛者一行
+    - matches: 每场比赛一行
+    - moves: 每场比赛的每回合一行（只包含记录了选择序列的比赛），选择为布尔值，True 表示背叛
+比赛通过数据库游标分块读取，每 BATCH_SIZE 场比赛（moves 表每约 MOVE_BATCH_ROWS 回合）写出一个记录批次，
+内存占用与锦标赛的规模无关。
+Arrow IPC 文件可以用 pyarrow.memory_map 直接映射读取。
+
+需要安装 pyarrow（可选依赖），没有安装时抛出 ColumnarExportUnavailable。
+"""
+
+import os
+
+import numpy as np
+
+from .models import TournamentMatch, TournamentParticipant
+
+# 支持的文件格式 -> 文件扩展名
+FILE_FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+TABLES = ('participants', 'matches', 'moves')
+
+# 每个记录批次包含的比赛数量
+BATCH_SIZE = 10000
+
+# moves 表每个记录批次的最大行数（回合数）
+MOVE_BATCH_ROWS = 1_000_000
+
+
+class ColumnarExportUnavailable(Exception):
+    """无法进行列式导出（没有安装 pyarrow）"""
+
+
+def load_pyarrow():
+    """导入 pyarrow，没有安装时抛出 ColumnarExportUnavailable"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ColumnarExportUnavailable("列式导出需要安装 pyarrow：pip install pyarrow")
+    return pyarrow
+
+
+def schemas():
+    """三张表的固定结构"""
+    pa = load_pyarrow()
+    return {
+        'participants': pa.schema([
+            ('tournament_id', pa.int64()),
+            ('participant_id', pa.int64()),
+            ('strategy_id', pa.int64()),
+            ('strategy_name', pa.string()),
+            ('preset_id', pa.string()),
+            ('rank', pa.int32()),
+            ('total_score', pa.float64()),
+            ('average_score', pa.float64()),
+            ('wins', pa.int32()),
+            ('draws', pa.int32()),
+            ('losses', pa.int32()),
+        ]),
+        'matches': pa.schema([
+            ('tournament_id', pa.int64()),
+            ('match_id', pa.int64()),
+            ('repetition', pa.int32()),
+            ('participant1_id', pa.int64()),
+            ('participant2_id', pa.int64()),
+            ('player1_score', pa.float64()),
+            ('player2_score', pa.float64()),
+            ('actual_rounds', pa.int32()),
+            ('status', pa.string()),
+            ('completed_at', pa.timestamp('us', tz='UTC')),
+        ]),
+        'moves': pa.schema([
+            ('match_id', pa.int64()),
+            ('round', pa.int32()),
+            ('player1_defected', pa.bool_()),
+            ('player2_defected', pa.bool_()),
+        ]),
+    }
+
+
+def participant_batches(tournament):
+    """参赛者表只有一个批次"""
+    participants = list(
+        TournamentParticipant.objects.filter(tournament=tournament).select_related('strategy').order_by('id')
+    )
+    yield {
+        'tournament_id': [tournament.id] * len(participants),
+        'participant_id': [p.id for p in participants],
+        'strategy_id': [p.strategy_id for p in participants],
+        'strategy_name': [p.strategy.name for p in participants],
+        'preset_id': [p.strategy.preset_id for p in participants],
+        'rank': [p.rank for p in participants],
+        'total_score': [p.total_score for p in participants],
+        'average_score': [p.average_score for p in participants],
+        'wins': [p.wins for p in participants],
+        'draws': [p.draws for p in participants],
+        'losses': [p.losses for p in participants],
+    }
+
+
+def match_chunks(tournament, include_moves):
+    """按ID顺序通过数据库游标读取比赛，每 BATCH_SIZE 场为一组"""
+    fields = ['id', 'repetition', 'participant1_id', 'participant2_id', 'player1_score', 'player2_score',
+              'actual_rounds', 'status', 'completed_at']
+    if include_moves:
+        fields += ['player1_moves', 'player2_moves']
+    matches = TournamentMatch.objects.filter(tournament=tournament).only(*fields).order_by('id')
+
+    chunk = []
+    for match in matches.iterator(chunk_size=BATCH_SIZE):
+        chunk.append(match)
+        if len(chunk) >= BATCH_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def match_batches(tournament):
+    for chunk in match_chunks(tournament, include_moves=False):
+        yield {
+            'tournament_id': [tournament.id] * len(chunk),
+            'match_id': [m.id for m in chunk],
+            'repetition': [m.repetition for m in chunk],
+            'participant1_id': [m.participant1_id for m in chunk],
+            'participant2_id': [m.participant2_id for m in chunk],
+            'player1_score': [m.player1_score for m in chunk],
+            'player2_score': [m.player2_score for m in chunk],
+            'actual_rounds': [m.actual_rounds for m in chunk],
+            'status': [m.status for m in chunk],
+            'completed_at': [m.completed_at for m in chunk],
+        }
+
+
+def unpack_defections(data, length):
+    """把 engine.pack_moves 压缩的选择序列解压为布尔数组（True 表示背叛）"""
+    bits = np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8), count=length)
+    return bits.astype(bool)
+
+
+def move_batches(tournament):
+    """每回合一行，每批最多约 MOVE_BATCH_ROWS 行；旧数据没有记录选择序列的比赛跳过"""
+    columns = {'match_id': [], 'round': [], 'player1_defected': [], 'player2_defected': []}
+    rows = 0
+    for chunk in match_chunks(tournament, include_moves=True):
+        for m in chunk:
+            if m.player1_moves is None or m.player2_moves is None or not m.actual_rounds:
+                continue
+            columns['match_id'].append(np.full(m.actual_rounds, m.id, dtype=np.int64))
+            columns['round'].append(np.arange(1, m.actual_rounds + 1, dtype=np.int32))
+            columns['player1_defected'].append(unpack_defections(m.player1_moves, m.actual_rounds))
+            columns['player2_defected'].append(unpack_defections(m.player2_moves, m.actual_rounds))
+            rows += m.actual_rounds
+            if rows >= MOVE_BATCH_ROWS:
+                yield {name: np.concatenate(arrays) for name, arrays in columns.items()}
+                columns = {name: [] for name in columns}
+                rows = 0
+    if rows:
+        yield {name: np.concatenate(arrays) for name, arrays in columns.items()}
+
+
+BATCHES = {
+    'participants': participant_batches,
+    'matches': match_batches,
+    'moves': move_batches,
+}
+
+
+def write_table(tournament, table, sink, file_format='parquet'):
+    """
+    把一张表按批写入文件
+
+    参数:
+        tournament: 锦标赛对象
+        table: TABLES 中的表名
+        sink: 文件路径或可写的二进制文件对象
+        file_format: FILE_FORMATS 的键
+
+    返回:
+        写入的行数
+
+    异常:
+        ColumnarExportUnavailable: 没有安装 pyarrow
+    """
+    pa = load_pyarrow()
+    schema = schemas()[table]
+    if file_format == 'parquet':
+        writer = pa.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_file(sink, schema)
+
+    rows = 0
+    try:
+        for columns in BATCHES[table](tournament):
+            batch = pa.RecordBatch.from_pydict(columns, schema=schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
+
+
+def export_tournament(tournament, output_dir, file_format='parquet', tables=TABLES):
+    """
+    把锦标赛的各张表写入目录，文件名为 tournament_<ID>_<表名>.<扩展名>
+
+    返回:
+        {表名: (文件路径, 行数)}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = {}
+    for table in tables:
+        path = os.path.join(output_dir, f'tournament_{tournament.id}_{table}.{FILE_FORMATS[file_format]}')
+        written[table] = (path, write_table(tournament, table, path, file_format))
+    return written
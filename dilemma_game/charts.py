@@ -0,0 +1,203 @@
+"""
+Q-learning结果图表的渲染与缓存
+
+每个图表由 (图表名称, 锦标赛ID, 版本) 确定：学习曲线和Q值热力图的版本是模型文件的修改时间，
+对战结果图的版本是锦标赛的完成时间（锦标赛未完成时不缓存）。渲染好的PNG保存在内存中
+（最近使用的 CHART_CACHE_MEMORY_ITEMS 个）和 CHART_CACHE_DIR 目录中，模型文件更新后版本改变，
+旧的图表不再使用。锦标赛完成时由工作进程预先渲染，网页请求通常只需读取缓存。
+
+渲染函数在 plotting 模块中，只在缓存未命中时导入；matplotlib 的 pyplot 使用全局状态，
+所有渲染都在同一把锁内进行。
+"""
+
+import glob
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from .models import Tournament, TournamentParticipant
+
+logger = logging.getLogger(__name__)
+
+_render_lock = threading.Lock()
+_cache_lock = threading.Lock()
+_memory_cache = OrderedDict()
+
+
+class ChartUnavailable(Exception):
+    """无法生成图表（锦标赛或模型文件不存在等），status 为应返回的HTTP状态码"""
+
+    def __init__(self, message, status=404):
+        super().__init__(message)
+        self.status = status
+
+
+def cache_dir():
+    return getattr(settings, 'CHART_CACHE_DIR', os.path.join('models', 'charts'))
+
+
+def memory_cache_size():
+    return getattr(settings, 'CHART_CACHE_MEMORY_ITEMS', 64)
+
+
+def model_path(tournament_id):
+    """锦标赛的Q-learning模型文件路径，不存在时使用全局模型文件，都不存在时返回None"""
+    model_dir = os.path.join('models')
+    path = os.path.join(model_dir, f'q_learning_model_tournament_{tournament_id}.pkl')
+    if os.path.exists(path):
+        return path
+    path = os.path.join(model_dir, 'q_learning_model.pkl')
+    return path if os.path.exists(path) else None
+
+
+# 图表名称 -> plotting 模块中的渲染函数名
+CHARTS = {
+    'curve': 'render_q_learning_curve',
+    'heatmap': 'render_q_value_heatmap',
+    'vs_opponents': 'render_q_learning_vs_opponents',
+}
+
+
+def renderer(chart):
+    """图表的渲染函数；plotting 模块（及 matplotlib）在第一次渲染时才导入"""
+    from . import plotting
+    return getattr(plotting, CHARTS[chart])
+
+
+def chart_version(chart, tournament_id):
+    """
+    图表的当前版本（纳秒时间戳）
+
+    返回:
+        学习曲线和热力图为模型文件的修改时间，对战结果图为锦标赛的完成时间；
+        模型文件不存在或锦标赛未完成时返回None（不缓存）
+    """
+    if chart == 'vs_opponents':
+        completed_at = Tournament.objects.filter(id=tournament_id, status='COMPLETED').values_list(
+            'completed_at', flat=True
+        ).first()
+        return int(completed_at.timestamp() * 1_000_000) * 1000 if completed_at else None
+
+    path = model_path(tournament_id)
+    if path is None:
+        return None
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def chart_etag(chart, tournament_id, version):
+    return f'"{chart}-{tournament_id}-{version}"'
+
+
+def chart_last_modified(version):
+    return datetime.fromtimestamp(version // 1_000_000_000, tz=dt_timezone.utc)
+
+
+def cache_path(chart, tournament_id, version):
+    return os.path.join(cache_dir(), f'{chart}_tournament_{tournament_id}_{version}.png')
+
+
+def cache_get(key):
+    with _cache_lock:
+        png = _memory_cache.get(key)
+        if png is not None:
+            _memory_cache.move_to_end(key)
+        return png
+
+
+def cache_put(key, png):
+    with _cache_lock:
+        _memory_cache[key] = png
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > memory_cache_size():
+            _memory_cache.popitem(last=False)
+
+
+def write_chart_file(chart, tournament_id, version, png):
+    """写入磁盘缓存，并删除同一图表的旧版本"""
+    path = cache_path(chart, tournament_id, version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(png)
+    os.replace(temp_path, path)
+
+    for old_path in glob.glob(os.path.join(cache_dir(), f'{chart}_tournament_{tournament_id}_*.png')):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+def get_chart(chart, tournament_id, version):
+    """
+    获取图表的PNG，依次查找内存缓存、磁盘缓存，都没有时渲染并写入缓存
+
+    参数:
+        chart: 图表名称（CHARTS 的键）
+        tournament_id: 锦标赛ID
+        version: chart_version 的结果，None 表示直接渲染、不缓存
+
+    异常:
+        ChartUnavailable: 无法生成图表
+    """
+    if version is None:
+        render = renderer(chart)
+        with _render_lock:
+            return render(tournament_id)
+
+    key = (chart, tournament_id, version)
+    png = cache_get(key)
+    if png is not None:
+        return png
+
+    path = cache_path(chart, tournament_id, version)
+    with _render_lock:
+        # 等待锁期间其他请求可能已经渲染了同一个图表
+        png = cache_get(key)
+        if png is not None:
+            return png
+        try:
+            with open(path, 'rb') as f:
+                png = f.read()
+        except OSError:
+            png = renderer(chart)(tournament_id)
+            try:
+                write_chart_file(chart, tournament_id, version, png)
+            except OSError as e:
+                logger.warning(f"无法写入图表缓存 {path}: {e}")
+
+    cache_put(key, png)
+    return png
+
+
+def prerender_charts(tournament_id):
+    """
+    预先渲染锦标赛的所有图表（锦标赛完成时由工作进程调用），没有Q-learning参与者时跳过
+
+    返回:
+        渲染（或已在缓存中）的图表名称列表
+    """
+    if not TournamentParticipant.objects.filter(
+        tournament_id=tournament_id, strategy__preset_id='q_learning'
+    ).exists():
+        return []
+
+    rendered = []
+    for chart in CHARTS:
+        version = chart_version(chart, tournament_id)
+        if version is None:
+            continue
+        try:
+            get_chart(chart, tournament_id, version)
+            rendered.append(chart)
+        except ChartUnavailable as e:
+            logger.info(f"锦标赛 {tournament_id} 的图表 {chart} 无法生成: {e}")
+    return rendered
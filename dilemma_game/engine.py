@@ -0,0 +1,339 @@
+"""
+比赛执行引擎
+
+这里的函数只使用普通的字典和列表，不访问数据库，
+既可以在主进程中调用，也可以在锦标赛的工作进程中执行。
+"""
+
+import logging
+import random
+
+from .moves import append_move, pack_moves, unpack_moves  # noqa: F401  选择序列的压缩格式
+from .native_strategies import NATIVE_STRATEGIES, SandboxedStrategy, create_strategy
+from .sandbox import get_sandbox_pool
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+
+def strategy_spec(strategy):
+    """
+    把 Strategy 对象转换为可以跨进程传递的描述
+
+    参数:
+        strategy: Strategy对象
+
+    返回:
+        策略描述字典
+    """
+    return {
+        'id': strategy.id,
+        'name': strategy.name,
+        'is_preset': bool(strategy.is_preset),
+        'preset_id': strategy.preset_id,
+        # 用户策略的代码在沙箱中执行
+        'code': None if strategy.is_preset else strategy.code,
+    }
+
+
+def create_player(spec, rng=None, tournament_id=None):
+    """
+    根据策略描述为一场比赛创建策略实例
+
+    参数:
+        spec: strategy_spec 返回的策略描述
+        rng: 随机数生成器，默认使用全局 random 模块
+        tournament_id: 当前锦标赛ID，用于Q-learning策略
+
+    返回:
+        BaseStrategy 实例
+    """
+    if spec['is_preset']:
+        return create_strategy(spec['preset_id'], rng=rng, tournament_id=tournament_id)
+    # 用户自定义策略，在沙箱工作进程中执行
+    return SandboxedStrategy(spec['id'], spec['code'], rng=rng, tournament_id=tournament_id)
+
+
+def is_parallel_safe(spec):
+    """判断策略能否在工作进程中执行（不依赖跨比赛共享的进程内状态）"""
+    if not spec['is_preset']:
+        return False
+    strategy_class = NATIVE_STRATEGIES.get(spec['preset_id'])
+    return strategy_class is not None and strategy_class.parallel_safe
+
+
+def is_sandboxed(spec):
+    """判断策略是否为在沙箱中执行的用户策略"""
+    return not spec['is_preset']
+
+
+def is_lockstep_safe(spec):
+    """判断策略能否参与 simulate_matches 的按回合同步执行（不依赖跨比赛共享状态）"""
+    return is_sandboxed(spec) or is_parallel_safe(spec)
+
+
+def execute_move(player, opponent_history):
+    """
+    执行策略，获取下一步动作
+
+    参数:
+        player: 本场比赛的策略实例
+        opponent_history: 对手的历史选择列表
+
+    返回:
+        'C' 或 'D'
+    """
+    try:
+        choice = player.move(opponent_history)
+        if choice in ('C', 'D'):
+            return choice
+        logger.error(f"策略 {player.strategy_id} 返回无效结果: {choice}")
+    except Exception as e:
+        logger.error(f"执行策略 {player.strategy_id} 时出错: {e}")
+
+        # 如果策略执行失败，根据策略类型提供默认行为，而不是总是返回'C'
+        if player.strategy_id == 'always_defect':
+            return 'D'
+        elif player.strategy_id == 'random':
+            return random.choice(['C', 'D'])
+        elif player.strategy_id == 'tit_for_tat':
+            return 'C' if not opponent_history else opponent_history[-1]
+
+    # 如果无法确定默认行为，返回合作
+    return 'C'
+
+
+def match_settings(tournament):
+    """
+    提取执行比赛所需的锦标赛设置
+
+    参数:
+        tournament: Tournament对象
+
+    返回:
+        设置字典
+    """
+    return {
+        'tournament_id': tournament.id,
+        'payoff_matrix': tournament.payoff_matrix,
+        'rounds_per_match': tournament.rounds_per_match,
+        'use_random_rounds': tournament.use_random_rounds,
+        'min_rounds': tournament.min_rounds,
+        'max_rounds': tournament.max_rounds,
+        'use_probability_model': tournament.use_probability_model,
+        'continue_probability': tournament.continue_probability,
+    }
+
+
+def match_seed(tournament_seed, *match_key):
+    """由锦标赛种子和比赛的标识（双方策略、重复次数）得到每场比赛的种子，未设置锦标赛种子时返回None"""
+    if tournament_seed is None:
+        return None
+    return ':'.join(str(part) for part in (tournament_seed,) + match_key)
+
+
+def match_rng(seed):
+    """
+    创建一场比赛使用的随机数生成器
+
+    参数:
+        seed: match_seed 返回的种子
+
+    返回:
+        random.Random 实例，种子为None时使用系统随机源初始化
+    """
+    return random.Random(seed)
+
+
+def draw_match_rounds(settings, rng=random):
+    """
+    按锦标赛设置预先抽取一场比赛的回合数
+
+    参数:
+        settings: match_settings 返回的设置
+        rng: 随机数生成器
+
+    返回:
+        回合数
+    """
+    if settings['use_probability_model']:
+        # 每轮结束后以概率w继续，最多rounds_per_match轮
+        rounds = 0
+        while rounds < settings['rounds_per_match']:
+            rounds += 1
+            if not rng.random() < settings['continue_probability']:
+                break
+        return rounds
+    if settings['use_random_rounds']:
+        return rng.randint(settings['min_rounds'], settings['max_rounds'])
+    return settings['rounds_per_match']
+
+
+def simulate_match(settings, player1_spec, player2_spec, rng=None):
+    """
+    执行一场比赛
+
+    参数:
+        settings: match_settings 返回的设置
+        player1_spec: 玩家1的策略描述
+        player2_spec: 玩家2的策略描述
+        rng: 随机数生成器，默认使用全局 random 模块
+
+    返回:
+        包含双方选择历史和得分的字典
+    """
+    rng = rng if rng is not None else random
+    tournament_id = settings['tournament_id']
+    payoff_matrix = settings['payoff_matrix']
+
+    # 每场比赛使用新的策略实例，状态不会在比赛之间泄漏
+    player1 = create_player(player1_spec, rng=rng, tournament_id=tournament_id)
+    player2 = create_player(player2_spec, rng=rng, tournament_id=tournament_id)
+
+    # 初始化历史记录和分数
+    p1_history = []  # 玩家1历史选择
+    p2_history = []  # 玩家2历史选择
+    p1_score = 0
+    p2_score = 0
+
+    if settings['use_probability_model']:
+        # 使用概率模型，每轮后以概率w决定是否继续，rounds_per_match作为最大回合数
+        rounds_to_play = settings['rounds_per_match']
+        continue_probability = settings['continue_probability']
+    else:
+        # 如果使用随机回合数，则在指定范围内随机生成回合数
+        rounds_to_play = draw_match_rounds(settings, rng)
+        continue_probability = None
+
+    for _ in range(rounds_to_play):
+        # 执行策略获取选择
+        p1_choice = execute_move(player1, p2_history)
+        p2_choice = execute_move(player2, p1_history)
+
+        # 计算分数
+        round_p1_score, round_p2_score = payoff_matrix[p1_choice + p2_choice]
+
+        # 更新历史和总分
+        p1_history.append(p1_choice)
+        p2_history.append(p2_choice)
+        p1_score += round_p1_score
+        p2_score += round_p2_score
+
+        # 确定是否继续下一轮 - 使用概率w
+        if continue_probability is not None and not rng.random() < continue_probability:
+            break
+
+    return {
+        'p1_history': p1_history,
+        'p2_history': p2_history,
+        'p1_score': p1_score,
+        'p2_score': p2_score,
+    }
+
+
+def simulate_matches(settings, matches):
+    """
+    按回合同步执行多场比赛
+
+    所有比赛一起推进，每回合把其中沙箱策略的调用合并成一次 SandboxPool.moves 请求，
+    而不是每一步都单独往返一次。每场比赛的随机数使用顺序与 simulate_match 相同，
+    设置了种子时结果一致。
+
+    参数:
+        settings: match_settings 返回的设置
+        matches: (玩家1策略描述, 玩家2策略描述, 随机数生成器) 的列表
+
+    返回:
+        与 matches 顺序对应的结果字典列表，格式与 simulate_match 相同
+    """
+    tournament_id = settings['tournament_id']
+    payoff_matrix = settings['payoff_matrix']
+    continue_probability = settings['continue_probability'] if settings['use_probability_model'] else None
+
+    games = []
+    for player1_spec, player2_spec, rng in matches:
+        rng = rng if rng is not None else random
+        players = (
+            create_player(player1_spec, rng=rng, tournament_id=tournament_id),
+            create_player(player2_spec, rng=rng, tournament_id=tournament_id),
+        )
+        if continue_probability is not None:
+            rounds_to_play = settings['rounds_per_match']
+        else:
+            rounds_to_play = draw_match_rounds(settings, rng)
+        games.append({
+            'players': players,
+            'rng': rng,
+            'rounds_to_play': rounds_to_play,
+            'histories': ([], []),
+            'scores': [0, 0],
+        })
+
+    active = [game for game in games if game['rounds_to_play'] > 0]
+    while active:
+        # 收集本回合所有沙箱策略的调用，一次请求完成
+        calls = []
+        for game in active:
+            for side, player in enumerate(game['players']):
+                if isinstance(player, SandboxedStrategy):
+                    calls.append(player.sandbox_call(game['histories'][1 - side]))
+        sandboxed_moves = iter(get_sandbox_pool().moves(calls))
+
+        still_active = []
+        for game in active:
+            choices = []
+            for side, player in enumerate(game['players']):
+                if isinstance(player, SandboxedStrategy):
+                    # 沙箱执行失败时默认合作
+                    choices.append(next(sandboxed_moves) or 'C')
+                else:
+                    choices.append(execute_move(player, game['histories'][1 - side]))
+
+            p1_choice, p2_choice = choices
+            round_p1_score, round_p2_score = payoff_matrix[p1_choice + p2_choice]
+            game['histories'][0].append(p1_choice)
+            game['histories'][1].append(p2_choice)
+            game['scores'][0] += round_p1_score
+            game['scores'][1] += round_p2_score
+
+            if len(game['histories'][0]) >= game['rounds_to_play']:
+                continue
+            if continue_probability is not None and not game['rng'].random() < continue_probability:
+                continue
+            still_active.append(game)
+        active = still_active
+
+    return [
+        {
+            'p1_history': game['histories'][0],
+            'p2_history': game['histories'][1],
+            'p1_score': game['scores'][0],
+            'p2_score': game['scores'][1],
+        }
+        for game in games
+    ]
+
+
+def run_match_batch(settings, jobs):
+    """
+    工作进程入口：执行一批比赛
+
+    参数:
+        settings: match_settings 返回的设置
+        jobs: (任务键, 玩家1策略描述, 玩家2策略描述, 种子) 的列表
+
+    返回:
+        (任务键, 玩家1得分, 玩家2得分, 实际回合数, 玩家1压缩选择, 玩家2压缩选择) 的列表
+    """
+    results = []
+    for key, player1_spec, player2_spec, seed in jobs:
+        result = simulate_match(settings, player1_spec, player2_spec, rng=match_rng(seed))
+        results.append((
+            key,
+            result['p1_score'],
+            result['p2_score'],
+            len(result['p1_history']),
+            pack_moves(result['p1_history']),
+            pack_moves(result['p2_history']),
+        ))
+    return results
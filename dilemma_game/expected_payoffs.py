@@ -0,0 +1,223 @@
+"""
+概率模型下比赛期望得分的精确计算
+
+概率模型中每回合结束后以概率 w 继续，最多 N 回合（rounds_per_match），所以第 t 回合
+（从0开始）被执行的概率是 w^t，一场比赛的期望得分为 Σ_{t<N} w^t·E[第 t 回合得分]。
+
+能表示为有限状态机的策略可以直接算出这个和，不需要模拟：
+    - 确定性的记忆型策略（vector_engine 能编译为查找表的策略）：双方都是确定性策略时
+      选择序列是唯一的，模拟一次 N 回合，按 w^t 加权求和；
+    - 随机的一步记忆策略（声明了 defection_probabilities 的策略，如随机、Davis、Joss）：
+      以 (双方最近 n 轮的选择) 为状态构造马尔可夫链，warmup 之前的回合逐回合推进
+      状态分布，之后转移矩阵 M 不变，剩余 K 回合的期望得分为
+      π·Σ_{k<K}(wM)^k·r = π·(I - (wM)^K)·(I - wM)^{-1}·r，只需一次线性方程组求解。
+
+状态数超过 MAX_CHAIN_STATES 的随机对阵以及其他策略仍由模拟执行。
+"""
+
+import numpy as np
+
+from . import vector_engine
+from .native_strategies import NATIVE_STRATEGIES
+
+# 马尔可夫链的最大状态数（双方最近 n 轮选择的组合数 4^n）
+MAX_CHAIN_STATES = 256
+
+# 已构造的策略描述缓存，键为策略ID
+_CHAIN_STRATEGIES = {}
+
+
+class ChainStrategy:
+    """
+    策略在马尔可夫链中的描述，格式与 vector_engine.StrategyTable 相同，
+    只是 tables 中保存的是背叛的概率（确定性策略为0或1）
+    """
+
+    def __init__(self, strategy_id, memory_depth, warmup, uses_own_history, tables, deterministic):
+        self.strategy_id = strategy_id
+        self.memory_depth = memory_depth
+        self.warmup = warmup
+        self.uses_own_history = uses_own_history
+        self.mask = (1 << memory_depth) - 1
+        self.tables = tables
+        self.deterministic = deterministic
+
+    def defection_probability(self, round_index, my_bits, opponent_bits):
+        """根据双方最近的选择位编码，返回一组状态在本回合背叛的概率数组"""
+        table = self.tables[min(round_index, self.warmup)]
+        if self.uses_own_history:
+            return table[((my_bits & self.mask) << self.memory_depth) | (opponent_bits & self.mask)]
+        return table[opponent_bits & self.mask]
+
+
+def chain_strategy(strategy_id):
+    """
+    获取策略的马尔可夫链描述，首次使用时构造并缓存
+
+    参数:
+        strategy_id: 预设策略ID
+
+    返回:
+        ChainStrategy 对象，策略不能表示为有限状态机时返回None
+    """
+    if strategy_id in _CHAIN_STRATEGIES:
+        return _CHAIN_STRATEGIES[strategy_id]
+
+    strategy = None
+    strategy_class = NATIVE_STRATEGIES.get(strategy_id)
+    if vector_engine.is_compilable(strategy_id):
+        table = vector_engine.compile_strategy(strategy_id)
+        strategy = ChainStrategy(
+            strategy_id, table.memory_depth, table.warmup, table.uses_own_history,
+            table.tables.astype(np.float64), deterministic=True
+        )
+    elif strategy_class is not None and strategy_class.defection_probabilities is not None:
+        first, after_cooperate, after_defect = strategy_class.defection_probabilities
+        # 第一回合没有历史（位编码为0），之后按对手上一轮的选择查表
+        tables = np.array([[first, first], [after_cooperate, after_defect]], dtype=np.float64)
+        strategy = ChainStrategy(strategy_id, 1, 1, False, tables, deterministic=False)
+
+    _CHAIN_STRATEGIES[strategy_id] = strategy
+    return strategy
+
+
+def is_analysable(strategy_id):
+    """判断策略能否表示为有限状态机"""
+    return chain_strategy(strategy_id) is not None
+
+
+def can_compute(strategy1_id, strategy2_id):
+    """
+    判断一个对阵的期望得分能否精确计算
+
+    参数:
+        strategy1_id: 玩家1的预设策略ID
+        strategy2_id: 玩家2的预设策略ID
+
+    返回:
+        bool
+    """
+    strategy1 = chain_strategy(strategy1_id)
+    strategy2 = chain_strategy(strategy2_id)
+    if strategy1 is None or strategy2 is None:
+        return False
+    if strategy1.deterministic and strategy2.deterministic:
+        return True
+    return 4 ** max(strategy1.memory_depth, strategy2.memory_depth) <= MAX_CHAIN_STATES
+
+
+def expected_rounds(rounds, continue_probability):
+    """期望回合数 Σ_{t<N} w^t"""
+    return float(np.sum(continue_probability ** np.arange(rounds, dtype=np.float64)))
+
+
+def deterministic_payoffs(pairings, rounds, continue_probability, payoff_matrix):
+    """双方都是确定性策略的对阵：模拟一次选择序列，按每回合被执行的概率加权求和"""
+    player1_scores, player2_scores = vector_engine.play_pairings(pairings, rounds, payoff_matrix)
+    weights = continue_probability ** np.arange(rounds, dtype=np.float64)
+    expected1 = weights @ np.diff(player1_scores, axis=0)
+    expected2 = weights @ np.diff(player2_scores, axis=0)
+    return list(zip(expected1.tolist(), expected2.tolist()))
+
+
+def chain_payoffs(strategy1, strategy2, rounds, continue_probability, payoff_matrix):
+    """
+    用马尔可夫链计算一个对阵的期望得分
+
+    状态为 (玩家1最近 n 轮选择的位编码 << n) | 玩家2最近 n 轮选择的位编码，
+    n 为双方记忆长度的最大值。
+
+    返回:
+        (玩家1期望得分, 玩家2期望得分)
+    """
+    depth = max(strategy1.memory_depth, strategy2.memory_depth)
+    warmup = max(strategy1.warmup, strategy2.warmup)
+    state_count = 4 ** depth
+    history_mask = (1 << depth) - 1
+
+    states = np.arange(state_count)
+    player1_bits = states >> depth
+    player2_bits = states & history_mask
+    player1_payoffs, player2_payoffs = vector_engine.payoff_arrays(payoff_matrix)
+    # 按 (玩家1选择*2 + 玩家2选择) 索引的双方收益，形状 (4, 2)
+    payoffs = np.stack([player1_payoffs, player2_payoffs], axis=1)
+
+    def transition(round_index):
+        """第 round_index 回合的转移矩阵和每个状态的期望收益"""
+        p1 = strategy1.defection_probability(round_index, player1_bits, player2_bits)
+        p2 = strategy2.defection_probability(round_index, player2_bits, player1_bits)
+        matrix = np.zeros((state_count, state_count), dtype=np.float64)
+        rewards = np.zeros((state_count, 2), dtype=np.float64)
+        for move1 in (0, 1):
+            for move2 in (0, 1):
+                probability = (p1 if move1 else 1 - p1) * (p2 if move2 else 1 - p2)
+                next_states = (
+                    (((player1_bits << 1) | move1) & history_mask) << depth
+                ) | (((player2_bits << 1) | move2) & history_mask)
+                np.add.at(matrix, (states, next_states), probability)
+                rewards += probability[:, None] * payoffs[move1 * 2 + move2]
+        return matrix, rewards
+
+    # 第一回合双方都没有历史
+    distribution = np.zeros(state_count, dtype=np.float64)
+    distribution[0] = 1.0
+    expected = np.zeros(2, dtype=np.float64)
+
+    # warmup 之前每回合的查找表不同，逐回合推进状态分布
+    head = min(warmup, rounds)
+    for round_index in range(head):
+        matrix, rewards = transition(round_index)
+        expected += continue_probability ** round_index * (distribution @ rewards)
+        distribution = distribution @ matrix
+
+    remaining = rounds - head
+    if remaining > 0:
+        matrix, rewards = transition(warmup)
+        discounted = continue_probability * matrix
+        if continue_probability < 1:
+            # Σ_{k<K}(wM)^k·r = (I - (wM)^K)·(I - wM)^{-1}·r
+            solution = np.linalg.solve(np.eye(state_count) - discounted, rewards)
+            tail = solution - np.linalg.matrix_power(discounted, remaining) @ solution
+            expected += continue_probability ** head * (distribution @ tail)
+        else:
+            # w = 1 时 I - M 不可逆，直接累加
+            for _ in range(remaining):
+                expected += distribution @ rewards
+                distribution = distribution @ matrix
+
+    return float(expected[0]), float(expected[1])
+
+
+def expected_payoffs(pairings, rounds, continue_probability, payoff_matrix):
+    """
+    精确计算一批对阵在概率模型下的期望得分
+
+    参数:
+        pairings: (玩家1策略ID, 玩家2策略ID) 的列表，每个对阵都满足 can_compute
+        rounds: 最大回合数
+        continue_probability: 每回合结束后继续的概率 w
+        payoff_matrix: 收益矩阵字典
+
+    返回:
+        与 pairings 顺序对应的 (玩家1期望得分, 玩家2期望得分) 列表
+    """
+    results = [None] * len(pairings)
+
+    deterministic = [
+        index for index, (strategy1_id, strategy2_id) in enumerate(pairings)
+        if chain_strategy(strategy1_id).deterministic and chain_strategy(strategy2_id).deterministic
+    ]
+    if deterministic and rounds > 0:
+        payoffs = deterministic_payoffs(
+            [pairings[index] for index in deterministic], rounds, continue_probability, payoff_matrix
+        )
+        for index, payoff in zip(deterministic, payoffs):
+            results[index] = payoff
+
+    for index, (strategy1_id, strategy2_id) in enumerate(pairings):
+        if results[index] is None:
+            results[index] = chain_payoffs(
+                chain_strategy(strategy1_id), chain_strategy(strategy2_id),
+                rounds, continue_probability, payoff_matrix
+            )
+    return results
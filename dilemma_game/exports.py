@@ -0,0 +1,263 @@
+"""
+锦标赛数据的流式导出（CSV 和 JSON Lines）
+
+导出内容依次为锦标赛信息、收益矩阵、参赛者结果、Q-learning模型摘要（有Q-learning参赛者时）
+和所有比赛，可选包含每场比赛双方每回合的选择（'C'/'D' 字符串）。比赛通过数据库游标分块读取
+（QuerySet.iterator），逐行生成输出，内存占用与锦标赛的比赛数量无关。
+"""
+
+import csv
+import json
+import logging
+import os
+
+from .model_store import load_model_data
+from .models import TournamentMatch, TournamentParticipant
+
+logger = logging.getLogger(__name__)
+
+# 支持的导出格式 -> (Content-Type, 文件扩展名)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+
+# 每次从数据库读取的比赛数量
+MATCH_CHUNK_SIZE = 2000
+
+# 合并为一块写出的行数
+LINES_PER_CHUNK = 500
+
+# Q-learning摘要中列出的典型状态（对手最近三轮的选择）
+TYPICAL_STATES = ['CCC', 'CCD', 'CDC', 'CDD', 'DCC', 'DCD', 'DDC', 'DDD']
+
+MATCH_FIELDS = [
+    'match_id', 'repetition', 'participant1_id', 'strategy1_name', 'participant2_id', 'strategy2_name',
+    'player1_score', 'player2_score', 'actual_rounds', 'status', 'completed_at',
+]
+MOVE_FIELDS = ['player1_moves', 'player2_moves']
+
+
+class Echo:
+    """csv.writer 的输出对象：writerow 直接返回写入的字符串，不做缓冲"""
+
+    def write(self, value):
+        return value
+
+
+def participant_rows(tournament):
+    """按排名排列的参赛者结果"""
+    participants = TournamentParticipant.objects.filter(tournament=tournament).select_related('strategy').order_by('rank', 'id')
+    for participant in participants:
+        yield {
+            'participant_id': participant.id,
+            'rank': participant.rank,
+            'strategy_id': participant.strategy_id,
+            'strategy_name': participant.strategy.name,
+            'preset_id': participant.strategy.preset_id,
+            'total_score': participant.total_score,
+            'average_score': participant.average_score,
+            'wins': participant.wins,
+            'draws': participant.draws,
+            'losses': participant.losses,
+        }
+
+
+def q_learning_summary(tournament, participants):
+    """
+    Q-learning参赛者的成绩和本锦标赛模型中典型状态的Q值
+
+    参数:
+        tournament: 锦标赛对象
+        participants: participant_rows 的结果
+
+    返回:
+        字典，没有Q-learning参赛者时返回None；模型文件不存在或无法读取时 q_values 为空列表
+    """
+    participant = next((p for p in participants if p['preset_id'] == 'q_learning'), None)
+    if participant is None:
+        return None
+
+    q_values = []
+    path = os.path.join('models', f'q_learning_model_tournament_{tournament.id}.pkl')
+    if os.path.exists(path):
+        try:
+            q_table = load_model_data(path)['q_table'].to_dict()
+            for state in TYPICAL_STATES:
+                if state in q_table:
+                    c_value = q_table[state]['C']
+                    d_value = q_table[state]['D']
+                    q_values.append({
+                        'state': state, 'C': c_value, 'D': d_value,
+                        'best_action': 'C' if c_value > d_value else 'D',
+                    })
+        except Exception as e:
+            logger.warning(f"无法读取锦标赛 {tournament.id} 的Q-learning模型 {path}: {e}")
+    return {'participant': participant, 'q_values': q_values}
+
+
+def match_rows(tournament, include_moves=False):
+    """
+    按ID顺序逐个生成比赛数据，通过数据库游标分块读取
+
+    参数:
+        tournament: 锦标赛对象
+        include_moves: 为True时包含双方每回合的选择
+
+    返回:
+        生成器，每项为一场比赛的字典（键为 MATCH_FIELDS，包含选择时再加上 MOVE_FIELDS）
+    """
+    # 参赛者数量很少，预先读取策略名称，比赛查询不需要连接其他表
+    strategy_names = dict(
+        TournamentParticipant.objects.filter(tournament=tournament).values_list('id', 'strategy__name')
+    )
+    fields = ['id', 'repetition', 'participant1_id', 'participant2_id', 'player1_score', 'player2_score',
+              'actual_rounds', 'status', 'completed_at']
+    if include_moves:
+        fields += ['player1_moves', 'player2_moves']
+    matches = TournamentMatch.objects.filter(tournament=tournament).only(*fields).order_by('id')
+
+    for match in matches.iterator(chunk_size=MATCH_CHUNK_SIZE):
+        row = {
+            'match_id': match.id,
+            'repetition': match.repetition,
+            'participant1_id': match.participant1_id,
+            'strategy1_name': strategy_names.get(match.participant1_id),
+            'participant2_id': match.participant2_id,
+            'strategy2_name': strategy_names.get(match.participant2_id),
+            'player1_score': match.player1_score,
+            'player2_score': match.player2_score,
+            'actual_rounds': match.actual_rounds,
+            'status': match.status,
+            'completed_at': match.completed_at.isoformat() if match.completed_at else None,
+        }
+        if include_moves:
+            moves = match.get_moves()
+            row['player1_moves'] = ''.join(moves[0]) if moves else None
+            row['player2_moves'] = ''.join(moves[1]) if moves else None
+        yield row
+
+
+def stream_csv(tournament, include_moves=False):
+    """
+    逐行生成CSV：开头是锦标赛信息、收益矩阵、参赛者结果和Q-learning摘要，最后是所有比赛
+    """
+    writer = csv.writer(Echo())
+    payoff_matrix = tournament.payoff_matrix
+
+    # 使用UTF-8 BOM确保Excel正确显示中文
+    yield '\ufeff'
+    yield writer.writerow(['锦标赛名称', tournament.name])
+    yield writer.writerow(['描述', tournament.description])
+    yield writer.writerow(['创建时间', tournament.created_at.strftime('%Y-%m-%d %H:%M')])
+    yield writer.writerow(['完成时间', tournament.completed_at.strftime('%Y-%m-%d %H:%M') if tournament.completed_at else 'N/A'])
+    yield writer.writerow([])
+
+    yield writer.writerow(['收益矩阵'])
+    yield writer.writerow(['', '玩家2合作(C)', '玩家2背叛(D)'])
+    yield writer.writerow(['玩家1合作(C)',
+                           f"{payoff_matrix['CC'][0]}, {payoff_matrix['CC'][1]}",
+                           f"{payoff_matrix['CD'][0]}, {payoff_matrix['CD'][1]}"])
+    yield writer.writerow(['玩家1背叛(D)',
+                           f"{payoff_matrix['DC'][0]}, {payoff_matrix['DC'][1]}",
+                           f"{payoff_matrix['DD'][0]}, {payoff_matrix['DD'][1]}"])
+    yield writer.writerow([])
+
+    participants = list(participant_rows(tournament))
+    yield writer.writerow(['排名', '策略名称', '总分', '平均分', '胜场数', '平局数', '负场数'])
+    for participant in participants:
+        yield writer.writerow([
+            participant['rank'],
+            participant['strategy_name'].split('(')[0].strip(),  # 取策略名称的第一部分
+            f"{participant['total_score']:.1f}",
+            f"{participant['average_score']:.2f}",
+            participant['wins'],
+            participant['draws'],
+            participant['losses'],
+        ])
+
+    summary = q_learning_summary(tournament, participants)
+    if summary:
+        participant = summary['participant']
+        yield writer.writerow([])
+        yield writer.writerow(['Q-learning策略分析'])
+        yield writer.writerow(['排名', participant['rank']])
+        yield writer.writerow(['总分', f"{participant['total_score']:.1f}"])
+        yield writer.writerow(['平均分', f"{participant['average_score']:.2f}"])
+        yield writer.writerow(['胜/平/负', f"{participant['wins']}/{participant['draws']}/{participant['losses']}"])
+        if summary['q_values']:
+            yield writer.writerow([])
+            yield writer.writerow(['典型状态Q值'])
+            yield writer.writerow(['状态', '合作(C)的Q值', '背叛(D)的Q值', '最优动作'])
+            for q in summary['q_values']:
+                yield writer.writerow([q['state'], f"{q['C']:.2f}", f"{q['D']:.2f}", q['best_action']])
+
+    yield writer.writerow([])
+    yield writer.writerow(['比赛'])
+    fields = MATCH_FIELDS + (MOVE_FIELDS if include_moves else [])
+    yield writer.writerow(fields)
+    for row in match_rows(tournament, include_moves):
+        yield writer.writerow([row[field] for field in fields])
+
+
+def stream_jsonl(tournament, include_moves=False):
+    """
+    逐行生成JSON Lines，每行一个对象，type 字段区分 tournament、participant、q_learning 和 match
+    """
+    def line(record_type, data):
+        return json.dumps(dict({'type': record_type}, **data), ensure_ascii=False) + '\n'
+
+    yield line('tournament', {
+        'id': tournament.id,
+        'name': tournament.name,
+        'description': tournament.description,
+        'status': tournament.status,
+        'created_at': tournament.created_at.isoformat(),
+        'completed_at': tournament.completed_at.isoformat() if tournament.completed_at else None,
+        'rounds_per_match': tournament.rounds_per_match,
+        'repetitions': tournament.repetitions,
+        'payoff_matrix': tournament.payoff_matrix,
+    })
+
+    participants = list(participant_rows(tournament))
+    for participant in participants:
+        yield line('participant', participant)
+
+    summary = q_learning_summary(tournament, participants)
+    if summary:
+        yield line('q_learning', {
+            'participant_id': summary['participant']['participant_id'],
+            'q_values': summary['q_values'],
+        })
+
+    for row in match_rows(tournament, include_moves):
+        yield line('match', row)
+
+
+def stream_export(tournament, export_format='csv', include_moves=False):
+    """
+    按格式生成导出内容
+
+    参数:
+        tournament: 锦标赛对象
+        export_format: EXPORT_FORMATS 的键
+        include_moves: 是否包含每回合的选择
+
+    返回:
+        字符串生成器
+    """
+    if export_format == 'jsonl':
+        return join_lines(stream_jsonl(tournament, include_moves))
+    return join_lines(stream_csv(tournament, include_moves))
+
+
+def join_lines(lines, size=LINES_PER_CHUNK):
+    """把逐行生成的字符串每 size 行合并为一块，减少响应写出的次数"""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# 在新的解释器中加载 WSGI 应用和全部URL（与 gunicorn 工作进程处理第一个请求前的工作相同），
+# 并报告是否加载了 matplotlib
+WORKER_BOOT = """
+import sys
+from prisoners_dilemma.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+{extra}
+print('matplotlib' in sys.modules)
+"""
+
+
+class Command(BaseCommand):
+    help = '测试管理命令和WSGI工作进程的启动时间，以及首次渲染图表时导入 matplotlib 的额外耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='每项测试的重复次数，报告中位数')
+
+    def run(self, args, repeat):
+        """在新进程中运行 repeat 次，返回 (耗时中位数, 最后一次的输出)"""
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'prisoners_dilemma.settings'))
+        timings = []
+        output = ''
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable] + args, cwd=settings.BASE_DIR, env=env,
+                capture_output=True, text=True, check=True
+            )
+            timings.append(time.perf_counter() - start)
+            output = result.stdout.strip()
+        return statistics.median(timings), output
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+
+        python_time, _ = self.run(['-c', 'pass'], repeat)
+        check_time, _ = self.run(['manage.py', 'check'], repeat)
+        boot_time, loaded = self.run(['-c', WORKER_BOOT.format(extra='')], repeat)
+        plotting_time, _ = self.run(['-c', WORKER_BOOT.format(extra='import dilemma_game.plotting')], repeat)
+
+        self.stdout.write(f"Python 解释器启动: {python_time * 1000:.0f} ms")
+        self.stdout.write(f"manage.py check: {check_time * 1000:.0f} ms")
+        self.stdout.write(f"WSGI工作进程启动: {boot_time * 1000:.0f} ms（启动时加载 matplotlib: {'是' if loaded == 'True' else '否'}）")
+        self.stdout.write(
+            f"WSGI工作进程启动并导入绘图模块: {plotting_time * 1000:.0f} ms"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"绘图模块推迟到首次渲染图表时导入，每个管理命令和工作进程启动节省约 "
+            f"{(plotting_time - boot_time) * 1000:.0f} ms"
+        ))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from dilemma_game import strategies
+import random
+import time
+
+class Command(BaseCommand):
+    help = '对比预设策略在每步重新编译与使用编译缓存时的执行速度（每秒步数）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--moves', type=int, default=2000, help='每个策略执行的步数')
+        parser.add_argument('--history', type=int, default=200, help='对手历史的最大长度')
+
+    def handle(self, *args, **options):
+        moves = options['moves']
+        history_length = options['history']
+
+        # Q-learning策略会写模型文件，不参与基准测试
+        strategy_ids = [s['id'] for s in strategies.get_all_strategies() if s['id'] != 'q_learning']
+
+        rng = random.Random(0)
+        histories = [
+            [rng.choice(['C', 'D']) for _ in range(i % (history_length + 1))]
+            for i in range(moves)
+        ]
+
+        self.stdout.write(f"策略数量: {len(strategy_ids)}，每个策略 {moves} 步")
+        self.stdout.write(f"{'策略':<24}{'重新编译(步/秒)':>18}{'编译缓存(步/秒)':>18}{'加速比':>10}")
+
+        total_before = 0.0
+        total_after = 0.0
+        for strategy_id in strategy_ids:
+            before = self.measure(strategy_id, histories, cached=False)
+            after = self.measure(strategy_id, histories, cached=True)
+            total_before += moves / before
+            total_after += moves / after
+            self.stdout.write(f"{strategy_id:<24}{before:>18.0f}{after:>18.0f}{after / before:>9.1f}x")
+
+        total_moves = moves * len(strategy_ids)
+        before = total_moves / total_before
+        after = total_moves / total_after
+        self.stdout.write(self.style.SUCCESS(
+            f"总计: 重新编译 {before:.0f} 步/秒，编译缓存 {after:.0f} 步/秒，加速 {after / before:.1f}x"
+        ))
+
+    def measure(self, strategy_id, histories, cached):
+        """返回指定模式下的每秒步数"""
+        strategies.clear_strategy_cache()
+        strategies.STRATEGY_STATES.pop(strategy_id, None)
+
+        start = time.perf_counter()
+        for history in histories:
+            if not cached:
+                # 模拟每一步都重新编译策略代码的旧行为
+                strategies.clear_strategy_cache()
+            strategies.execute_strategy(strategy_id, history)
+        elapsed = time.perf_counter() - start
+
+        strategies.STRATEGY_STATES.pop(strategy_id, None)
+        return len(histories) / elapsed
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from dilemma_game import vector_engine
+from dilemma_game.native_strategies import NATIVE_STRATEGIES
+import random
+import time
+
+class Command(BaseCommand):
+    help = '测试向量化引擎完成一次完整循环赛（所有对阵 × 重复次数）所需的时间'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=20, help='参赛策略数量（不足时循环使用可编译的预设策略）')
+        parser.add_argument('--repetitions', type=int, default=1000, help='每个对阵的重复次数')
+        parser.add_argument('--rounds', type=int, default=200, help='每场比赛的回合数')
+        parser.add_argument('--random-rounds', type=int, default=0,
+                            help='大于0时每场比赛的回合数在 [rounds, rounds + random-rounds] 内随机')
+
+    def handle(self, *args, **options):
+        strategy_ids = [sid for sid in NATIVE_STRATEGIES if vector_engine.is_compilable(sid)]
+        players = [strategy_ids[i % len(strategy_ids)] for i in range(options['players'])]
+        rounds = options['rounds']
+        extra = options['random_rounds']
+        rng = random.Random(0)
+
+        matches = [
+            (p1, p2, rounds + (rng.randint(0, extra) if extra else 0))
+            for _ in range(options['repetitions'])
+            for p1 in players
+            for p2 in players
+        ]
+        payoff_matrix = {"CC": [3, 3], "CD": [0, 5], "DC": [5, 0], "DD": [0, 0]}
+
+        # 编译查找表只在首次使用时进行一次，单独计时
+        start = time.perf_counter()
+        for strategy_id in set(players):
+            vector_engine.compile_strategy(strategy_id)
+        compile_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = vector_engine.play_matches(matches, payoff_matrix)
+        elapsed = time.perf_counter() - start
+
+        total_rounds = sum(m[2] for m in matches)
+        self.stdout.write(f"参赛策略: {len(players)}，比赛场数: {len(results)}，总回合数: {total_rounds}")
+        self.stdout.write(f"查找表编译耗时: {compile_time:.3f} 秒")
+        self.stdout.write(self.style.SUCCESS(
+            f"循环赛耗时: {elapsed:.3f} 秒（{len(results) / elapsed:.0f} 场/秒）"
+        ))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from dilemma_game.q_table import load_q_table
+import glob
+import os
+import pickle
+
+class Command(BaseCommand):
+    help = '把 models/ 目录中以字典保存Q表的旧模型文件转换为NumPy数组格式'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models-dir', default='models', help='模型文件所在目录')
+        parser.add_argument('--dry-run', action='store_true', help='只列出需要转换的文件，不写入')
+
+    def handle(self, *args, **options):
+        paths = sorted(glob.glob(os.path.join(options['models_dir'], '*.pkl')))
+        if not paths:
+            self.stdout.write(self.style.WARNING(f"{options['models_dir']} 中没有模型文件"))
+            return
+
+        converted = 0
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{path}: 无法读取 ({e})"))
+                continue
+
+            # 模型文件保存 {'q_table': ..., 'learning_curve': ...}，最早的模型文件直接保存Q表字典
+            if isinstance(data, dict) and 'q_table' in data:
+                q_table = data['q_table']
+            else:
+                q_table = data
+                data = {'q_table': q_table}
+
+            if not isinstance(q_table, dict) or q_table.get('format') == 'numpy':
+                self.stdout.write(f"{path}: 已是新格式，跳过")
+                continue
+
+            try:
+                table = load_q_table(q_table)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{path}: 无法转换Q表 ({e})"))
+                continue
+
+            self.stdout.write(f"{path}: {len(table)} 个状态，记忆长度 {table.memory_length}")
+            if options['dry_run']:
+                continue
+
+            data['q_table'] = table.to_data()
+            # 先写临时文件再替换，避免留下不完整的模型文件
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                pickle.dump(data, f)
+            os.replace(temp_path, path)
+            converted += 1
+
+        self.stdout.write(self.style.SUCCESS(f"共转换 {converted} 个模型文件"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from dilemma_game.arrow_export import FILE_FORMATS, TABLES, ColumnarExportUnavailable, export_tournament
+from dilemma_game.models import Tournament
+import os
+import time
+
+class Command(BaseCommand):
+    help = '把锦标赛的参赛者、比赛和每回合选择导出为 Parquet 或 Arrow 文件（需要安装 pyarrow）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tournament_id', type=int, help='锦标赛ID')
+        parser.add_argument('--format', choices=sorted(FILE_FORMATS), default='parquet', help='文件格式')
+        parser.add_argument('--output-dir', default=os.path.join('exports'), help='输出目录')
+        parser.add_argument('--no-moves', action='store_true', help='不导出每回合的选择')
+
+    def handle(self, *args, **options):
+        try:
+            tournament = Tournament.objects.get(id=options['tournament_id'])
+        except Tournament.DoesNotExist:
+            raise CommandError(f"找不到ID为{options['tournament_id']}的锦标赛")
+
+        tables = [table for table in TABLES if not (options['no_moves'] and table == 'moves')]
+        start = time.perf_counter()
+        try:
+            written = export_tournament(tournament, options['output_dir'], options['format'], tables)
+        except ColumnarExportUnavailable as e:
+            raise CommandError(str(e))
+
+        for table, (path, rows) in written.items():
+            self.stdout.write(f"  {table}: {rows} 行 -> {path}")
+        self.stdout.write(self.style.SUCCESS(
+            f"锦标赛 {tournament.name} 导出完成，耗时 {time.perf_counter() - start:.1f} 秒"
+        ))
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
-from django.db import connection
+from django.db import connection, transaction
+from dilemma_game.models import Tournament
+from dilemma_game.services import TournamentService
 
 class Command(BaseCommand):
     help = '强制更新锦标赛参赛者的胜负平数据'
@@ -38,30 +40,17 @@ class Command(BaseCommand):
                         cursor.execute("ALTER TABLE dilemma_game_tournamentparticipant ADD COLUMN losses INTEGER DEFAULT 0")
                         self.stdout.write("添加了losses列")
             
-            # 第二步：获取所有参赛者
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT id, tournament_id, strategy_id FROM dilemma_game_tournamentparticipant")
-                participants = cursor.fetchall()
-                
-                self.stdout.write(f"找到 {len(participants)} 个参赛者")
-                
-                # 为每个参赛者设置随机胜负平数据
-                for p_id, t_id, s_id in participants:
-                    # 根据ID生成一些确定性的随机数据
-                    wins = (p_id * 7) % 50 + 30  # 30-79的范围
-                    draws = (p_id * 3) % 30 + 10  # 10-39的范围
-                    losses = (p_id * 5) % 20 + 5  # 5-24的范围
-                    
-                    # 更新数据
-                    cursor.execute(
-                        "UPDATE dilemma_game_tournamentparticipant SET wins = %s, draws = %s, losses = %s WHERE id = %s",
-                        [wins, draws, losses, p_id]
-                    )
+            # 第二步：用已完成的比赛重新计算所有锦标赛参赛者的数据
+            tournaments = Tournament.objects.filter(participants__isnull=False).distinct()
+            self.stdout.write(f"找到 {tournaments.count()} 个锦标赛")
+            
+            with transaction.atomic():
+                for tournament in tournaments:
+                    # 一次聚合查询计算所有参赛者的结果，并批量写回
+                    participants = TournamentService.calculate_results(tournament)
                     
-                    self.stdout.write(f"更新参赛者ID={p_id}: 胜={wins}, 平={draws}, 负={losses}")
-                
-                # 提交事务
-                connection.commit()
+                    for p in participants:
+                        self.stdout.write(f"更新参赛者ID={p.id}: 胜={p.wins}, 平={p.draws}, 负={p.losses}")
             
             self.stdout.write(self.style.SUCCESS("强制更新完成!"))
             
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from dilemma_game.services import LeaderboardService
+
+class Command(BaseCommand):
+    help = '根据所有已完成的游戏重新生成排行榜数据（通常由游戏完成和删除时增量维护，数据被直接修改后使用）'
+
+    def handle(self, *args, **options):
+        count = LeaderboardService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"排行榜数据已重建，共 {count} 个策略"))
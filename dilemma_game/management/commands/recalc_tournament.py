@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
-from dilemma_game.models import Tournament, TournamentParticipant, TournamentMatch
+from dilemma_game.models import Tournament
+from dilemma_game.services import TournamentService
 from django.db import transaction
 
 class Command(BaseCommand):
@@ -19,55 +20,12 @@ class Command(BaseCommand):
         
         self.stdout.write(f"开始重新计算锦标赛 '{tournament.name}' (ID: {tournament.id}) 的胜负平数据...")
         
-        # 获取所有参赛者
-        participants = TournamentParticipant.objects.filter(tournament=tournament)
-        self.stdout.write(f"找到 {participants.count()} 个参赛者")
-        
+        # 一次聚合查询计算所有参赛者的结果，并批量写回
         with transaction.atomic():
-            for p in participants:
-                # 作为玩家1的比赛
-                matches_as_p1 = TournamentMatch.objects.filter(
-                    tournament=tournament,
-                    participant1=p,
-                    status='COMPLETED'
-                )
-                
-                # 作为玩家2的比赛
-                matches_as_p2 = TournamentMatch.objects.filter(
-                    tournament=tournament,
-                    participant2=p,
-                    status='COMPLETED'
-                )
-                
-                # 计算胜负平
-                wins = 0
-                draws = 0
-                losses = 0
-                
-                # 作为玩家1的胜负平
-                for match in matches_as_p1:
-                    if match.player1_score > match.player2_score:
-                        wins += 1
-                    elif match.player1_score < match.player2_score:
-                        losses += 1
-                    else:
-                        draws += 1
-                
-                # 作为玩家2的胜负平
-                for match in matches_as_p2:
-                    if match.player2_score > match.player1_score:
-                        wins += 1
-                    elif match.player2_score < match.player1_score:
-                        losses += 1
-                    else:
-                        draws += 1
-                
-                # 更新参赛者
-                p.wins = wins
-                p.draws = draws
-                p.losses = losses
-                p.save()
-                
-                self.stdout.write(f"参赛者 {p.strategy.name}: 胜={wins}, 平={draws}, 负={losses}")
+            participants = TournamentService.calculate_results(tournament)
+        
+        self.stdout.write(f"找到 {len(participants)} 个参赛者")
+        for p in participants:
+            self.stdout.write(f"参赛者 {p.strategy.name}: 胜={p.wins}, 平={p.draws}, 负={p.losses}")
             
-        self.stdout.write(self.style.SUCCESS(f"锦标赛 '{tournament.name}' 胜负平数据重新计算完成!")) 
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f"锦标赛 '{tournament.name}' 胜负平数据重新计算完成!")) 
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from dilemma_game.models import Tournament, TournamentMatch
+from dilemma_game.services import TournamentService, TournamentJobService
+
+class Command(BaseCommand):
+    help = '继续执行中断的锦标赛，只运行尚未完成的比赛'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tournament_id', nargs='?', type=int, help='锦标赛ID')
+        parser.add_argument('--all', action='store_true', help='继续执行所有进行中的锦标赛')
+        parser.add_argument('--workers', type=int, default=None, help='执行比赛的进程数量，默认使用锦标赛的设置')
+        parser.add_argument('--enqueue', action='store_true', help='加入后台任务队列，而不是在当前进程中执行')
+        parser.add_argument('--force', action='store_true',
+                            help='即使有工作进程正在执行（心跳未过期）也继续，并把它的任务标记为失败')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            tournaments = Tournament.objects.filter(status='IN_PROGRESS')
+        elif options['tournament_id']:
+            tournaments = Tournament.objects.filter(id=options['tournament_id'])
+            if not tournaments.exists():
+                self.stdout.write(self.style.ERROR(f"找不到ID为{options['tournament_id']}的锦标赛"))
+                return
+        else:
+            self.stdout.write(self.style.ERROR('缺少锦标赛ID参数，请提供ID或使用--all继续所有进行中的锦标赛'))
+            return
+
+        if not tournaments.exists():
+            self.stdout.write(self.style.WARNING('没有找到进行中的锦标赛'))
+            return
+
+        for tournament in tournaments:
+            if tournament.status != 'IN_PROGRESS':
+                self.stdout.write(self.style.WARNING(
+                    f"锦标赛 '{tournament.name}' (ID: {tournament.id}) 的状态为 {tournament.status}，跳过"
+                ))
+                continue
+
+            completed = TournamentMatch.objects.filter(tournament=tournament, status='COMPLETED').count()
+            self.stdout.write(f"锦标赛 '{tournament.name}' (ID: {tournament.id}) 已完成 {completed} 场比赛")
+
+            # 排队中的任务和工作进程已经退出（心跳过期）的任务不会再执行，标记为失败
+            interrupted = TournamentJobService.mark_interrupted(tournament, force=options['force'])
+            if interrupted:
+                self.stdout.write(f"  已将 {interrupted} 个中断的任务标记为失败")
+
+            # 工作进程仍在执行时不能再执行一次，否则两个进程会同时写入相同的比赛
+            running = TournamentJobService.running_job(tournament)
+            if running is not None:
+                self.stdout.write(self.style.ERROR(
+                    f"  任务 #{running.id} 正在由工作进程执行，跳过（确认工作进程已经停止时使用 --force）"
+                ))
+                continue
+
+            if options['enqueue']:
+                job = TournamentJobService.enqueue(tournament, workers=options['workers'])
+                self.stdout.write(self.style.SUCCESS(f"  已加入队列，任务ID: {job.id}"))
+                continue
+
+            def report(done, total):
+                if done == total:
+                    self.stdout.write(f"  剩余比赛执行完成: {done}/{total}")
+
+            TournamentService.run_tournament(tournament, progress_callback=report, workers=options['workers'])
+            TournamentJobService.prerender_charts(tournament)
+            self.stdout.write(self.style.SUCCESS(f"  锦标赛 '{tournament.name}' 已完成"))
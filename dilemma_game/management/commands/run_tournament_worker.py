@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from dilemma_game.models import TournamentJob
+from dilemma_game.services import TournamentJobService
+import argparse
+import time
+
+class Command(BaseCommand):
+    help = '本地锦标赛工作进程：从数据库队列中领取并执行锦标赛运行任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='只执行一个任务后退出')
+        parser.add_argument('--exit-when-idle', action='store_true', help='队列为空时退出，而不是继续等待新任务')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='队列为空时的轮询间隔（秒）')
+        parser.add_argument('--lock-fd', type=int, default=None, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        # 持有工作进程锁直到退出，运行期间加入队列的任务不会再自动启动新的工作进程
+        lock_file = TournamentJobService.hold_worker_lock(options['lock_fd'])
+        self.stdout.write("锦标赛工作进程已启动，等待任务...")
+
+        while True:
+            job = TournamentJobService.claim_next_job()
+
+            if job is None:
+                if options['once'] or options['exit_when_idle']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"开始执行任务 #{job.id}（锦标赛 {job.tournament_id}）")
+            job = TournamentJobService.run_job(job)
+
+            if job.status == 'COMPLETED':
+                self.stdout.write(self.style.SUCCESS(
+                    f"任务 #{job.id} 完成，共 {job.completed_matches}/{job.total_matches} 场比赛"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"任务 #{job.id} 失败: {job.error}"))
+
+            if options['once']:
+                break
+
+        if lock_file is not None:
+            lock_file.close()
+            # 释放锁之前加入队列的任务没有启动新的工作进程，释放之后再检查一次
+            if options['exit_when_idle'] and TournamentJob.objects.filter(status='QUEUED').exists():
+                TournamentJobService.start_local_worker()
+        self.stdout.write("锦标赛工作进程已退出")
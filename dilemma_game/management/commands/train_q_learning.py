@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand, CommandError
+from dilemma_game.model_store import load_model_data, write_q_table
+from dilemma_game.native_strategies import QLearningModel
+from dilemma_game.training import train_q_table, training_opponents
+import os
+import time
+
+class Command(BaseCommand):
+    help = '在大量并行环境中与预设策略对局，离线训练Q-learning策略的Q表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--opponents', default=None,
+                            help='逗号分隔的对手策略ID，默认使用除Q-learning外的所有预设策略')
+        parser.add_argument('--environments', type=int, default=4096, help='并行环境数量')
+        parser.add_argument('--episodes', type=int, default=10, help='训练轮数，每轮每个环境进行一场比赛')
+        parser.add_argument('--rounds', type=int, default=200, help='每场比赛的回合数')
+        parser.add_argument('--learning-rate', type=float, default=QLearningModel.learning_rate, help='学习率')
+        parser.add_argument('--discount-factor', type=float, default=QLearningModel.discount_factor, help='折扣因子')
+        parser.add_argument('--exploration-rate', type=float, default=QLearningModel.exploration_rate, help='探索率')
+        parser.add_argument('--memory-length', type=int, default=QLearningModel.memory_length,
+                            help='状态使用的对手历史长度')
+        parser.add_argument('--seed', type=int, default=None, help='随机种子')
+        parser.add_argument('--output', default=os.path.join('models', 'q_learning_pretrained.pkl'),
+                            help='输出的模型文件')
+        parser.add_argument('--resume', action='store_true', help='从输出文件中已有的Q表继续训练')
+
+    def handle(self, *args, **options):
+        available = training_opponents()
+        if options['opponents']:
+            opponents = [sid.strip() for sid in options['opponents'].split(',') if sid.strip()]
+            unknown = [sid for sid in opponents if sid not in available]
+            if unknown:
+                raise CommandError(f"未知的对手策略: {', '.join(unknown)}（可用: {', '.join(available)}）")
+        else:
+            opponents = available
+
+        q_table = None
+        if options['resume'] and os.path.exists(options['output']):
+            q_table = load_model_data(options['output'])['q_table']
+            if q_table.memory_length != options['memory_length']:
+                raise CommandError(
+                    f"{options['output']} 中Q表的记忆长度为 {q_table.memory_length}，"
+                    f"与 --memory-length {options['memory_length']} 不一致"
+                )
+            self.stdout.write(f"从 {options['output']} 继续训练，已有 {len(q_table)} 个状态")
+
+        total_rounds = options['environments'] * options['episodes'] * options['rounds']
+        self.stdout.write(
+            f"对手: {len(opponents)} 个，环境: {options['environments']}，"
+            f"训练轮数: {options['episodes']}，总回合数: {total_rounds}"
+        )
+
+        def report(done, total, mean_reward):
+            self.stdout.write(f"  第 {done}/{total} 轮，平均每回合奖励: {mean_reward:.3f}")
+
+        start = time.perf_counter()
+        q_table, episode_rewards = train_q_table(
+            opponents,
+            environments=options['environments'],
+            episodes=options['episodes'],
+            rounds=options['rounds'],
+            learning_rate=options['learning_rate'],
+            discount_factor=options['discount_factor'],
+            exploration_rate=options['exploration_rate'],
+            memory_length=options['memory_length'],
+            seed=options['seed'],
+            q_table=q_table,
+            progress_callback=report,
+        )
+        elapsed = time.perf_counter() - start
+
+        write_q_table(
+            options['output'], q_table,
+            tournament_id=None,
+            round_counter=total_rounds,
+            training={
+                'opponents': opponents,
+                'environments': options['environments'],
+                'episodes': options['episodes'],
+                'rounds': options['rounds'],
+                'learning_rate': options['learning_rate'],
+                'discount_factor': options['discount_factor'],
+                'exploration_rate': options['exploration_rate'],
+                'seed': options['seed'],
+                'episode_rewards': episode_rewards,
+            },
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"训练完成: {total_rounds} 回合，耗时 {elapsed:.1f} 秒（{total_rounds / elapsed:.0f} 回合/秒），"
+            f"Q表包含 {len(q_table)} 个状态，已保存到 {options['output']}"
+        ))
+        self.stdout.write(
+            "在 settings.py 中设置 Q_LEARNING_PRETRAINED_MODEL 指向该文件，锦标赛中的Q-learning策略将从它开始学习"
+        )
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.3 on 2026-10-17 23:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dilemma_game', '0008_tournamentmatch_actual_rounds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='seed',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='workers',
+            field=models.IntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.3 on 2026-10-17 23:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dilemma_game', '0010_tournamentmatch_moves'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TournamentJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='QUEUED', max_length=20)),
+                ('workers', models.IntegerField(blank=True, null=True)),
+                ('total_matches', models.IntegerField(default=0)),
+                ('completed_matches', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='dilemma_game.tournament')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='dilemma_gam_status_cf0fce_idx')],
+            },
+        ),
+    ]
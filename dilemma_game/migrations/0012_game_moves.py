@@ -0,0 +1,23 @@
+# Generated by Django 4.2.3 on 2026-10-17 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dilemma_game', '0011_tournamentjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='player1_moves',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='player2_moves',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
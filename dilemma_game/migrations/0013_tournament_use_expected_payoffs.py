@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dilemma_game', '0012_game_moves'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='use_expected_payoffs',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.3 on 2026-10-18 00:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_strategy_stats(apps, schema_editor):
+    """根据已完成的游戏生成排行榜数据"""
+    Game = apps.get_model('dilemma_game', 'Game')
+    StrategyStats = apps.get_model('dilemma_game', 'StrategyStats')
+
+    totals = {}
+    completed = Game.objects.filter(status='COMPLETED')
+    for strategy_field, score_field in (('strategy1', 'player1_score'), ('strategy2', 'player2_score')):
+        rows = completed.values(strategy_field).annotate(
+            games=models.Count('id'), score=models.Sum(score_field)
+        )
+        for row in rows:
+            games, score = totals.get(row[strategy_field], (0, 0))
+            totals[row[strategy_field]] = (games + row['games'], score + (row['score'] or 0))
+
+    StrategyStats.objects.bulk_create([
+        StrategyStats(strategy_id=strategy_id, total_games=games, total_score=score, avg_score=score / games)
+        for strategy_id, (games, score) in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dilemma_game', '0013_tournament_use_expected_payoffs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StrategyStats',
+            fields=[
+                ('strategy', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='dilemma_game.strategy')),
+                ('total_games', models.IntegerField(default=0)),
+                ('total_score', models.IntegerField(default=0)),
+                ('avg_score', models.FloatField(default=0.0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-avg_score', 'strategy'], name='strategystats_rank_idx')],
+            },
+        ),
+        migrations.RunPython(populate_strategy_stats, migrations.RunPython.noop),
+    ]
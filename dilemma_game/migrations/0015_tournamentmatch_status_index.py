@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dilemma_game', '0014_strategystats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tournamentmatch',
+            index=models.Index(fields=['tournament', 'status', 'id'], name='match_tournament_status_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.3 on 2026-10-18 00:52
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    """同一锦标赛有多个排队或运行中的任务时，只保留最新的一个，其余标记为失败"""
+    TournamentJob = apps.get_model('dilemma_game', 'TournamentJob')
+    seen = set()
+    duplicates = []
+    for job in TournamentJob.objects.filter(status__in=['QUEUED', 'RUNNING']).order_by('-created_at', '-id'):
+        if job.tournament_id in seen:
+            duplicates.append(job.id)
+        seen.add(job.tournament_id)
+    TournamentJob.objects.filter(id__in=duplicates).update(
+        status='FAILED', error='Duplicate job', finished_at=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dilemma_game', '0015_tournamentmatch_status_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tournamentjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['QUEUED', 'RUNNING'])), fields=('tournament',), name='tournamentjob_one_active_per_tournament'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dilemma_game', '0016_tournamentjob_one_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournamentjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
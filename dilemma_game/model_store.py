@@ -0,0 +1,178 @@
+"""
+Q-learning模型的文件存储
+
+一个模型由三个文件组成：
+    <名称>.pkl      快照：Q表和元数据（回合计数、学习曲线和历史的长度），每次刷新整体替换
+    <名称>.curve    学习曲线：每回合的奖励，每项1字节，只追加
+    <名称>.history  对局历史：每回合 (我的选择, 对手选择)，每项1字节，只追加
+
+模型在运行期间保存在内存中，按设置的间隔和锦标赛完成时刷新。每次刷新只追加
+新增的学习曲线和历史，快照只包含Q表（大小与回合数无关），先写临时文件再替换，
+不会留下不完整的文件。快照中记录的长度之外的日志内容（例如刷新过程中进程退出）
+在读取时被忽略。
+
+旧版本的模型文件把完整的学习曲线和历史保存在同一个 pickle 中，load_model_data 同样可以读取。
+"""
+
+import os
+import pickle
+
+import numpy as np
+
+from .q_table import load_q_table
+
+# 对局历史的编码：第0位为自己的选择、第1位为对手的选择（1表示背叛），对手选择未知时置第2位
+HISTORY_UNKNOWN = 4
+
+
+def encode_history_entry(entry):
+    my_choice, opponent_choice = entry
+    code = 1 if my_choice == 'D' else 0
+    if opponent_choice is None:
+        return code | HISTORY_UNKNOWN
+    return code | (2 if opponent_choice == 'D' else 0)
+
+
+def decode_history_entry(code):
+    my_choice = 'D' if code & 1 else 'C'
+    if code & HISTORY_UNKNOWN:
+        return (my_choice, None)
+    return (my_choice, 'D' if code & 2 else 'C')
+
+
+def write_atomic(path, data):
+    """先写临时文件再替换，避免留下不完整的文件"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        pickle.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def read_log(path, length):
+    """读取日志文件的前 length 项"""
+    if not length or not os.path.exists(path):
+        return np.zeros(0, dtype=np.uint8)
+    with open(path, 'rb') as f:
+        return np.frombuffer(f.read(length), dtype=np.uint8)
+
+
+class QLearningModelStore:
+    """一个Q-learning模型（快照 + 追加日志）的文件"""
+
+    def __init__(self, path):
+        """
+        参数:
+            path: 快照文件路径（.pkl），日志文件与它同名、扩展名不同
+        """
+        self.path = path
+        base = path[:-4] if path.endswith('.pkl') else path
+        self.curve_path = base + '.curve'
+        self.history_path = base + '.history'
+        # 已写入日志的项数，None 表示尚未写入：新模型第一次写入前清空已有的日志
+        self.curve_length = None
+        self.history_length = None
+
+    def append_logs(self, model, close_history=True):
+        """
+        把模型新增的学习曲线和历史追加到日志
+
+        参数:
+            model: QLearningModel 对象
+            close_history: 是否写入最后一项历史；比赛进行中最后一项的对手选择还可能更新，
+                           应留到下一次写入
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if self.curve_length is None:
+            self.truncate_logs(0, 0)
+
+        new_rewards = model.learning_curve[self.curve_length:]
+        if new_rewards:
+            with open(self.curve_path, 'ab') as f:
+                f.write(np.asarray(new_rewards, dtype=np.uint8).tobytes())
+            self.curve_length += len(new_rewards)
+
+        history_end = len(model.history) if close_history else len(model.history) - 1
+        if history_end > self.history_length:
+            with open(self.history_path, 'ab') as f:
+                f.write(bytes(encode_history_entry(entry) for entry in model.history[self.history_length:history_end]))
+            self.history_length = history_end
+
+    def snapshot(self, model):
+        """模型快照（不包含学习曲线和历史本身，只记录它们在日志中的长度）"""
+        return {
+            'q_table': model.q_table.to_data(),
+            'tournament_id': model.tournament_id,
+            'round_counter': model.round_counter,
+            'curve_length': self.curve_length,
+            'history_length': self.history_length,
+        }
+
+    def flush(self, model, close_history=False):
+        """追加日志并替换快照文件"""
+        self.append_logs(model, close_history=close_history)
+        write_atomic(self.path, self.snapshot(model))
+
+    def truncate_logs(self, curve_length, history_length):
+        """把日志截断到指定长度（从检查点恢复时丢弃检查点之后写入的部分）"""
+        for path, length in ((self.curve_path, curve_length), (self.history_path, history_length)):
+            if os.path.exists(path) and os.path.getsize(path) != length:
+                with open(path, 'r+b') as f:
+                    f.truncate(length)
+        self.curve_length = curve_length
+        self.history_length = history_length
+
+    def rewrite_logs(self, model):
+        """丢弃已有日志，按模型的完整学习曲线和历史重新写入（从旧格式的检查点恢复时使用）"""
+        self.truncate_logs(0, 0)
+        self.append_logs(model, close_history=True)
+
+    def read_learning_curve(self, length):
+        return read_log(self.curve_path, length).tolist()
+
+    def read_history(self, length):
+        return [decode_history_entry(code) for code in read_log(self.history_path, length).tolist()]
+
+
+def write_q_table(path, q_table, **metadata):
+    """
+    只写入Q表快照（没有学习曲线和历史），例如离线训练的结果
+
+    参数:
+        path: 快照文件路径
+        q_table: QTable 对象
+        metadata: 一并保存在快照中的其他字段
+    """
+    store = QLearningModelStore(path)
+    store.truncate_logs(0, 0)
+    write_atomic(path, dict(metadata, **{
+        'q_table': q_table.to_data(),
+        'curve_length': 0,
+        'history_length': 0,
+    }))
+
+
+def load_model_data(path):
+    """
+    读取模型文件，兼容旧版本的完整 pickle 和直接保存Q表字典的模型文件
+
+    参数:
+        path: 快照文件路径
+
+    返回:
+        字典，包含 'q_table'（QTable 对象）、'learning_curve'（列表，最早的模型文件中没有），
+        以及旧文件中存在或快照中记录的其他字段
+    """
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+
+    if not isinstance(data, dict) or 'q_table' not in data:
+        # 最早的模型文件直接保存Q表
+        return {'q_table': load_q_table(data)}
+
+    data = dict(data)
+    data['q_table'] = load_q_table(data['q_table'])
+    if 'curve_length' in data:
+        store = QLearningModelStore(path)
+        data['learning_curve'] = store.read_learning_curve(data['curve_length'])
+    return data
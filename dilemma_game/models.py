@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 import json
+from .moves import pack_moves, unpack_moves
 
 class Strategy(models.Model):
     name = models.CharField(max_length=100)
@@ -32,6 +33,19 @@ class Game(models.Model):
     status = models.CharField(max_length=20, choices=GAME_STATUS, default='IN_PROGRESS')
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    # 双方已进行回合的选择，按位压缩存储（格式同 TournamentMatch），长度由 current_round 决定
+    # 为空表示旧数据，需要从 Round 记录重建
+    player1_moves = models.BinaryField(null=True, blank=True)
+    player2_moves = models.BinaryField(null=True, blank=True)
+
+    def get_moves(self):
+        """解压双方的选择历史，没有记录时（旧数据）返回None"""
+        if self.player1_moves is None or self.player2_moves is None:
+            return None
+        return (
+            unpack_moves(self.player1_moves, self.current_round),
+            unpack_moves(self.player2_moves, self.current_round),
+        )
 
     def __str__(self):
         return f"Game {self.id}: {self.strategy1.name} vs {self.strategy2.name}"
@@ -57,6 +71,20 @@ class Round(models.Model):
     def __str__(self):
         return f"Game {self.game.id} - Round {self.round_number}"
 
+class StrategyStats(models.Model):
+    """排行榜数据：每个策略已完成游戏的统计，游戏完成或删除时增量更新"""
+    strategy = models.OneToOneField(Strategy, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_games = models.IntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+    avg_score = models.FloatField(default=0.0)
+
+    class Meta:
+        # 排行榜按平均分降序读取
+        indexes = [models.Index(fields=['-avg_score', 'strategy'], name='strategystats_rank_idx')]
+
+    def __str__(self):
+        return f"{self.strategy_id}: {self.total_games} games, avg {self.avg_score:.2f}"
+
 # 锦标赛模式的新模型
 class Tournament(models.Model):
     TOURNAMENT_STATUS = (
@@ -77,7 +105,14 @@ class Tournament(models.Model):
     use_probability_model = models.BooleanField(default=False)
     # 新增字段，下一轮的继续概率 (0-1之间)
     continue_probability = models.FloatField(default=0.95)
+    # 概率模型下，能表示为有限状态机的对阵直接计算期望得分，而不是模拟
+    use_expected_payoffs = models.BooleanField(default=False)
     repetitions = models.IntegerField(default=5)  # 每场锦标赛重复次数
+    # 随机种子，设置后每场比赛的随机数由种子、双方策略ID和重复次数决定（engine.match_seed），
+    # 与比赛ID无关，结果可复现
+    seed = models.IntegerField(null=True, blank=True)
+    # 执行比赛使用的进程数量，1表示串行执行
+    workers = models.IntegerField(default=1)
     status = models.CharField(max_length=20, choices=TOURNAMENT_STATUS, default='CREATED')
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
@@ -131,9 +166,81 @@ class TournamentMatch(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     actual_rounds = models.IntegerField(default=0)  # 实际进行的回合数
+    # 双方每回合的选择，按位压缩存储（每回合1位，1表示背叛），长度由 actual_rounds 决定
+    player1_moves = models.BinaryField(null=True, blank=True)
+    player2_moves = models.BinaryField(null=True, blank=True)
     
     class Meta:
         unique_together = ['tournament', 'participant1', 'participant2', 'repetition']
+        # 按锦标赛和状态筛选、按ID翻页（比赛列表的游标分页、已完成比赛的抽样）
+        indexes = [models.Index(fields=['tournament', 'status', 'id'], name='match_tournament_status_idx')]
+    
+    def set_moves(self, player1_history, player2_history):
+        """压缩保存双方的选择序列"""
+        self.player1_moves = pack_moves(player1_history)
+        self.player2_moves = pack_moves(player2_history)
+    
+    def get_moves(self):
+        """解压双方的选择序列，没有记录时（旧数据）返回None"""
+        if self.player1_moves is None or self.player2_moves is None:
+            return None
+        return (
+            unpack_moves(self.player1_moves, self.actual_rounds),
+            unpack_moves(self.player2_moves, self.actual_rounds),
+        )
     
     def __str__(self):
         return f"{self.participant1.strategy.name} vs {self.participant2.strategy.name} (Rep {self.repetition})"
+
+class TournamentJob(models.Model):
+    """锦标赛后台运行任务，由本地工作进程（run_tournament_worker 命令）从数据库队列中领取执行"""
+    JOB_STATUS = (
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    )
+    
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default='QUEUED')
+    workers = models.IntegerField(null=True, blank=True)  # 执行比赛的进程数量，为空时使用锦标赛的设置
+    total_matches = models.IntegerField(default=0)  # 需要执行的比赛数
+    completed_matches = models.IntegerField(default=0)  # 已完成的比赛数
+    error = models.TextField(blank=True)  # 失败原因
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # 执行任务的工作进程定期更新，长时间没有更新的运行中任务视为工作进程已退出
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+        constraints = [
+            # 每个锦标赛同时最多一个排队或运行中的任务，并发加入队列时只有一个请求成功
+            models.UniqueConstraint(
+                fields=['tournament'], condition=models.Q(status__in=['QUEUED', 'RUNNING']),
+                name='tournamentjob_one_active_per_tournament',
+            ),
+        ]
+    
+    @property
+    def progress(self):
+        """完成百分比"""
+        if self.status == 'COMPLETED':
+            return 100.0
+        if not self.total_matches:
+            return 0.0
+        return self.completed_matches / self.total_matches * 100
+    
+    @property
+    def eta_seconds(self):
+        """按目前的执行速度估算的剩余秒数，无法估算时返回None"""
+        if self.status != 'RUNNING' or not self.started_at or not self.completed_matches:
+            return None
+        elapsed = (self.updated_at - self.started_at).total_seconds()
+        remaining = self.total_matches - self.completed_matches
+        return max(0.0, elapsed / self.completed_matches * remaining)
+    
+    def __str__(self):
+        return f"Job #{self.id} for {self.tournament.name} ({self.get_status_display()})"
@@ -0,0 +1,52 @@
+"""
+选择序列的按位压缩存储
+
+models 在应用启动时导入这里的函数，这个模块不能依赖比赛引擎（及其导入的 NumPy）。
+"""
+
+
+def pack_moves(moves):
+    """
+    把选择序列按位压缩，每回合1位（1表示背叛），按回合顺序从每个字节的最高位开始填充
+
+    参数:
+        moves: 'C'/'D' 列表
+
+    返回:
+        bytes，长度为 ceil(回合数 / 8)
+    """
+    data = bytearray((len(moves) + 7) // 8)
+    for index, move in enumerate(moves):
+        if move == 'D':
+            data[index >> 3] |= 0x80 >> (index & 7)
+    return bytes(data)
+
+
+def append_move(packed, index, move):
+    """
+    把第 index 回合（从0开始）的选择追加到 bytearray 形式的压缩序列中，格式与 pack_moves 相同
+
+    参数:
+        packed: 已压缩的前 index 回合选择
+        index: 回合序号
+        move: 'C' 或 'D'
+    """
+    if index >> 3 >= len(packed):
+        packed.append(0)
+    if move == 'D':
+        packed[index >> 3] |= 0x80 >> (index & 7)
+
+
+def unpack_moves(data, length):
+    """
+    还原 pack_moves 压缩的选择序列
+
+    参数:
+        data: 压缩后的字节串
+        length: 回合数
+
+    返回:
+        'C'/'D' 列表
+    """
+    data = bytes(data)
+    return ['D' if data[index >> 3] & (0x80 >> (index & 7)) else 'C' for index in range(length)]
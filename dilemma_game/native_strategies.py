@@ -0,0 +1,761 @@
+"""
+预设策略的原生Python实现
+
+strategies.py 中的 PRESET_STRATEGIES 仍然保存策略源码，用于展示和用户复制；
+实际对局使用这里的策略类。每场比赛创建新的策略实例，状态保存在实例上，
+比赛之间互不影响，因此每场比赛都是独立的、可并行执行的单元。
+"""
+
+import os
+import pickle
+import random
+import time
+import weakref
+
+from .model_store import QLearningModelStore, load_model_data, write_atomic
+from .q_table import EMPTY_STATE, QTable, load_q_table
+from .sandbox import get_sandbox_pool
+from .strategies import execute_strategy
+
+
+class BaseStrategy:
+    """
+    策略基类（类似 game.py 中的 Strategy）
+
+    子类实现 move()，需要跨回合保存的状态在 reset() 中初始化。
+    """
+
+    # 对应 PRESET_STRATEGIES 中的策略ID
+    strategy_id = None
+
+    # 向量化引擎（vector_engine）使用的查找表描述：
+    # memory_depth 为 n 时表示策略是确定性的，并且在对局历史长度不少于 warmup 之后
+    # 只取决于最近 n 轮的选择；warmup 之前只取决于已进行的回合数和最近 n 轮的选择。
+    # memory_depth 为 None 表示无法编译为查找表。
+    memory_depth = None
+    warmup = None
+    # 查找表是否需要自己的历史（默认只使用对手的历史）
+    uses_own_history = False
+
+    # 随机的一步记忆策略（只取决于对手上一轮的选择）的背叛概率：
+    # (第一回合, 对手上一轮合作后, 对手上一轮背叛后)，用于 expected_payoffs 精确计算期望得分
+    defection_probabilities = None
+
+    # 能否在锦标赛的工作进程中执行；依赖跨比赛共享状态的策略必须在主进程中按顺序执行
+    parallel_safe = True
+
+    def __init__(self, rng=None, tournament_id=None):
+        """
+        参数:
+            rng: 随机数生成器（random.Random 实例），默认使用全局 random 模块
+            tournament_id: 当前锦标赛ID
+        """
+        self.rng = rng if rng is not None else random
+        self.tournament_id = tournament_id
+        self.reset()
+
+    def reset(self):
+        """重置策略的内部状态，在每场比赛开始前调用"""
+        pass
+
+    def move(self, opponent_history):
+        """
+        根据对手历史选择下一步动作
+
+        参数:
+            opponent_history: 对手历史选择的列表
+
+        返回:
+            'C' 表示合作，'D' 表示背叛
+        """
+        raise NotImplementedError("Subclasses must implement move()")
+
+    @classmethod
+    def lookup(cls, round_index, my_window, opponent_window):
+        """
+        查找表中一个条目的选择，由向量化引擎在编译时调用
+
+        参数:
+            round_index: 回合序号（从0开始，已截断到 warmup）
+            my_window: 自己最近的选择（最多 memory_depth 个）
+            opponent_window: 对手最近的选择（最多 memory_depth 个）
+
+        返回:
+            'C' 或 'D'
+        """
+        # 更早的回合不影响选择，用合作填充到实际的历史长度
+        history = ['C'] * (round_index - len(opponent_window)) + list(opponent_window)
+        return cls().move(history)
+
+    def replay(self, my_history, opponent_history):
+        """
+        根据已有的对局记录恢复内部状态（例如进程重启后继续一场游戏）
+
+        参数:
+            my_history: 自己历史选择的列表
+            opponent_history: 对手历史选择的列表
+        """
+        self.reset()
+        for round_index in range(len(my_history)):
+            self.move(opponent_history[:round_index])
+
+
+class AlwaysCooperate(BaseStrategy):
+    strategy_id = 'always_cooperate'
+    memory_depth = 0
+
+    def move(self, opponent_history):
+        return 'C'
+
+
+class AlwaysDefect(BaseStrategy):
+    strategy_id = 'always_defect'
+    memory_depth = 0
+
+    def move(self, opponent_history):
+        return 'D'
+
+
+class TitForTat(BaseStrategy):
+    strategy_id = 'tit_for_tat'
+    memory_depth = 1
+
+    def move(self, opponent_history):
+        if not opponent_history:
+            return 'C'
+        return opponent_history[-1]
+
+
+class SuspiciousTitForTat(BaseStrategy):
+    strategy_id = 'suspicious_tit_for_tat'
+    memory_depth = 1
+
+    def move(self, opponent_history):
+        if not opponent_history:
+            return 'D'
+        return opponent_history[-1]
+
+
+class RandomStrategy(BaseStrategy):
+    strategy_id = 'random'
+    defection_probabilities = (0.5, 0.5, 0.5)
+
+    def move(self, opponent_history):
+        return self.rng.choice(['C', 'D'])
+
+
+class Grudger(BaseStrategy):
+    strategy_id = 'grudger'
+    memory_depth = 1
+    uses_own_history = True
+
+    def move(self, opponent_history):
+        if 'D' in opponent_history:
+            return 'D'
+        return 'C'
+
+    @classmethod
+    def lookup(cls, round_index, my_window, opponent_window):
+        # 我只会在对手背叛之后背叛，所以"对手曾经背叛"等价于
+        # "我上一轮背叛或对手上一轮背叛"
+        if 'D' in my_window or 'D' in opponent_window:
+            return 'D'
+        return 'C'
+
+
+class Pavlov(BaseStrategy):
+    strategy_id = 'pavlov'
+    memory_depth = 2
+
+    def move(self, opponent_history):
+        if not opponent_history:
+            return 'C'
+        if len(opponent_history) == 1:
+            return opponent_history[0]
+        # 预设代码用对手上上轮的选择推断自己上一轮的选择，
+        # 因此规则等价于：对手最近两轮选择相同则合作，否则背叛
+        if opponent_history[-1] == opponent_history[-2]:
+            return 'C'
+        return 'D'
+
+
+class TitForTwoTats(BaseStrategy):
+    strategy_id = 'tit_for_two_tats'
+    memory_depth = 2
+
+    def move(self, opponent_history):
+        if len(opponent_history) >= 2 and opponent_history[-1] == 'D' and opponent_history[-2] == 'D':
+            return 'D'
+        return 'C'
+
+
+class TwoMemory(BaseStrategy):
+    strategy_id = 'two_memory'
+    memory_depth = 2
+
+    def move(self, opponent_history):
+        if len(opponent_history) < 2:
+            return 'C'
+        if opponent_history[-1] == 'C' and opponent_history[-2] == 'C':
+            return 'C'
+        return 'D'
+
+
+class Davis(BaseStrategy):
+    strategy_id = 'davis'
+    defection_probabilities = (0.05, 0.05, 0.95)
+
+    def move(self, opponent_history):
+        # 10%概率随机选择
+        if self.rng.random() < 0.1:
+            return self.rng.choice(['C', 'D'])
+        if not opponent_history:
+            return 'C'
+        return opponent_history[-1]
+
+
+class Joss(BaseStrategy):
+    strategy_id = 'joss'
+    defection_probabilities = (0.1, 0.1, 1.0)
+
+    def move(self, opponent_history):
+        # 10%的几率随机背叛
+        if self.rng.random() < 0.1:
+            return 'D'
+        if not opponent_history:
+            return 'C'
+        return opponent_history[-1]
+
+
+class Tullock(BaseStrategy):
+    strategy_id = 'tullock'
+
+    def move(self, opponent_history):
+        # 前11轮合作
+        if len(opponent_history) < 11:
+            return 'C'
+        if 'D' in opponent_history:
+            return 'D'
+        return 'C'
+
+
+class Nydegger(BaseStrategy):
+    strategy_id = 'nydegger'
+    memory_depth = 3
+
+    def move(self, opponent_history):
+        if not opponent_history:
+            return 'C'
+        if len(opponent_history) == 1:
+            return 'D'
+        if len(opponent_history) == 2:
+            return 'D' if opponent_history[0] == 'D' else 'C'
+
+        # 根据对手前三轮的选择计算状态索引
+        history_index = 0
+        if opponent_history[-3] == 'D':
+            history_index += 4
+        if opponent_history[-2] == 'D':
+            history_index += 2
+        if opponent_history[-1] == 'D':
+            history_index += 1
+
+        # 对应状态 CCC, CDC, DCC, DDC 时合作
+        if history_index in (0, 2, 4, 6):
+            return 'C'
+        return 'D'
+
+
+class Grofman(BaseStrategy):
+    strategy_id = 'grofman'
+
+    def move(self, opponent_history):
+        if len(opponent_history) < 2:
+            return 'C'
+
+        cooperation_ratio = opponent_history.count('C') / len(opponent_history)
+        if cooperation_ratio > 0.7:
+            return 'C'
+        elif self.rng.random() < cooperation_ratio:
+            return 'C'
+        return 'D'
+
+
+class Shubik(BaseStrategy):
+    strategy_id = 'shubik'
+
+    def reset(self):
+        self.retaliation_count = 0  # 当前需要进行的报复次数
+        self.betrayals = 0  # 对手背叛的次数
+
+    def move(self, opponent_history):
+        if not opponent_history:
+            return 'C'
+
+        # 对手的每次新背叛触发更长时间的报复
+        if opponent_history[-1] == 'D':
+            self.betrayals += 1
+            self.retaliation_count = self.betrayals
+
+        if self.retaliation_count > 0:
+            self.retaliation_count -= 1
+            return 'D'
+        return 'C'
+
+
+class SteinAndRapoport(BaseStrategy):
+    strategy_id = 'stein_and_rapoport'
+
+    def reset(self):
+        self.is_opponent_tft = False
+
+    def move(self, opponent_history):
+        # 前四轮按照特定模式行动: CDCD
+        if len(opponent_history) < 4:
+            return 'C' if len(opponent_history) % 2 == 0 else 'D'
+
+        # 第五轮检查对手是否是针锋相对策略
+        if len(opponent_history) == 4:
+            self.is_opponent_tft = (
+                opponent_history[1] == 'C' and
+                opponent_history[2] == 'D' and
+                opponent_history[3] == 'C'
+            )
+
+        # 如果检测到对手是针锋相对，则利用它
+        if self.is_opponent_tft:
+            return 'D'
+        return opponent_history[-1]
+
+
+class Downing(BaseStrategy):
+    strategy_id = 'downing'
+
+    def reset(self):
+        self.cooperation_after_c = 0  # 对手在我合作后的合作次数
+        self.cooperation_after_d = 0  # 对手在我背叛后的合作次数
+        self.defection_after_c = 0    # 对手在我合作后的背叛次数
+        self.defection_after_d = 0    # 对手在我背叛后的背叛次数
+        self.my_last_move = None      # 我上一轮的选择
+
+    def move(self, opponent_history):
+        # 前两轮背叛以收集信息
+        if len(opponent_history) < 2:
+            self.my_last_move = 'D'
+            return 'D'
+
+        # 更新对手行为统计
+        last_opponent_move = opponent_history[-1]
+        if self.my_last_move == 'C':
+            if last_opponent_move == 'C':
+                self.cooperation_after_c += 1
+            else:
+                self.defection_after_c += 1
+        else:
+            if last_opponent_move == 'C':
+                self.cooperation_after_d += 1
+            else:
+                self.defection_after_d += 1
+
+        p_cooperate_after_c = self.cooperation_after_c / max(1, self.cooperation_after_c + self.defection_after_c)
+        p_cooperate_after_d = self.cooperation_after_d / max(1, self.cooperation_after_d + self.defection_after_d)
+
+        # 如果对手在我合作后更可能合作，则选择合作
+        self.my_last_move = 'C' if p_cooperate_after_c >= p_cooperate_after_d else 'D'
+        return self.my_last_move
+
+
+class Graaskamp(BaseStrategy):
+    strategy_id = 'graaskamp'
+    memory_depth = 8
+    warmup = 10
+
+    def move(self, opponent_history):
+        # 初始几轮偶数轮合作，奇数轮背叛
+        if len(opponent_history) < 10:
+            return 'C' if len(opponent_history) % 2 == 0 else 'D'
+
+        # 检查对手最近的行为是否有2-4轮的周期
+        for period in range(2, 5):
+            is_periodic = True
+            for i in range(period):
+                if opponent_history[-(i + 1)] != opponent_history[-(i + 1 + period)]:
+                    is_periodic = False
+                    break
+
+            if is_periodic:
+                # 预期对手会合作则背叛，预期对手会背叛则合作
+                next_expected = opponent_history[-period]
+                return 'D' if next_expected == 'C' else 'C'
+
+        # 没有检测到明确模式，使用针锋相对
+        return opponent_history[-1]
+
+
+class TidemanAndChieruzzi(BaseStrategy):
+    strategy_id = 'tideman_and_chieruzzi'
+
+    def reset(self):
+        self.punishment_active = False
+        self.punishment_left = 0
+
+    def move(self, opponent_history):
+        if not opponent_history:
+            return 'C'
+
+        defections = opponent_history.count('D')
+        if defections == 0:
+            return 'C'
+
+        # 背叛率超过40%且每检测到8次背叛，连续惩罚5轮
+        if defections / len(opponent_history) > 0.4 and defections % 8 == 0:
+            self.punishment_active = True
+            self.punishment_left = 5
+
+        if self.punishment_active:
+            if self.punishment_left > 0:
+                self.punishment_left -= 1
+                return 'D'
+            self.punishment_active = False
+
+        return opponent_history[-1]
+
+
+class QLearningModel:
+    """
+    Q-learning策略在一场锦标赛内共享的模型
+
+    Q表和学习曲线在同一锦标赛的所有比赛之间共享（学习效果需要跨比赛累积），
+    而每场比赛的对局历史保存在各自的 QLearning 实例上。
+    模型在内存中更新，按 flush_seconds 间隔和锦标赛完成时写入 QLearningModelStore。
+    """
+
+    learning_rate = 0.1
+    discount_factor = 0.95
+    exploration_rate = 0.1
+    memory_length = 3
+
+    def __init__(self, tournament_id=None):
+        self.tournament_id = tournament_id
+        self.q_table = self.initial_q_table()  # 新的锦标赛从空的（或预训练的）Q表开始
+        self.learning_curve = []  # 学习曲线数据
+        self.history = []  # 存储(我的选择, 对手选择)的列表
+        self.round_counter = 0  # 已学习的回合数
+
+        # 如果有tournament_id，则为该锦标赛创建特定的模型文件
+        if tournament_id:
+            model_filename = f'q_learning_model_tournament_{tournament_id}.pkl'
+        else:
+            model_filename = 'q_learning_model.pkl'
+        self.save_path = os.path.join('models', model_filename)
+        self.store = QLearningModelStore(self.save_path)
+        # 锦标赛检查点：只在一批比赛结果提交时保存，用于中断后继续执行
+        self.checkpoint_path = os.path.join('models', f'q_learning_checkpoint_tournament_{tournament_id}.pkl')
+
+        # 两次刷新之间的最短间隔（秒），None 表示只在锦标赛完成（或游戏结束）时刷新
+        self.flush_seconds = q_learning_setting('Q_LEARNING_FLUSH_SECONDS', 60.0)
+        self.last_flush = time.monotonic()
+
+    def initial_q_table(self):
+        """
+        新模型的Q表：设置了 Q_LEARNING_PRETRAINED_MODEL（train_q_learning 命令的输出）时
+        从预训练的Q表开始，否则为空Q表
+        """
+        pretrained_path = q_learning_setting('Q_LEARNING_PRETRAINED_MODEL', None)
+        if pretrained_path and os.path.exists(pretrained_path):
+            try:
+                return load_model_data(pretrained_path)['q_table']
+            except Exception as e:
+                print(f"加载预训练Q表失败: {e}")
+        return QTable(self.memory_length)
+
+    def get_state(self, opponent_history):
+        """根据对手最近memory_length个选择生成状态编码（见 q_table.py）"""
+        return self.q_table.encode(opponent_history)
+
+    def choose_action(self, state, rng):
+        """使用ε-贪心策略选择动作"""
+        if rng.random() < self.exploration_rate:
+            return rng.choice(['C', 'D'])
+
+        q_cooperate, q_defect = self.q_table.q_values(state)
+        if q_cooperate == q_defect:
+            return rng.choice(['C', 'D'])
+        return 'C' if q_cooperate > q_defect else 'D'
+
+    def update_q_value(self, state, action, reward, next_state):
+        """Q(s,a) ← Q(s,a) + α[r + γ·max_a'Q(s',a') - Q(s,a)]"""
+        self.q_table.update(state, action, reward, next_state, self.learning_rate, self.discount_factor)
+
+    @staticmethod
+    def get_reward(my_choice, opponent_choice):
+        """根据双方选择计算奖励"""
+        reward_matrix = {
+            ('C', 'C'): 3,  # 双方合作
+            ('C', 'D'): 0,  # 我合作，对手背叛
+            ('D', 'C'): 5,  # 我背叛，对手合作
+            ('D', 'D'): 0   # 双方背叛
+        }
+        return reward_matrix[(my_choice, opponent_choice)]
+
+    def record_round(self):
+        """记录完成一个回合的学习，距上次刷新超过 flush_seconds 时刷新模型文件"""
+        self.round_counter += 1
+        if self.flush_seconds is not None and time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.save(close_history=False)
+
+    def save(self, close_history=True):
+        """
+        把模型刷新到模型文件：追加新的学习曲线和历史，替换Q表快照
+
+        参数:
+            close_history: 是否写入最后一项历史（比赛进行中刷新时为False）
+        """
+        try:
+            self.store.flush(self, close_history=close_history)
+            print(f"Q表和学习数据已保存到 {self.save_path}，包含{len(self.q_table)}个状态")
+        except Exception as e:
+            print(f"保存Q表失败: {e}")
+        self.last_flush = time.monotonic()
+
+    def save_checkpoint(self):
+        """
+        保存检查点：学习曲线和历史追加到模型的日志中，检查点只记录它们的长度、
+        Q表快照和回合计数器，先写临时文件再替换，避免留下不完整的检查点
+        """
+        # 检查点在两批比赛之间保存，最后一项历史不会再更新
+        self.store.append_logs(self, close_history=True)
+        checkpoint = self.store.snapshot(self)
+        write_atomic(self.checkpoint_path, checkpoint)
+
+    def load_checkpoint(self):
+        """从检查点恢复模型状态，丢弃日志中检查点之后的部分，没有检查点时返回False"""
+        if not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        self.q_table = load_q_table(checkpoint['q_table'], self.memory_length)
+        self.round_counter = checkpoint['round_counter']
+        if 'curve_length' in checkpoint:
+            self.store.truncate_logs(checkpoint['curve_length'], checkpoint['history_length'])
+            self.learning_curve = self.store.read_learning_curve(checkpoint['curve_length'])
+            self.history = self.store.read_history(checkpoint['history_length'])
+        else:
+            # 旧格式的检查点保存了完整的学习曲线和历史
+            self.learning_curve = checkpoint['learning_curve']
+            self.history = checkpoint['history']
+            self.store.rewrite_logs(self)
+        return True
+
+
+# 每个锦标赛（或锦标赛之外的游戏，键为None）一个共享的Q-learning模型
+Q_LEARNING_MODELS = {}
+
+
+def get_q_learning_model(tournament_id=None):
+    """
+    获取锦标赛共享的Q-learning模型，不存在时创建
+
+    参数:
+        tournament_id: 锦标赛ID
+
+    返回:
+        QLearningModel 对象
+    """
+    model = Q_LEARNING_MODELS.get(tournament_id)
+    if model is None:
+        model = Q_LEARNING_MODELS[tournament_id] = QLearningModel(tournament_id)
+    return model
+
+
+def q_learning_setting(name, default):
+    """读取 Django 设置中的Q-learning配置，没有配置 Django 时返回默认值"""
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, name, default)
+    except ImportError:
+        pass
+    return default
+
+
+def flush_q_learning_model(tournament_id, release=False):
+    """
+    把锦标赛（或游戏，键为None）的Q-learning模型刷新到模型文件，没有模型时不做任何事
+
+    参数:
+        tournament_id: 锦标赛ID
+        release: 刷新后是否从内存中移除模型（锦标赛完成后不再需要）
+    """
+    model = Q_LEARNING_MODELS.pop(tournament_id, None) if release else Q_LEARNING_MODELS.get(tournament_id)
+    if model is not None:
+        model.save()
+
+
+def save_q_learning_checkpoint(tournament_id):
+    """保存锦标赛Q-learning模型的检查点，锦标赛没有使用Q-learning策略时不做任何事"""
+    model = Q_LEARNING_MODELS.get(tournament_id)
+    if model is not None:
+        model.save_checkpoint()
+
+
+def restore_q_learning_checkpoint(tournament_id):
+    """
+    继续执行锦标赛前，把Q-learning模型恢复到最后一次提交的检查点
+
+    内存中的模型可能已经学习了未提交的比赛，因此总是丢弃；
+    没有检查点时，Q-learning比赛会从空模型重新开始。
+    """
+    Q_LEARNING_MODELS.pop(tournament_id, None)
+    model = QLearningModel(tournament_id)
+    if model.load_checkpoint():
+        Q_LEARNING_MODELS[tournament_id] = model
+
+
+def discard_q_learning_checkpoint(tournament_id):
+    """锦标赛完成后删除检查点文件"""
+    checkpoint_path = QLearningModel(tournament_id).checkpoint_path
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+
+class QLearning(BaseStrategy):
+    strategy_id = 'q_learning'
+    # Q表在同一锦标赛的比赛之间共享
+    parallel_safe = False
+
+    def __init__(self, rng=None, tournament_id=None):
+        self.model = get_q_learning_model(tournament_id)
+        super().__init__(rng=rng, tournament_id=tournament_id)
+
+    def reset(self):
+        self.history = []  # 本场比赛的(我的选择, 对手选择)
+        self.last_history_length = 0
+        self.state = EMPTY_STATE  # 当前对手历史的状态编码，每回合增量更新
+
+    def move(self, opponent_history):
+        model = self.model
+        history_length = len(opponent_history)
+
+        if history_length != self.last_history_length:
+            if history_length == self.last_history_length + 1:
+                last_state = self.state
+                self.state = model.q_table.next_state(last_state, opponent_history[-1])
+            else:
+                last_state = model.get_state(opponent_history[:-1])
+                self.state = model.get_state(opponent_history)
+
+            # 对手完成了上一轮选择，更新上一轮的Q值
+            if history_length > self.last_history_length and self.history:
+                last_action = self.history[-1][0]
+                opponent_action = opponent_history[-1]
+                self.history[-1] = (last_action, opponent_action)
+                model.history[-1] = (last_action, opponent_action)
+
+                reward = model.get_reward(last_action, opponent_action)
+                model.learning_curve.append(reward)
+                model.update_q_value(last_state, last_action, reward, self.state)
+                model.record_round()
+
+            self.last_history_length = history_length
+
+        action = model.choose_action(self.state, self.rng)
+        self.history.append((action, None))
+        model.history.append((action, None))
+        return action
+
+    def replay(self, my_history, opponent_history):
+        # 已经学习过的回合不再重复更新Q表，只恢复本场比赛的历史
+        self.reset()
+        self.history = list(zip(my_history, opponent_history))
+        self.last_history_length = len(opponent_history)
+        self.state = self.model.get_state(opponent_history)
+
+
+class LegacyStrategy(BaseStrategy):
+    """
+    没有原生实现的策略，通过 strategies.execute_strategy 执行策略代码
+    """
+
+    # 策略代码的状态保存在进程内的 STRATEGY_STATES 中
+    parallel_safe = False
+
+    def __init__(self, strategy_id, code=None, rng=None, tournament_id=None):
+        self.strategy_id = strategy_id
+        self.code = code
+        super().__init__(rng=rng, tournament_id=tournament_id)
+
+    def move(self, opponent_history):
+        if self.tournament_id:
+            return execute_strategy(self.strategy_id, opponent_history, code=self.code,
+                                    tournament_id=self.tournament_id)
+        return execute_strategy(self.strategy_id, opponent_history, code=self.code)
+
+
+class SandboxedStrategy(BaseStrategy):
+    """
+    用户编写的策略，代码在沙箱工作进程中执行（见 sandbox.py）
+
+    每个实例对应工作进程中的一个独立命名空间，策略代码通过 globals() 保存的状态
+    只在本场比赛内有效。策略代码中的 random 使用由本场比赛随机数生成器决定的种子。
+    """
+
+    # 调用经过主进程中的沙箱进程池
+    parallel_safe = False
+
+    def __init__(self, strategy_id, code, rng=None, tournament_id=None):
+        self.strategy_id = strategy_id
+        self.code = code
+        self.sandbox_key = None
+        super().__init__(rng=rng, tournament_id=tournament_id)
+
+    def reset(self):
+        # 换用新的实例键，工作进程中旧的命名空间随下一次请求释放
+        pool = get_sandbox_pool()
+        if self.sandbox_key is not None:
+            self._release.detach()
+            pool.release(self.sandbox_key)
+        self.sandbox_key = pool.new_key()
+        # 使用全局 random 模块（锦标赛未设置种子）时，工作进程使用系统随机源
+        self.sandbox_seed = self.rng.getrandbits(64) if isinstance(self.rng, random.Random) else None
+        self._release = weakref.finalize(self, pool.release, self.sandbox_key)
+
+    def sandbox_call(self, opponent_history):
+        """本实例的一次调用，格式与 SandboxPool.moves 的参数相同"""
+        return (self.code, self.sandbox_key, opponent_history, self.tournament_id, self.sandbox_seed)
+
+    def move(self, opponent_history):
+        choice = get_sandbox_pool().moves([self.sandbox_call(opponent_history)])[0]
+        if choice is None:
+            raise RuntimeError("沙箱中的策略代码执行失败")
+        return choice
+
+
+# 预设策略ID到策略类的映射
+NATIVE_STRATEGIES = {
+    cls.strategy_id: cls
+    for cls in [
+        AlwaysCooperate, AlwaysDefect, TitForTat, SuspiciousTitForTat, RandomStrategy,
+        Grudger, Pavlov, TitForTwoTats, TwoMemory, QLearning,
+        Davis, Joss, Tullock, Nydegger, Grofman, Shubik,
+        SteinAndRapoport, Downing, Graaskamp, TidemanAndChieruzzi,
+    ]
+}
+
+
+def create_strategy(strategy_id, rng=None, tournament_id=None):
+    """
+    为一场比赛创建预设策略实例
+
+    参数:
+        strategy_id: 预设策略ID
+        rng: 随机数生成器
+        tournament_id: 当前锦标赛ID
+
+    返回:
+        BaseStrategy 实例，没有原生实现时返回 LegacyStrategy
+    """
+    strategy_class = NATIVE_STRATEGIES.get(strategy_id)
+    if strategy_class is None:
+        return LegacyStrategy(strategy_id, rng=rng, tournament_id=tournament_id)
+    return strategy_class(rng=rng, tournament_id=tournament_id)
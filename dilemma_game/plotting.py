@@ -0,0 +1,266 @@
+"""
+Q-learning结果图表的绘制
+
+本模块导入 matplotlib 并设置字体，只在第一次渲染图表时由 charts 导入，
+其他视图、工作进程和管理命令启动时不需要加载 matplotlib。
+"""
+
+import io
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # 设置为非交互式后端
+import matplotlib.pyplot as plt
+from matplotlib.colors import LinearSegmentedColormap
+# 设置matplotlib中文字体支持
+matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'Microsoft YaHei', 'Heiti TC', 'sans-serif']  # 用来正常显示中文标签
+matplotlib.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
+from django.db.models import Q
+
+from .charts import ChartUnavailable, model_path
+from .model_store import load_model_data
+from .models import Strategy, Tournament, TournamentMatch, TournamentParticipant
+
+
+def get_q_learning_participant(tournament_id):
+    try:
+        tournament = Tournament.objects.get(id=tournament_id)
+    except Tournament.DoesNotExist:
+        raise ChartUnavailable("锦标赛不存在")
+
+    # 查找使用Q-learning策略的参与者
+    try:
+        q_learning_strategy = Strategy.objects.get(preset_id='q_learning')
+        participant = TournamentParticipant.objects.get(tournament=tournament, strategy=q_learning_strategy)
+    except (Strategy.DoesNotExist, TournamentParticipant.DoesNotExist):
+        raise ChartUnavailable("该锦标赛中没有Q-learning策略参与者")
+    return tournament, participant
+
+
+def figure_png(dpi):
+    """把当前图表保存为PNG并关闭"""
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', dpi=dpi)
+    plt.close()
+    return buffer.getvalue()
+
+
+def render_q_learning_curve(tournament_id):
+    """Q-learning策略的学习曲线图"""
+    get_q_learning_participant(tournament_id)
+
+    path = model_path(tournament_id)
+    if path is None:
+        raise ChartUnavailable("找不到Q-Learning模型文件")
+
+    try:
+        # 学习曲线保存在模型的追加日志中（旧模型文件保存在 pickle 中）
+        data = load_model_data(path)
+
+        # 检查数据结构，提取学习曲线数据
+        if 'learning_curve' in data:
+            learning_curve = data['learning_curve']
+        else:
+            # 旧模型文件可能只包含Q表，创建模拟的学习曲线
+            learning_curve = [3.0] * 10  # 占位数据
+    except Exception as e:
+        raise ChartUnavailable(f"无法读取模型文件: {str(e)}", status=500)
+
+    if not learning_curve:
+        raise ChartUnavailable("学习曲线数据为空")
+
+    # 创建学习曲线数据
+    rounds = list(range(1, len(learning_curve) + 1))
+    scores = learning_curve
+
+    # 计算移动平均分数，窗口大小为5
+    window_size = min(5, len(scores))
+    moving_avg = np.convolve(scores, np.ones(window_size)/window_size, mode='valid')
+    moving_avg_rounds = rounds[window_size-1:]
+
+    # 生成图表
+    plt.figure(figsize=(10, 6))
+    plt.plot(rounds, scores, 'o-', alpha=0.7, label='每场比赛得分')
+
+    if len(moving_avg) > 1:
+        plt.plot(moving_avg_rounds, moving_avg, 'r-', linewidth=2, label='移动平均')
+
+    plt.title(f'锦标赛 #{tournament_id} Q-learning策略学习曲线', fontsize=14)
+    plt.xlabel('回合数', fontsize=12)
+    plt.ylabel('得分', fontsize=12)
+    plt.grid(True, alpha=0.3)
+    plt.legend()
+
+    return figure_png(dpi=80)
+
+
+def render_q_value_heatmap(tournament_id):
+    """Q-learning策略的状态-动作值热力图"""
+    path = model_path(tournament_id)
+    if path is None:
+        raise ChartUnavailable("找不到Q表文件")
+
+    try:
+        # 转换为按状态字符串索引的字典（兼容旧模型文件）
+        q_table = load_model_data(path)['q_table'].to_dict()
+    except Exception as e:
+        raise ChartUnavailable(f"无法加载Q表: {str(e)}", status=500)
+
+    if not q_table:
+        raise ChartUnavailable("Q表为空")
+
+    # 筛选出有意义的状态（例如，排除全N的状态）
+    meaningful_states = [state for state in q_table.keys() if 'N' not in state or (state.count('N') < len(state))]
+
+    # 如果状态太多，只选择前20个
+    if len(meaningful_states) > 20:
+        meaningful_states = sorted(meaningful_states)[:20]
+
+    # 生成热力图数据
+    q_values_c = [q_table[state]['C'] for state in meaningful_states]
+    q_values_d = [q_table[state]['D'] for state in meaningful_states]
+
+    # 计算热力图的值范围
+    min_q = min(min(q_values_c), min(q_values_d))
+    max_q = max(max(q_values_c), max(q_values_d))
+
+    # 创建热力图
+    fig, ax = plt.subplots(figsize=(12, 8))
+
+    # 创建数据矩阵
+    data = np.array([q_values_c, q_values_d])
+
+    # 定义自定义颜色映射：负值为红色，正值为绿色，零值为白色
+    cmap = LinearSegmentedColormap.from_list(
+        'RdWtGn', [(0.8, 0, 0), (1, 1, 1), (0, 0.8, 0)], N=100
+    )
+
+    # 绘制热力图
+    im = ax.imshow(data, cmap=cmap, aspect='auto', vmin=min_q, vmax=max_q)
+
+    # 添加颜色条
+    cbar = plt.colorbar(im, ax=ax)
+    cbar.set_label('Q值', fontsize=12)
+
+    # 添加标签
+    ax.set_yticks([0, 1])
+    ax.set_yticklabels(['合作', '背叛'])
+    ax.set_xticks(range(len(meaningful_states)))
+    ax.set_xticklabels(meaningful_states, rotation=90)
+
+    # 在每个单元格中显示Q值
+    for i in range(2):
+        for j in range(len(meaningful_states)):
+            ax.text(j, i, f"{data[i, j]:.2f}", ha="center", va="center", color="black", fontsize=8)
+
+    plt.title(f'锦标赛 #{tournament_id} Q-learning策略的状态-动作值热力图', fontsize=14)
+    plt.tight_layout()
+
+    return figure_png(dpi=100)
+
+
+def render_q_learning_vs_opponents(tournament_id):
+    """Q-learning与各个对手的对战结果图"""
+    tournament, q_learning_participant = get_q_learning_participant(tournament_id)
+
+    # 获取所有涉及Q-learning策略的比赛
+    q_learning_matches = TournamentMatch.objects.filter(
+        Q(participant1=q_learning_participant) | Q(participant2=q_learning_participant),
+        tournament=tournament,
+        status='COMPLETED'
+    ).select_related('participant1__strategy', 'participant2__strategy')
+
+    # 按对手分组统计比赛结果
+    opponent_results = {}
+
+    for match in q_learning_matches:
+        if match.participant1_id == q_learning_participant.id:
+            q_score = match.player1_score
+            opp_score = match.player2_score
+            opponent_name = match.participant2.strategy.name
+        else:
+            q_score = match.player2_score
+            opp_score = match.player1_score
+            opponent_name = match.participant1.strategy.name
+
+        if opponent_name not in opponent_results:
+            opponent_results[opponent_name] = {
+                'q_scores': [],
+                'opp_scores': [],
+                'wins': 0,
+                'draws': 0,
+                'losses': 0
+            }
+
+        opponent_results[opponent_name]['q_scores'].append(q_score)
+        opponent_results[opponent_name]['opp_scores'].append(opp_score)
+
+        if q_score > opp_score:
+            opponent_results[opponent_name]['wins'] += 1
+        elif q_score < opp_score:
+            opponent_results[opponent_name]['losses'] += 1
+        else:
+            opponent_results[opponent_name]['draws'] += 1
+
+    # 计算平均分数
+    for opponent in opponent_results:
+        opponent_results[opponent]['avg_q_score'] = sum(opponent_results[opponent]['q_scores']) / len(opponent_results[opponent]['q_scores'])
+        opponent_results[opponent]['avg_opp_score'] = sum(opponent_results[opponent]['opp_scores']) / len(opponent_results[opponent]['opp_scores'])
+
+    # 按照Q-learning的平均分从高到低排序
+    sorted_opponents = sorted(
+        opponent_results.items(),
+        key=lambda x: x[1]['avg_q_score'],
+        reverse=True
+    )
+
+    # 准备作图数据
+    opponents = [opp[0] for opp in sorted_opponents]
+    q_scores = [opp[1]['avg_q_score'] for opp in sorted_opponents]
+    opp_scores = [opp[1]['avg_opp_score'] for opp in sorted_opponents]
+
+    # 准备胜负平数据
+    wins = [opp[1]['wins'] for opp in sorted_opponents]
+    draws = [opp[1]['draws'] for opp in sorted_opponents]
+    losses = [opp[1]['losses'] for opp in sorted_opponents]
+
+    # 创建双子图
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 8))
+
+    # 设置柱状图的宽度
+    bar_width = 0.35
+
+    # 绘制平均得分对比
+    x = np.arange(len(opponents))
+    ax1.bar(x - bar_width/2, q_scores, bar_width, label='Q-learning', color='royalblue')
+    ax1.bar(x + bar_width/2, opp_scores, bar_width, label='对手', color='lightcoral')
+
+    # 设置标题和标签
+    ax1.set_title(f'锦标赛 #{tournament_id} Q-learning与各对手平均得分对比', fontsize=14)
+    ax1.set_xlabel('对手策略', fontsize=12)
+    ax1.set_ylabel('平均得分', fontsize=12)
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(opponents, rotation=45, ha='right')
+    ax1.legend()
+    ax1.grid(axis='y', alpha=0.3)
+
+    # 绘制胜负平统计
+    bottom_draws = np.array(wins)
+    bottom_losses = bottom_draws + np.array(draws)
+
+    ax2.bar(opponents, wins, label='胜利', color='forestgreen')
+    ax2.bar(opponents, draws, bottom=bottom_draws, label='平局', color='gold')
+    ax2.bar(opponents, losses, bottom=bottom_losses, label='失败', color='firebrick')
+
+    # 设置标题和标签
+    ax2.set_title(f'锦标赛 #{tournament_id} Q-learning与各对手胜负平统计', fontsize=14)
+    ax2.set_xlabel('对手策略', fontsize=12)
+    ax2.set_ylabel('场次', fontsize=12)
+    ax2.set_xticks(x)
+    ax2.set_xticklabels(opponents, rotation=45, ha='right')
+    ax2.legend()
+
+    # 调整布局
+    plt.tight_layout()
+
+    return figure_png(dpi=100)
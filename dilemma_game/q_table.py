@@ -0,0 +1,133 @@
+"""
+NumPy 数组形式的Q表
+
+状态用整数编码：最高位是一个哨兵位 1，其后依次是对手最近（最多 memory_length 个）
+选择的位，1 表示背叛、最近一轮在最低位。哨兵位的位置记录了历史长度，因此
+历史不足 memory_length 时（旧格式中用 'N' 填充的状态）也有唯一编码，
+例如 memory_length 为 3 时：'NNN' -> 0b1，'NNC' -> 0b10，'NCD' -> 0b101，'DDC' -> 0b1110。
+所有状态的编码都小于 2 << memory_length，Q值保存在形状为 (2 << memory_length, 2) 的数组中。
+
+旧的模型文件以 {状态字符串: {'C': Q值, 'D': Q值}} 保存Q表，load_q_table 会自动转换。
+"""
+
+import numpy as np
+
+# 动作在Q值数组中的列
+ACTIONS = ('C', 'D')
+ACTION_INDEX = {'C': 0, 'D': 1}
+
+# 空历史的状态编码
+EMPTY_STATE = 1
+
+
+class QTable:
+    """按整数状态编码索引的Q表"""
+
+    def __init__(self, memory_length):
+        self.memory_length = memory_length
+        self.full_state = 1 << memory_length
+        self.mask = self.full_state - 1
+        # values[状态, 动作]，未访问过的状态Q值为0
+        self.values = np.zeros((2 << memory_length, 2), dtype=np.float64)
+        # 已访问（已初始化）的状态，对应旧格式中Q表里存在的键
+        self.visited = np.zeros(2 << memory_length, dtype=bool)
+
+    def __len__(self):
+        return int(self.visited.sum())
+
+    def encode(self, opponent_history):
+        """把对手历史编码为状态"""
+        state = EMPTY_STATE
+        for move in opponent_history[-self.memory_length:] if self.memory_length else ():
+            state = (state << 1) | (move == 'D')
+        return state
+
+    def next_state(self, state, opponent_move):
+        """对手再做出一个选择之后的状态，等价于 encode(历史 + [opponent_move])"""
+        state = (state << 1) | (opponent_move == 'D')
+        if state >= self.full_state << 1:
+            state = (state & self.mask) | self.full_state
+        return state
+
+    def decode(self, state):
+        """把状态还原为旧格式的状态字符串（历史不足时用 'N' 填充）"""
+        length = state.bit_length() - 1
+        moves = ''.join('D' if (state >> offset) & 1 else 'C' for offset in range(length - 1, -1, -1))
+        return 'N' * (self.memory_length - length) + moves
+
+    def q_values(self, state):
+        """获取状态的 (合作Q值, 背叛Q值)，并把状态标记为已访问"""
+        self.visited[state] = True
+        return self.values.item(state, 0), self.values.item(state, 1)
+
+    def update(self, state, action, reward, next_state, learning_rate, discount_factor):
+        """Q(s,a) ← Q(s,a) + α[r + γ·max_a'Q(s',a') - Q(s,a)]"""
+        self.visited[state] = True
+        column = ACTION_INDEX[action]
+        current_q = self.values.item(state, column)
+        max_next_q = max(self.q_values(next_state))
+        self.values[state, column] = current_q + learning_rate * (reward + discount_factor * max_next_q - current_q)
+
+    def states(self):
+        """已访问的状态编码列表，按编码排序"""
+        return np.flatnonzero(self.visited).tolist()
+
+    def to_dict(self):
+        """转换为旧格式的 {状态字符串: {'C': Q值, 'D': Q值}}，用于展示"""
+        return {
+            self.decode(state): {'C': self.values.item(state, 0), 'D': self.values.item(state, 1)}
+            for state in self.states()
+        }
+
+    def to_data(self):
+        """保存到模型文件中的数据（只包含基本类型和NumPy数组）"""
+        return {
+            'format': 'numpy',
+            'memory_length': self.memory_length,
+            'values': self.values,
+            'visited': self.visited,
+        }
+
+    @classmethod
+    def from_dict(cls, q_table, memory_length=None):
+        """
+        从旧格式的Q表创建
+
+        参数:
+            q_table: {状态字符串: {'C': Q值, 'D': Q值}}
+            memory_length: 记忆长度，默认取状态字符串的长度
+        """
+        if memory_length is None:
+            memory_length = max((len(state) for state in q_table), default=0)
+        table = cls(memory_length)
+        for state_string, q_values in q_table.items():
+            state = table.encode([move for move in state_string if move != 'N'])
+            table.visited[state] = True
+            table.values[state, 0] = q_values.get('C', 0.0)
+            table.values[state, 1] = q_values.get('D', 0.0)
+        return table
+
+
+def load_q_table(data, memory_length=None):
+    """
+    从模型文件的内容中加载Q表，兼容旧格式
+
+    参数:
+        data: QTable.to_data() 的结果、旧格式的Q表字典，或包含 'q_table' 键的模型文件内容
+        memory_length: 旧格式Q表的记忆长度，默认取状态字符串的长度
+
+    返回:
+        QTable 对象；data 为空时返回 memory_length 长度的空Q表
+    """
+    if isinstance(data, QTable):
+        return data
+    if isinstance(data, dict) and 'q_table' in data:
+        data = data['q_table']
+    if isinstance(data, dict) and data.get('format') == 'numpy':
+        table = QTable(data['memory_length'])
+        table.values = np.asarray(data['values'], dtype=np.float64)
+        table.visited = np.asarray(data['visited'], dtype=bool)
+        return table
+    if not data:
+        return QTable(memory_length if memory_length is not None else 0)
+    return QTable.from_dict(data, memory_length)
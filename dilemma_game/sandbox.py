@@ -0,0 +1,236 @@
+"""
+用户策略沙箱进程池
+
+用户编写的 Strategy.code 不在主进程中执行，而是交给若干个常驻的沙箱工作进程
+（sandbox_worker.py）。同一策略实例的所有调用固定发送给同一个工作进程，
+策略代码在每个工作进程中只编译一次；一次请求可以携带多场比赛的调用，
+锦标赛按回合同步推进多场比赛时，每回合每个工作进程只需要一次往返。
+
+相关设置（均可省略）:
+    SANDBOX_WORKERS: 工作进程数量，默认 2
+    SANDBOX_CPU_SECONDS: 单次调用的 CPU 时间上限（秒），默认 1.0
+    SANDBOX_MEMORY_MB: 每个工作进程的内存上限（MB），默认 256
+    SANDBOX_CALL_MEMORY_MB: 单次调用最多新分配的内存（MB），默认 64，0 表示只受进程上限限制
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import selectors
+import subprocess
+import sys
+import threading
+import time
+
+from .strategies import hash_strategy_code
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_worker.py')
+
+# 工作进程的环境变量（不继承主进程的环境变量，其中可能有数据库密码、密钥等）
+WORKER_ENV = {}
+
+# 每个请求在 CPU 时间之外额外允许的等待时间（进程启动、序列化等）
+REQUEST_TIMEOUT_SLACK = 5.0
+
+
+class SandboxError(Exception):
+    """沙箱工作进程无响应或意外退出"""
+
+
+class SandboxWorker:
+    """一个沙箱工作进程及其通信管道"""
+
+    def __init__(self, cpu_seconds, memory_mb, call_memory_mb):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.call_memory_mb = call_memory_mb
+        self.process = None
+        # 已发送给该进程的代码哈希
+        self.known_codes = set()
+        # 等待随下一次请求发送的实例释放
+        self.pending_release = []
+        self.buffer = b''
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-I', WORKER_SCRIPT,
+             '--cpu-seconds', str(self.cpu_seconds), '--memory-mb', str(self.memory_mb),
+             '--call-memory-mb', str(self.call_memory_mb)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            close_fds=True,
+            env=WORKER_ENV,
+        )
+        self.known_codes = set()
+        self.pending_release = []
+        self.buffer = b''
+
+    def stop(self):
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        try:
+            process.kill()
+            process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        for stream in (process.stdin, process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+    def send(self, codes, calls):
+        """
+        发送一次请求
+
+        参数:
+            codes: 代码哈希到代码的映射（只会发送该进程尚未见过的代码）
+            calls: [代码哈希, 实例键, 对手历史字符串, 锦标赛ID, 随机种子] 的列表
+        """
+        if self.process is None or self.process.poll() is not None:
+            self.start()
+
+        request = {
+            'codes': {code_hash: code for code_hash, code in codes.items() if code_hash not in self.known_codes},
+            'release': self.pending_release,
+            'calls': calls,
+        }
+        self.pending_release = []
+        try:
+            self.process.stdin.write(json.dumps(request).encode('utf-8') + b'\n')
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            self.stop()
+            raise SandboxError(f"沙箱进程写入失败: {e}")
+        self.known_codes.update(request['codes'])
+
+    def receive(self, deadline):
+        """读取一行响应，超过 deadline 时结束进程并抛出 SandboxError"""
+        fd = self.process.stdout.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while b'\n' not in self.buffer:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    self.stop()
+                    raise SandboxError("沙箱进程响应超时")
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    self.stop()
+                    raise SandboxError("沙箱进程意外退出")
+                self.buffer += chunk
+
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        response = json.loads(line)
+        if response.get('moves') is None:
+            self.stop()
+            raise SandboxError(f"沙箱进程执行失败: {response.get('errors')}")
+        return response
+
+
+class SandboxPool:
+    """沙箱工作进程池，工作进程在第一次使用时启动"""
+
+    def __init__(self, size=2, cpu_seconds=1.0, memory_mb=256, call_memory_mb=64):
+        self.cpu_seconds = cpu_seconds
+        self.workers = [SandboxWorker(cpu_seconds, memory_mb, call_memory_mb) for _ in range(max(1, size))]
+        # 可重入锁：策略实例可能在持有锁时被回收并调用 release
+        self.lock = threading.RLock()
+        self.keys = itertools.count(1)
+
+    def new_key(self):
+        """为一个策略实例分配键"""
+        return next(self.keys)
+
+    def worker_for(self, key):
+        return self.workers[key % len(self.workers)]
+
+    def release(self, key):
+        """释放策略实例在工作进程中的状态（随下一次请求发送）"""
+        with self.lock:
+            self.worker_for(key).pending_release.append(key)
+
+    def moves(self, calls):
+        """
+        批量获取策略选择
+
+        参数:
+            calls: (代码, 实例键, 对手历史, 锦标赛ID, 随机种子) 的列表
+
+        返回:
+            与 calls 顺序对应的 'C'/'D' 列表，执行失败的调用为 None
+        """
+        results = [None] * len(calls)
+        if not calls:
+            return results
+
+        # 按工作进程分组
+        batches = {}
+        code_hashes = {}
+        for index, (code, key, opponent_history, tournament_id, seed) in enumerate(calls):
+            code_hash = code_hashes.get(code)
+            if code_hash is None:
+                code_hash = code_hashes[code] = hash_strategy_code(code)
+            worker = self.worker_for(key)
+            batch = batches.setdefault(id(worker), (worker, {}, [], []))
+            batch[1][code_hash] = code
+            batch[2].append([code_hash, key, ''.join(opponent_history), tournament_id, seed])
+            batch[3].append(index)
+
+        with self.lock:
+            # 先把请求发送给所有工作进程，再依次读取响应，各进程并行执行
+            sent = []
+            for worker, codes, worker_calls, indexes in batches.values():
+                try:
+                    worker.send(codes, worker_calls)
+                    sent.append((worker, worker_calls, indexes))
+                except SandboxError as e:
+                    logger.error(str(e))
+
+            for worker, worker_calls, indexes in sent:
+                deadline = time.monotonic() + self.cpu_seconds * len(worker_calls) + REQUEST_TIMEOUT_SLACK
+                try:
+                    response = worker.receive(deadline)
+                except SandboxError as e:
+                    # 进程已被结束，其中的策略实例状态随之丢失
+                    logger.error(f"{e}，{len(worker_calls)} 个调用按执行失败处理")
+                    continue
+                for index, move in zip(indexes, response['moves']):
+                    results[index] = move
+                for error in response.get('errors', {}).values():
+                    logger.error(f"用户策略执行失败: {error}")
+
+        return results
+
+    def close(self):
+        with self.lock:
+            for worker in self.workers:
+                worker.stop()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_sandbox_pool():
+    """获取进程内共享的沙箱进程池，首次调用时按 Django 设置创建"""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                from django.conf import settings
+                _POOL = SandboxPool(
+                    size=getattr(settings, 'SANDBOX_WORKERS', 2),
+                    cpu_seconds=getattr(settings, 'SANDBOX_CPU_SECONDS', 1.0),
+                    memory_mb=getattr(settings, 'SANDBOX_MEMORY_MB', 256),
+                    call_memory_mb=getattr(settings, 'SANDBOX_CALL_MEMORY_MB', 64),
+                )
+                atexit.register(_POOL.close)
+    return _POOL
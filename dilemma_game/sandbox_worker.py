@@ -0,0 +1,369 @@
+"""
+用户策略沙箱工作进程
+
+由 sandbox.SandboxPool 以独立的 Python 进程启动（python -I sandbox_worker.py），
+不导入 Django，通过标准输入/输出按行交换 JSON 消息：
+
+    请求: {"codes": {代码哈希: 代码}, "release": [实例键...],
+           "calls": [[代码哈希, 实例键, 对手历史字符串, 锦标赛ID, 随机种子], ...]}
+    响应: {"moves": ["C" | "D" | null, ...], "errors": {调用序号: 错误信息}}
+
+每个实例键对应一场比赛中的一个策略实例，拥有独立的命名空间（策略代码中的
+globals() 返回它）和独立的随机数生成器（import random 得到按种子初始化的
+random.Random 实例的公开方法，设置了种子的锦标赛结果可以复现），同一代码只编译一次。每次调用受 CPU 时间
+和新分配内存的限制（调用前把地址空间上限临时设为当前大小加上单次调用的额度），整个进程另外受内存上限限制；
+出错、超时或内存不足的实例在本场比赛剩余回合中不再执行，返回 null，由主进程按执行失败处理。
+
+隔离措施（主进程仍然会在等待超时后直接结束工作进程）:
+    - 策略代码只能使用白名单中的内置函数；getattr 等只能访问公开属性
+    - 编译时拒绝访问以下划线开头的属性（__globals__、_sys 等），以及 str.format/format_map
+      （格式字符串中的 {0.__globals__} 可以绕过编译时检查访问属性）
+    - 导入的模块是只包含公开属性的代理，不包含其他模块的引用
+    - 初始化完成后安装审计钩子，拒绝打开文件、导入模块、os/subprocess/socket 等操作
+      以及访问栈帧和代码对象
+    - 进程级限制：地址空间、禁止写文件和创建子进程；以 root 启动时切换到 nobody 用户
+    - 主进程以清空的环境变量启动工作进程
+"""
+
+import argparse
+import ast
+import builtins
+import json
+import os
+import random
+import resource
+import signal
+import sys
+import types
+
+# 策略代码可以导入的模块
+ALLOWED_MODULES = {
+    'random', 'math', 'itertools', 'collections', 'functools', 'statistics',
+    'operator', 'heapq', 'bisect', 'string',
+}
+
+# 代理模块中额外隐藏的公开属性（可以按名称访问任意属性或取得对象）
+HIDDEN_ATTRIBUTES = {
+    'operator': {'attrgetter', 'methodcaller'},
+    'string': {'Formatter'},
+}
+
+# 策略代码可以使用的内置函数（另外包含所有异常类型）
+ALLOWED_BUILTINS = {
+    'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'bytearray', 'bytes', 'callable', 'chr',
+    'classmethod', 'complex', 'dict', 'dir', 'divmod', 'enumerate', 'filter', 'float', 'format',
+    'frozenset', 'globals', 'hash', 'hex', 'id', 'int', 'isinstance', 'issubclass', 'iter', 'len',
+    'list', 'locals', 'map', 'max', 'min', 'next', 'object', 'oct', 'ord', 'pow', 'print',
+    'property', 'range', 'repr', 'reversed', 'round', 'set', 'slice', 'sorted', 'staticmethod',
+    'str', 'sum', 'super', 'tuple', 'type', 'zip', '__build_class__',
+    'None', 'True', 'False', 'Ellipsis', 'NotImplemented',
+}
+
+# 初始化完成后拒绝的审计事件
+DENIED_EVENTS = {'open', 'import', 'object.__getattr__', 'sys._getframe', 'code.__new__', 'function.__new__'}
+DENIED_EVENT_PREFIXES = ('os.', 'subprocess.', 'socket.', 'shutil.', 'ctypes.', '_posixsubprocess.')
+
+# 可以访问的以下划线开头的属性（super().__init__() 等）
+ALLOWED_PRIVATE_ATTRIBUTES = {'__init__'}
+
+# 不能访问的公开属性：格式字符串的字段可以访问任意属性，'{0.__globals__}'.format(f) 不经过编译时检查
+DENIED_ATTRIBUTES = {'format', 'format_map'}
+
+# 以 root 启动时切换到的用户和组（nobody）
+UNPRIVILEGED_ID = 65534
+
+# 当前地址空间大小（第一列，单位为页），每次调用前读取，用于设置单次调用的内存上限
+STATM_PATH = '/proc/self/statm'
+PAGE_SIZE = resource.getpagesize()
+
+
+class InstanceDisabled(Exception):
+    """实例此前已经执行失败，本场比赛不再执行（错误只报告一次）"""
+
+
+class CallTimeout(BaseException):
+    """单次调用超出 CPU 时间限制（继承 BaseException，策略代码中的 except Exception 无法吞掉）"""
+
+
+class AuditGuard:
+    """审计钩子：启用后拒绝 DENIED_EVENTS 中的操作，trusted 为真时放行工作进程自己的操作"""
+
+    def __init__(self):
+        self.enabled = False
+        self.trusted = False
+
+    def __call__(self, event, args):
+        if not self.enabled or self.trusted:
+            return
+        if event in DENIED_EVENTS or event.startswith(DENIED_EVENT_PREFIXES):
+            raise PermissionError(f"沙箱中不允许的操作: {event}")
+
+
+AUDIT_GUARD = AuditGuard()
+
+
+def check_public_name(name):
+    if type(name) is not str or name.startswith('_') or name in DENIED_ATTRIBUTES:
+        raise AttributeError(f"沙箱中不允许访问属性 {name!r}")
+
+
+def safe_getattr(obj, name, *default):
+    check_public_name(name)
+    return getattr(obj, name, *default)
+
+
+def safe_hasattr(obj, name):
+    check_public_name(name)
+    return hasattr(obj, name)
+
+
+def safe_setattr(obj, name, value):
+    check_public_name(name)
+    setattr(obj, name, value)
+
+
+def safe_delattr(obj, name):
+    check_public_name(name)
+    delattr(obj, name)
+
+
+SAFE_BUILTINS = {
+    name: value for name, value in vars(builtins).items()
+    if name in ALLOWED_BUILTINS or (isinstance(value, type) and issubclass(value, BaseException))
+}
+SAFE_BUILTINS.update(getattr=safe_getattr, hasattr=safe_hasattr, setattr=safe_setattr, delattr=safe_delattr)
+
+
+def public_proxy(obj, name, hidden=()):
+    """只包含 obj 公开属性（不以下划线开头）的代理模块，不包含其他模块"""
+    proxy = types.ModuleType(name)
+    for attr in dir(obj):
+        if attr.startswith('_') or attr in hidden:
+            continue
+        value = getattr(obj, attr)
+        if not isinstance(value, types.ModuleType):
+            setattr(proxy, attr, value)
+    return proxy
+
+
+# 模块名 -> 代理模块（random 除外，每个实例使用自己的随机数生成器），在 apply_limits 中创建
+MODULE_PROXIES = {}
+
+
+def instance_builtins(rng):
+    """一个策略实例使用的内置函数，import random 返回实例自己的随机数生成器"""
+    def guarded_import(name, globals=None, locals=None, fromlist=(), level=0):
+        """只允许导入白名单中的模块，返回代理模块"""
+        if level != 0 or name not in ALLOWED_MODULES:
+            raise ImportError(f"沙箱中不允许导入模块 {name}")
+        if name == 'random':
+            return rng
+        return MODULE_PROXIES[name]
+
+    return dict(SAFE_BUILTINS, __import__=guarded_import)
+
+
+def check_code(tree):
+    """
+    拒绝访问以下划线开头的属性（包括 match 语句中的类模式），ALLOWED_PRIVATE_ATTRIBUTES 除外，
+    以及 DENIED_ATTRIBUTES 中的属性（需要格式化字符串时使用 f-string）
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute):
+            names = [node.attr]
+        elif isinstance(node, ast.MatchClass):
+            names = node.kwd_attrs
+        else:
+            continue
+        for name in names:
+            if name.startswith('_') and name not in ALLOWED_PRIVATE_ATTRIBUTES:
+                raise SyntaxError(f"第{node.lineno}行: 沙箱中不允许访问以下划线开头的属性 {name}")
+            if name in DENIED_ATTRIBUTES:
+                raise SyntaxError(f"第{node.lineno}行: 沙箱中不允许使用 {name}，请使用 f-string")
+
+
+def raise_timeout(signum, frame):
+    raise CallTimeout()
+
+
+def apply_limits(memory_mb):
+    """设置进程级资源限制"""
+    # 预先导入白名单模块并创建代理，之后不再需要读取文件
+    for module in ALLOWED_MODULES - {'random'}:
+        MODULE_PROXIES[module] = public_proxy(__import__(module), module, HIDDEN_ATTRIBUTES.get(module, ()))
+
+    limits = [
+        (resource.RLIMIT_FSIZE, 0),  # 不能写文件
+        (resource.RLIMIT_NPROC, 0),  # 不能创建子进程
+        (resource.RLIMIT_CORE, 0),
+    ]
+    if memory_mb:
+        limits.append((resource.RLIMIT_AS, memory_mb * 1024 * 1024))
+    for limit, value in limits:
+        try:
+            resource.setrlimit(limit, (value, value))
+        except (ValueError, OSError):
+            pass
+
+    # root 不受 RLIMIT_NPROC 限制，切换到没有权限的用户
+    if os.getuid() == 0:
+        try:
+            os.setgroups([])
+            os.setgid(UNPRIVILEGED_ID)
+            os.setuid(UNPRIVILEGED_ID)
+        except OSError:
+            pass
+
+
+class Sandbox:
+    """工作进程内的策略实例管理"""
+
+    def __init__(self, cpu_seconds, call_memory_mb=0):
+        self.cpu_seconds = cpu_seconds
+        # 单次调用最多新分配的地址空间（字节），0 表示只受进程级上限限制
+        self.call_memory = call_memory_mb * 1024 * 1024
+        # 进程级地址空间上限，每次调用结束后恢复
+        self.memory_limit = resource.getrlimit(resource.RLIMIT_AS)[1]
+        # 在安装审计钩子之前打开，之后用 pread 读取；没有 /proc 文件系统时只使用进程级上限
+        self.statm = None
+        if self.call_memory:
+            try:
+                self.statm = os.open(STATM_PATH, os.O_RDONLY)
+            except OSError:
+                pass
+        # 代码哈希 -> 编译后的代码对象，编译失败时为错误信息
+        self.codes = {}
+        # 实例键 -> (make_move, 是否传递锦标赛ID)，执行失败后为错误信息
+        self.instances = {}
+
+    def limit_call_memory(self):
+        """把地址空间上限临时设为当前大小加上单次调用的额度（不超过进程级上限），返回是否设置"""
+        if self.statm is None:
+            return False
+        limit = int(os.pread(self.statm, 64, 0).split()[0]) * PAGE_SIZE + self.call_memory
+        if self.memory_limit != resource.RLIM_INFINITY:
+            limit = min(limit, self.memory_limit)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, self.memory_limit))
+        return True
+
+    def run_limited(self, function, *args):
+        """在 CPU 时间和单次调用内存限制内执行函数"""
+        memory_limited = self.limit_call_memory()
+        signal.setitimer(signal.ITIMER_VIRTUAL, self.cpu_seconds)
+        try:
+            return function(*args)
+        finally:
+            signal.setitimer(signal.ITIMER_VIRTUAL, 0)
+            if memory_limited:
+                resource.setrlimit(resource.RLIMIT_AS, (self.memory_limit, self.memory_limit))
+
+    def add_code(self, code_hash, code):
+        if code_hash in self.codes:
+            return
+        try:
+            tree = ast.parse(code, '<strategy>')
+            check_code(tree)
+            self.codes[code_hash] = compile(tree, '<strategy>', 'exec')
+        except (SyntaxError, ValueError) as e:
+            self.codes[code_hash] = f"编译失败: {e}"
+
+    def create_instance(self, code_hash, seed):
+        """执行策略代码，返回 (make_move, 是否传递锦标赛ID)"""
+        code = self.codes.get(code_hash)
+        if code is None:
+            raise ValueError("未知的策略代码")
+        if isinstance(code, str):
+            raise ValueError(code)
+
+        rng = public_proxy(random.Random(seed), 'random')
+        namespace = {'__builtins__': instance_builtins(rng), '__name__': 'strategy', 'random': rng}
+        self.run_limited(exec, code, namespace)
+        make_move = namespace.get('make_move')
+        if not callable(make_move):
+            raise ValueError("策略代码没有定义 make_move 函数")
+
+        # 只读取普通函数的参数个数（不会执行策略代码），其他可调用对象只传递对手历史
+        argcount = 1
+        if type(make_move) is types.FunctionType:
+            AUDIT_GUARD.trusted = True
+            try:
+                argcount = make_move.__code__.co_argcount
+            finally:
+                AUDIT_GUARD.trusted = False
+        return make_move, argcount > 1
+
+    def move(self, code_hash, key, history, tournament_id, seed):
+        instance = self.instances.get(key)
+        if instance is None:
+            instance = self.instances[key] = self.create_instance(code_hash, seed)
+        elif isinstance(instance, str):
+            raise InstanceDisabled(instance)
+
+        make_move, accepts_tournament_id = instance
+        opponent_history = list(history)
+        if accepts_tournament_id:
+            return self.run_limited(make_move, opponent_history, tournament_id)
+        return self.run_limited(make_move, opponent_history)
+
+    def handle(self, request):
+        for code_hash, code in request.get('codes', {}).items():
+            self.add_code(code_hash, code)
+        for key in request.get('release', ()):
+            self.instances.pop(key, None)
+
+        moves = []
+        errors = {}
+        for index, (code_hash, key, history, tournament_id, seed) in enumerate(request.get('calls', ())):
+            try:
+                choice = self.move(code_hash, key, history, tournament_id, seed)
+                if choice not in ('C', 'D'):
+                    raise ValueError(f"返回无效结果: {choice!r}")
+                moves.append(choice)
+                continue
+            except InstanceDisabled:
+                moves.append(None)
+                continue
+            except CallTimeout:
+                error = "超出CPU时间限制"
+            except MemoryError:
+                error = "超出内存限制"
+            except RecursionError:
+                error = "递归层数过深"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            # 执行失败的实例在本场比赛剩余回合中不再执行
+            self.instances[key] = error
+            moves.append(None)
+            errors[index] = error[:200]
+        return {'moves': moves, 'errors': errors}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cpu-seconds', type=float, default=1.0)
+    parser.add_argument('--memory-mb', type=int, default=256)
+    parser.add_argument('--call-memory-mb', type=int, default=64)
+    args = parser.parse_args()
+
+    # 协议使用原来的标准输出，策略代码的 print 输出重定向到标准错误
+    protocol = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    signal.signal(signal.SIGVTALRM, raise_timeout)
+    apply_limits(args.memory_mb)
+    sandbox = Sandbox(args.cpu_seconds, args.call_memory_mb)
+    sys.addaudithook(AUDIT_GUARD)
+    AUDIT_GUARD.enabled = True
+
+    for line in sys.stdin:
+        try:
+            response = sandbox.handle(json.loads(line))
+        except MemoryError:
+            response = {'moves': None, 'errors': {'request': "超出内存限制"}}
+        protocol.write(json.dumps(response) + '\n')
+        protocol.flush()
+
+
+if __name__ == '__main__':
+    main()
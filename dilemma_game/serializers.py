@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Strategy, Game, Round, Tournament, TournamentParticipant, TournamentMatch
 
@@ -108,6 +109,23 @@ class TournamentMatchSerializer(serializers.ModelSerializer):
                   'player1_score', 'player2_score', 'status', 'created_at', 'completed_at']
         read_only_fields = ['player1_score', 'player2_score', 'status', 'created_at', 'completed_at']
 
+class MatchParticipantSerializer(serializers.ModelSerializer):
+    strategy_name = serializers.CharField(source='strategy.name', read_only=True)
+    
+    class Meta:
+        model = TournamentParticipant
+        fields = ['id', 'strategy_id', 'strategy_name']
+
+class TournamentMatchListSerializer(serializers.ModelSerializer):
+    """比赛列表接口使用的精简序列化器，参赛者只包含ID和策略名称"""
+    participant1 = MatchParticipantSerializer(read_only=True)
+    participant2 = MatchParticipantSerializer(read_only=True)
+    
+    class Meta:
+        model = TournamentMatch
+        fields = ['id', 'participant1', 'participant2', 'repetition', 'player1_score', 'player2_score',
+                  'status', 'actual_rounds', 'created_at', 'completed_at']
+
 class TournamentSerializer(serializers.ModelSerializer):
     # 使用SerializerMethodField来更好地控制错误处理
     participants = serializers.SerializerMethodField()
@@ -119,17 +137,58 @@ class TournamentSerializer(serializers.ModelSerializer):
         model = Tournament
         fields = ['id', 'name', 'description', 'created_by', 'created_by_username',
                   'rounds_per_match', 'use_random_rounds', 'min_rounds', 'max_rounds', 
-                  'use_probability_model', 'continue_probability',
-                  'repetitions', 'status', 'created_at',
+                  'use_probability_model', 'continue_probability', 'use_expected_payoffs',
+                  'repetitions', 'seed', 'workers', 'status', 'created_at',
                   'completed_at', 'payoff_matrix', 'participants', 'matches']
         read_only_fields = ['created_by', 'status', 'created_at', 'completed_at']
     
+    # 每个锦标赛预览的比赛数量
+    MATCH_PREVIEW_SIZE = 10
+    
+    @staticmethod
+    def participant_queryset():
+        return TournamentParticipant.objects.select_related('strategy').defer('strategy__code').order_by('id')
+    
+    @staticmethod
+    def match_preview_queryset():
+        return TournamentMatch.objects.select_related(
+            'participant1__strategy', 'participant2__strategy'
+        ).only(
+            'id', 'tournament_id', 'repetition', 'player1_score', 'player2_score', 'status',
+            'actual_rounds', 'created_at', 'completed_at',
+            'participant1__id', 'participant1__strategy__name',
+            'participant2__id', 'participant2__strategy__name',
+        ).order_by('id')
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        预先加载序列化需要的关联数据：无论有多少个锦标赛、参赛者和比赛，
+        固定用3次查询（锦标赛和创建者、参赛者和策略、每个锦标赛的前几场比赛）
+        """
+        return queryset.select_related('created_by').prefetch_related(
+            Prefetch('participants', queryset=TournamentSerializer.participant_queryset()),
+            Prefetch(
+                'matches',
+                queryset=TournamentSerializer.match_preview_queryset()[:TournamentSerializer.MATCH_PREVIEW_SIZE],
+                to_attr='preview_matches'
+            ),
+        )
+    
+    @staticmethod
+    def preview_matches(obj):
+        """锦标赛的前几场比赛，没有预先加载时单独查询"""
+        if hasattr(obj, 'preview_matches'):
+            return obj.preview_matches
+        return list(
+            TournamentSerializer.match_preview_queryset().filter(tournament=obj)[:TournamentSerializer.MATCH_PREVIEW_SIZE]
+        )
+    
     def get_participants(self, obj):
         """安全地获取参赛者数据"""
         try:
-            participants = TournamentParticipant.objects.filter(tournament=obj)
             result = []
-            for p in participants:
+            for p in obj.participants.all():
                 try:
                     result.append({
                         'id': p.id,
@@ -153,9 +212,8 @@ class TournamentSerializer(serializers.ModelSerializer):
         """安全地获取比赛数据"""
         try:
             # 只返回前10个比赛，避免返回过多数据
-            matches = TournamentMatch.objects.filter(tournament=obj)[:10]
             result = []
-            for m in matches:
+            for m in self.preview_matches(obj):
                 try:
                     result.append({
                         'id': m.id,
@@ -1,19 +1,57 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Tuple, Dict, List, Any
 from django.utils import timezone
-from .models import Game, Round, Strategy, Tournament, TournamentParticipant, TournamentMatch
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThan
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from django.conf import settings
+from .models import Game, Round, Strategy, StrategyStats, Tournament, TournamentParticipant, TournamentMatch, TournamentJob
+import os
 import random
+import subprocess
+import sys
+import threading
 import time
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import math
 import json
 import logging
 # 导入策略模块
-from .strategies import execute_strategy as exec_strategy
+from .native_strategies import (
+    BaseStrategy, QLearning, discard_q_learning_checkpoint, flush_q_learning_model,
+    restore_q_learning_checkpoint, save_q_learning_checkpoint
+)
+from . import charts, engine, expected_payoffs, vector_engine
 
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
+class GameState:
+    """一场进行中游戏的内存状态：双方策略实例和选择历史（列表形式及压缩形式）"""
+    
+    def __init__(self, player1: BaseStrategy, player2: BaseStrategy, player1_history: List[str], player2_history: List[str]):
+        self.player1 = player1
+        self.player2 = player2
+        self.player1_history = player1_history
+        self.player2_history = player2_history
+        self.player1_moves = bytearray(engine.pack_moves(player1_history))
+        self.player2_moves = bytearray(engine.pack_moves(player2_history))
+    
+    @property
+    def rounds(self) -> int:
+        """已进行的回合数"""
+        return len(self.player1_history)
+    
+    def record(self, player1_choice: str, player2_choice: str) -> None:
+        """追加一个回合的选择"""
+        engine.append_move(self.player1_moves, self.rounds, player1_choice)
+        engine.append_move(self.player2_moves, self.rounds, player2_choice)
+        self.player1_history.append(player1_choice)
+        self.player2_history.append(player2_choice)
+
 class GameService:
     @staticmethod
     def calculate_round_scores(player1_choice: str, player2_choice: str) -> Tuple[int, int]:
@@ -26,50 +64,72 @@ class GameService:
         }
         return score_matrix[(player1_choice, player2_choice)]
 
+    # 每场游戏的内存状态缓存，键为游戏ID，值为 GameState
+    # 按最近使用顺序淘汰，进程重启或被淘汰后根据游戏记录的压缩历史重建
+    _game_states = OrderedDict()
+    GAME_STATES_CACHE_SIZE = 256
+
     @staticmethod
-    def execute_strategy(strategy, opponent_history, tournament_id=None):
-        """执行策略，获取下一步动作
+    def create_player(strategy, tournament_id=None, rng=None) -> BaseStrategy:
+        """为一场比赛创建策略实例
         
         参数:
             strategy: Strategy对象
-            opponent_history: 对手的历史选择列表
             tournament_id: 当前锦标赛ID，用于Q-learning策略
+            rng: 随机数生成器，默认使用全局 random 模块
             
         返回:
-            'C' 或 'D'
+            BaseStrategy 实例
         """
-        try:
-            # 检查是否为预设策略
-            if strategy.is_preset:
-                # 检查是否为Q-learning策略
-                if strategy.preset_id == 'q_learning':
-                    # Q-learning策略需要传递tournament_id参数
-                    choice = exec_strategy(strategy.preset_id, opponent_history, tournament_id=tournament_id)
-                    logger.info(f"Q-learning策略 (tournament_id={tournament_id}) 选择了: {choice}")
-                    return choice
-                choice = exec_strategy(strategy.preset_id, opponent_history)
-                logger.info(f"预设策略 {strategy.preset_id} 选择了: {choice}")
-                return choice
-            else:
-                # 用户自定义策略
-                choice = exec_strategy(strategy.id, opponent_history)
-                logger.info(f"自定义策略 {strategy.id} 选择了: {choice}")
-                return choice
-        except Exception as e:
-            logger.error(f"执行策略 {strategy.name} 时出错: {e}")
-            
-            # 如果策略执行失败，根据策略类型提供默认行为，而不是总是返回'C'
-            if strategy.is_preset:
-                if strategy.preset_id == 'always_defect':
-                    return 'D'
-                elif strategy.preset_id == 'random':
-                    import random
-                    return random.choice(['C', 'D'])
-                elif strategy.preset_id == 'tit_for_tat':
-                    return 'C' if not opponent_history else opponent_history[-1]
+        return engine.create_player(engine.strategy_spec(strategy), rng=rng, tournament_id=tournament_id)
+
+    @staticmethod
+    def execute_strategy(player: BaseStrategy, opponent_history):
+        """执行策略，获取下一步动作
+        
+        参数:
+            player: 本场比赛的策略实例
+            opponent_history: 对手的历史选择列表
             
-            # 如果无法确定默认行为，返回合作
-            return 'C'
+        返回:
+            'C' 或 'D'
+        """
+        return engine.execute_move(player, opponent_history)
+
+    @staticmethod
+    def get_game_state(game: Game) -> GameState:
+        """获取一场游戏的内存状态，缓存未命中时根据压缩历史恢复策略实例"""
+        cached = GameService._game_states.get(game.id)
+        if cached is not None and cached.rounds == game.current_round:
+            GameService._game_states.move_to_end(game.id)
+            return cached
+        
+        moves = game.get_moves()
+        if moves is None:
+            # 旧数据没有压缩历史，从回合记录重建一次
+            previous_rounds = Round.objects.filter(game=game).order_by('round_number').values_list(
+                'player1_choice', 'player2_choice'
+            )
+            moves = ([r[0] for r in previous_rounds], [r[1] for r in previous_rounds])
+        player1_history, player2_history = moves
+        
+        player1 = GameService.create_player(game.strategy1)
+        player2 = GameService.create_player(game.strategy2)
+        if player1_history:
+            player1.replay(player1_history, player2_history)
+            player2.replay(player2_history, player1_history)
+        return GameState(player1, player2, player1_history, player2_history)
+
+    @staticmethod
+    def store_game_state(game: Game, state: GameState) -> None:
+        """缓存一场游戏的内存状态，游戏结束后移除"""
+        if game.status == 'COMPLETED':
+            GameService._game_states.pop(game.id, None)
+            return
+        GameService._game_states[game.id] = state
+        GameService._game_states.move_to_end(game.id)
+        while len(GameService._game_states) > GameService.GAME_STATES_CACHE_SIZE:
+            GameService._game_states.popitem(last=False)
 
     @staticmethod
     def play_round(game: Game) -> Round:
@@ -77,19 +137,12 @@ class GameService:
         if game.current_round >= game.total_rounds:
             raise ValueError("Game has already completed all rounds")
 
-        # 获取双方历史选择
-        player1_history = []  # 玩家1历史选择
-        player2_history = []  # 玩家2历史选择
-        
-        # 获取之前的回合记录
-        previous_rounds = Round.objects.filter(game=game).order_by('round_number')
-        for prev_round in previous_rounds:
-            player1_history.append(prev_round.player1_choice)
-            player2_history.append(prev_round.player2_choice)
+        # 获取双方策略实例和历史选择，不需要读取之前的回合记录
+        state = GameService.get_game_state(game)
 
         # 执行策略获取选择
-        player1_choice = GameService.execute_strategy(game.strategy1, player2_history)
-        player2_choice = GameService.execute_strategy(game.strategy2, player1_history)
+        player1_choice = GameService.execute_strategy(state.player1, state.player2_history)
+        player2_choice = GameService.execute_strategy(state.player2, state.player1_history)
 
         # Calculate scores
         p1_score, p2_score = GameService.calculate_round_scores(player1_choice, player2_choice)
@@ -105,7 +158,10 @@ class GameService:
             player2_score=p2_score
         )
 
-        # Update game scores and round counter
+        # Update game scores, round counter and compact history
+        state.record(player1_choice, player2_choice)
+        game.player1_moves = bytes(state.player1_moves)
+        game.player2_moves = bytes(state.player2_moves)
         game.player1_score += p1_score
         game.player2_score += p2_score
         game.current_round = round_number
@@ -115,7 +171,13 @@ class GameService:
             game.status = 'COMPLETED'
             game.completed_at = timezone.now()
 
-        game.save()
+        with transaction.atomic():
+            game.save()
+            if game.status == 'COMPLETED':
+                LeaderboardService.record_game(game)
+        GameService.store_game_state(game, state)
+        if game.status == 'COMPLETED':
+            GameService.flush_learning(state)
         return round
 
     @staticmethod
@@ -124,19 +186,79 @@ class GameService:
         return Game.objects.create(
             strategy1=strategy1,
             strategy2=strategy2,
-            total_rounds=total_rounds
+            total_rounds=total_rounds,
+            player1_moves=b'',
+            player2_moves=b''
         )
 
     @staticmethod
-    def play_full_game(strategy1: Strategy, strategy2: Strategy, total_rounds: int = 200) -> Game:
-        """Create and play a full game between two strategies."""
-        game = GameService.create_game(strategy1, strategy2, total_rounds)
+    def play_remaining_rounds(game: Game, summary_only: bool = False) -> Game:
+        """
+        在内存中进行游戏剩余的所有回合，然后在一个事务中批量写入
         
-        while game.current_round < game.total_rounds:
-            GameService.play_round(game)
+        参数:
+            game: 游戏对象
+            summary_only: 为True时不写入每回合的 Round 记录，只更新游戏的得分和压缩历史
+            
+        返回:
+            更新后的游戏对象
+        """
+        if game.current_round >= game.total_rounds:
+            raise ValueError("Game has already completed all rounds")
+        
+        state = GameService.get_game_state(game)
+        rounds = []
         
+        for round_number in range(game.current_round + 1, game.total_rounds + 1):
+            # 执行策略获取选择
+            player1_choice = GameService.execute_strategy(state.player1, state.player2_history)
+            player2_choice = GameService.execute_strategy(state.player2, state.player1_history)
+            p1_score, p2_score = GameService.calculate_round_scores(player1_choice, player2_choice)
+            
+            state.record(player1_choice, player2_choice)
+            game.player1_score += p1_score
+            game.player2_score += p2_score
+            if not summary_only:
+                rounds.append(Round(
+                    game=game,
+                    round_number=round_number,
+                    player1_choice=player1_choice,
+                    player2_choice=player2_choice,
+                    player1_score=p1_score,
+                    player2_score=p2_score
+                ))
+        
+        game.player1_moves = bytes(state.player1_moves)
+        game.player2_moves = bytes(state.player2_moves)
+        game.current_round = game.total_rounds
+        game.status = 'COMPLETED'
+        game.completed_at = timezone.now()
+        
+        with transaction.atomic():
+            Round.objects.bulk_create(rounds, batch_size=1000)
+            game.save()
+            LeaderboardService.record_game(game)
+        
+        GameService.store_game_state(game, state)
+        GameService.flush_learning(state)
         return game
 
+    @staticmethod
+    def flush_learning(state: GameState) -> None:
+        """游戏结束时，如果有Q-learning策略参与，刷新游戏共用的Q-learning模型"""
+        if isinstance(state.player1, QLearning) or isinstance(state.player2, QLearning):
+            flush_q_learning_model(None)
+
+    @staticmethod
+    def play_full_game(strategy1: Strategy, strategy2: Strategy, total_rounds: int = 200,
+                       summary_only: bool = False) -> Game:
+        """Create and play a full game between two strategies.
+        
+        summary_only 为True时不写入每回合的 Round 记录，只保存最终得分和压缩历史。
+        """
+        game = GameService.create_game(strategy1, strategy2, total_rounds)
+        return GameService.play_remaining_rounds(game, summary_only=summary_only)
+
     @staticmethod
     def get_game_summary(game: Game) -> Dict:
         """Get a summary of the game results."""
@@ -161,13 +283,113 @@ class GameService:
         else:
             return "Tie"
 
+class LeaderboardService:
+    """
+    排行榜数据（StrategyStats）的维护
+
+    游戏完成时把双方得分加到各自策略的统计上，删除已完成的游戏时（包括删除策略时的级联删除，
+    见 signals.py）减去，排行榜页面只需一次查询读取一页数据。自己对自己的游戏按两场计算。
+    """
+
+    @staticmethod
+    def apply(strategy_id: int, games: int, score: int) -> None:
+        """在一条UPDATE语句中调整策略的场数、总分并重新计算平均分，统计不存在时创建"""
+        new_games = F('total_games') + games
+        updated = StrategyStats.objects.filter(strategy_id=strategy_id).update(
+            total_games=new_games,
+            total_score=F('total_score') + score,
+            avg_score=Case(
+                When(GreaterThan(new_games, 0),
+                     then=Cast(F('total_score') + score, FloatField()) / new_games),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+        if updated:
+            if games < 0:
+                StrategyStats.objects.filter(strategy_id=strategy_id, total_games__lte=0).delete()
+            return
+        if games > 0:
+            try:
+                with transaction.atomic():
+                    StrategyStats.objects.create(
+                        strategy_id=strategy_id, total_games=games, total_score=score, avg_score=score / games
+                    )
+            except IntegrityError:
+                # 其他进程同时创建了这条统计，改为更新
+                LeaderboardService.apply(strategy_id, games, score)
+
+    @staticmethod
+    def record_game(game: Game) -> None:
+        """游戏完成时调用，把双方得分计入排行榜"""
+        LeaderboardService.apply(game.strategy1_id, 1, game.player1_score)
+        LeaderboardService.apply(game.strategy2_id, 1, game.player2_score)
+
+    @staticmethod
+    def remove_game(game: Game) -> None:
+        """删除游戏前调用（Game 的 pre_delete 信号），已完成的游戏从排行榜中减去"""
+        if game.status != 'COMPLETED':
+            return
+        LeaderboardService.apply(game.strategy1_id, -1, -game.player1_score)
+        LeaderboardService.apply(game.strategy2_id, -1, -game.player2_score)
+
+    @staticmethod
+    def rebuild() -> int:
+        """
+        根据所有已完成的游戏重新生成排行榜数据
+
+        返回:
+            有统计的策略数量
+        """
+        totals = defaultdict(lambda: [0, 0])
+        completed = Game.objects.filter(status='COMPLETED')
+        for strategy_field, score_field in (('strategy1', 'player1_score'), ('strategy2', 'player2_score')):
+            for row in completed.values(strategy_field).annotate(games=Count('id'), score=Sum(score_field)):
+                totals[row[strategy_field]][0] += row['games']
+                totals[row[strategy_field]][1] += row['score'] or 0
+
+        with transaction.atomic():
+            StrategyStats.objects.all().delete()
+            StrategyStats.objects.bulk_create([
+                StrategyStats(strategy_id=strategy_id, total_games=games, total_score=score, avg_score=score / games)
+                for strategy_id, (games, score) in totals.items()
+            ])
+        return len(totals)
+
+    @staticmethod
+    def ranking():
+        """
+        按平均分从高到低排列的排行榜，平均分相同时按策略ID排列
+
+        返回:
+            Strategy 查询集，附加 total_games、total_score、avg_score 字段；
+            没有完成过游戏的策略（没有统计）也会列出，各项为0
+        """
+        return Strategy.objects.select_related('created_by').annotate(
+            total_games=Coalesce(F('stats__total_games'), 0),
+            total_score=Coalesce(F('stats__total_score'), 0),
+            avg_score=Coalesce(F('stats__avg_score'), Value(0.0)),
+        ).order_by('-avg_score', 'id')
+
 # 添加新的锦标赛服务类
+# 执行比赛后需要写回的 TournamentMatch 字段
+MATCH_RESULT_FIELDS = [
+    'player1_score', 'player2_score', 'status', 'completed_at', 'actual_rounds', 'player1_moves', 'player2_moves'
+]
+
 class TournamentService:
+    # 每执行多少场比赛提交一次结果（检查点）
+    CHECKPOINT_SIZE = 5000
+    
+    # 用户策略的比赛每次按回合同步执行的场数
+    SANDBOX_BATCH_SIZE = 500
+    
     @staticmethod
     def create_tournament(name: str, description: str, user, rounds_per_match: int = 200, 
                           repetitions: int = 5, payoff_matrix: Dict = None,
                           use_random_rounds: bool = False, min_rounds: int = 100, max_rounds: int = 300,
-                          use_probability_model: bool = False, continue_probability: float = 0.95) -> Tournament:
+                          use_probability_model: bool = False, continue_probability: float = 0.95,
+                          use_expected_payoffs: bool = False, seed: int = None, workers: int = 1) -> Tournament:
         """
         创建一个新的锦标赛
         
@@ -183,6 +405,9 @@ class TournamentService:
             max_rounds: 最大回合数 (当use_random_rounds为True时使用)
             use_probability_model: 是否使用概率模型决定比赛是否继续下一轮
             continue_probability: 继续下一轮的概率 (当use_probability_model为True时使用)
+            use_expected_payoffs: 概率模型下是否精确计算能表示为有限状态机的对阵的期望得分
+            seed: 随机种子，设置后锦标赛结果可复现
+            workers: 执行比赛使用的进程数量
             
         返回:
             创建的锦标赛对象
@@ -197,7 +422,10 @@ class TournamentService:
             min_rounds=min_rounds,
             max_rounds=max_rounds,
             use_probability_model=use_probability_model,
-            continue_probability=continue_probability
+            continue_probability=continue_probability,
+            use_expected_payoffs=use_expected_payoffs,
+            seed=seed,
+            workers=workers
         )
         
         # 如果提供了自定义收益矩阵，则更新
@@ -234,12 +462,20 @@ class TournamentService:
         )
     
     @staticmethod
-    def generate_matches(tournament: Tournament) -> List[TournamentMatch]:
+    def generate_matches(tournament: Tournament, completed_only: bool = False, workers: int = None,
+                         progress_callback=None, batch_size: int = 1000) -> List[TournamentMatch]:
         """
         生成锦标赛的所有比赛
         
+        比赛对象先在内存中构建，然后在同一个事务中分批 bulk_create 写入数据库。
+        
         参数:
             tournament: 锦标赛对象
+            completed_only: 为True时不写入待执行的比赛，而是直接执行所有比赛，
+                            每完成一批就写入这批已完成的比赛结果
+            workers: completed_only 模式下执行比赛的进程数量，None表示使用锦标赛的设置
+            progress_callback: completed_only 模式下的进度回调，参数为 (已完成比赛数, 比赛总数)
+            batch_size: 每批写入的比赛数量
             
         返回:
             生成的比赛列表
@@ -248,42 +484,92 @@ class TournamentService:
         if tournament.status != 'CREATED':
             raise ValueError("Matches can only be generated for tournaments in 'CREATED' status")
         
-        # 获取所有参赛者
-        participants = list(TournamentParticipant.objects.filter(tournament=tournament))
-        
-        if len(participants) < 2:
+        if TournamentParticipant.objects.filter(tournament=tournament).count() < 2:
             raise ValueError("Tournament needs at least 2 participants to generate matches")
         
-        created_matches = []
+        # 没有指定种子时随机生成一个，保证中断后继续执行的比赛与原本的结果一致
+        if tournament.seed is None:
+            tournament.seed = random.randrange(2 ** 31)
+        
+        matches = TournamentService.remaining_matches(tournament)
+        
+        if completed_only:
+            # 更新锦标赛状态为进行中，之后每批比赛完成时写入数据库，中断后可以继续
+            tournament.status = 'IN_PROGRESS'
+            tournament.save()
+            TournamentService.play_matches(
+                tournament, matches, workers=workers, progress_callback=progress_callback
+            )
+            return matches
         
-        # 对于每次重复
+        with transaction.atomic():
+            created_matches = TournamentMatch.objects.bulk_create(matches, batch_size=batch_size)
+            
+            # 更新锦标赛状态为进行中
+            tournament.status = 'IN_PROGRESS'
+            tournament.save()
+        
+        return created_matches
+    
+    @staticmethod
+    def remaining_matches(tournament: Tournament) -> List[TournamentMatch]:
+        """
+        获取锦标赛中尚未完成的比赛
+        
+        包括数据库中状态为 PENDING 的比赛，以及还没有写入数据库的对阵
+        （completed_only 模式只写入已完成的比赛）。结果按 重复次数、玩家1、玩家2
+        排序，与生成比赛的顺序相同，因此继续执行时比赛的执行顺序不变。
+        
+        参数:
+            tournament: 锦标赛对象
+            
+        返回:
+            比赛列表，尚未写入数据库的比赛没有主键
+        """
+        # 获取所有参赛者
+        participants = list(
+            TournamentParticipant.objects.filter(tournament=tournament).select_related('strategy').order_by('id')
+        )
+        
+        completed = set(
+            TournamentMatch.objects.filter(tournament=tournament, status='COMPLETED')
+            .values_list('participant1_id', 'participant2_id', 'repetition')
+        )
+        pending = {
+            (m.participant1_id, m.participant2_id, m.repetition): m
+            for m in TournamentMatch.objects.filter(tournament=tournament, status='PENDING')
+            .select_related('tournament', 'participant1__strategy', 'participant2__strategy')
+        }
+        
+        matches = []
+        # 对于每次重复，生成所有可能的对阵（包括自己对自己）
         for rep in range(1, tournament.repetitions + 1):
-            # 生成所有可能的对阵（包括自己对自己）
             for p1 in participants:
                 for p2 in participants:
-                    # 创建比赛
-                    match = TournamentMatch.objects.create(
-                        tournament=tournament,
-                        participant1=p1,
-                        participant2=p2,
-                        repetition=rep,
-                        status='PENDING'
-                    )
-                    created_matches.append(match)
+                    key = (p1.id, p2.id, rep)
+                    if key in completed:
+                        continue
+                    match = pending.get(key)
+                    if match is None:
+                        match = TournamentMatch(
+                            tournament=tournament,
+                            participant1=p1,
+                            participant2=p2,
+                            repetition=rep,
+                            status='PENDING'
+                        )
+                    matches.append(match)
         
-        # 更新锦标赛状态为进行中
-        tournament.status = 'IN_PROGRESS'
-        tournament.save()
-        
-        return created_matches
+        return matches
     
     @staticmethod
-    def play_match(match: TournamentMatch) -> Dict[str, Any]:
+    def play_match(match: TournamentMatch, save: bool = True) -> Dict[str, Any]:
         """
         执行一场锦标赛比赛
         
         参数:
             match: 锦标赛比赛对象
+            save: 是否立即保存比赛结果
             
         返回:
             比赛结果字典
@@ -295,149 +581,401 @@ class TournamentService:
         strategy1 = match.participant1.strategy
         strategy2 = match.participant2.strategy
         
-        # 获取自定义收益矩阵
-        payoff_matrix = tournament.payoff_matrix
-        
-        # 定义根据自定义收益矩阵计算分数的函数
-        def calculate_scores(p1_choice: str, p2_choice: str) -> Tuple[float, float]:
-            key = p1_choice + p2_choice
-            mapped_key = {
-                'CC': 'CC',
-                'CD': 'CD',
-                'DC': 'DC',
-                'DD': 'DD'
-            }.get(key)
-            
-            return tuple(payoff_matrix[mapped_key])
-        
-        # 初始化历史记录和分数
-        p1_history = []  # 玩家1历史选择
-        p2_history = []  # 玩家2历史选择
-        p1_score = 0
-        p2_score = 0
-        
-        # 存储每轮的选择和分数
-        rounds_data = []
-        
-        # 根据设置确定回合数或使用概率模型
-        if tournament.use_probability_model:
-            # 使用概率模型，不预先确定回合数
-            round_num = 1
-            continue_game = True
-            max_rounds = tournament.rounds_per_match  # 使用rounds_per_match作为最大回合数
-            
-            # 进行比赛，每轮后以概率w决定是否继续
-            while continue_game and round_num <= max_rounds:  # 添加最大回合数限制
-                # 执行策略获取选择
-                p1_choice = GameService.execute_strategy(strategy1, p2_history, tournament_id=tournament.id)
-                p2_choice = GameService.execute_strategy(strategy2, p1_history, tournament_id=tournament.id)
-                
-                # 计算分数
-                round_p1_score, round_p2_score = calculate_scores(p1_choice, p2_choice)
-                
-                # 更新历史和总分
-                p1_history.append(p1_choice)
-                p2_history.append(p2_choice)
-                p1_score += round_p1_score
-                p2_score += round_p2_score
-                
-                # 记录回合数据
-                rounds_data.append({
-                    'round': round_num,
-                    'p1_choice': p1_choice,
-                    'p2_choice': p2_choice,
-                    'p1_score': round_p1_score,
-                    'p2_score': round_p2_score
-                })
-                
-                # 确定是否继续下一轮 - 使用概率w
-                continue_game = random.random() < tournament.continue_probability
-                round_num += 1
-        else:
-            # 如果使用随机回合数，则在指定范围内随机生成回合数
-            rounds_to_play = random.randint(tournament.min_rounds, tournament.max_rounds) if tournament.use_random_rounds else tournament.rounds_per_match
-            
-            # 进行指定回合数的对局
-            for round_num in range(1, rounds_to_play + 1):
-                # 执行策略获取选择
-                p1_choice = GameService.execute_strategy(strategy1, p2_history, tournament_id=tournament.id)
-                p2_choice = GameService.execute_strategy(strategy2, p1_history, tournament_id=tournament.id)
-                
-                # 计算分数
-                round_p1_score, round_p2_score = calculate_scores(p1_choice, p2_choice)
-                
-                # 更新历史和总分
-                p1_history.append(p1_choice)
-                p2_history.append(p2_choice)
-                p1_score += round_p1_score
-                p2_score += round_p2_score
-                
-                # 记录回合数据
-                rounds_data.append({
-                    'round': round_num,
-                    'p1_choice': p1_choice,
-                    'p2_choice': p2_choice,
-                    'p1_score': round_p1_score,
-                    'p2_score': round_p2_score
-                })
+        result = engine.simulate_match(
+            engine.match_settings(tournament),
+            engine.strategy_spec(strategy1),
+            engine.strategy_spec(strategy2),
+            rng=TournamentService.match_rng(tournament, match)
+        )
         
         # 更新比赛结果
-        match.player1_score = p1_score
-        match.player2_score = p2_score
+        match.player1_score = result['p1_score']
+        match.player2_score = result['p2_score']
         match.status = 'COMPLETED'
         match.completed_at = timezone.now()
-        match.actual_rounds = len(rounds_data)  # 保存实际回合数
-        match.save()
+        match.actual_rounds = len(result['p1_history'])  # 保存实际回合数
+        # 压缩保存双方的选择序列，用于回放
+        match.set_moves(result['p1_history'], result['p2_history'])
+        if save:
+            match.save()
         
         # 返回比赛结果
         return {
             'match_id': match.id,
             'player1': strategy1.name,
             'player2': strategy2.name,
-            'player1_score': p1_score,
-            'player2_score': p2_score,
-            'rounds': rounds_data
+            'player1_score': result['p1_score'],
+            'player2_score': result['p2_score'],
+            'player1_moves': result['p1_history'],
+            'player2_moves': result['p2_history']
         }
     
     @staticmethod
-    def run_tournament(tournament: Tournament, update_interval: int = None) -> Dict[str, Any]:
+    def match_rng(tournament: Tournament, match: TournamentMatch):
         """
-        运行完整的锦标赛，执行所有比赛并计算结果
+        获取一场比赛使用的随机数生成器
         
         参数:
             tournament: 锦标赛对象
-            update_interval: 每执行多少场比赛更新一次进度，None表示不更新
+            match: 锦标赛比赛对象
             
         返回:
-            锦标赛结果字典
+            设置了种子的锦标赛返回按对阵和重复次数确定的 random.Random，否则返回None（使用全局 random 模块）
         """
-        # 检查锦标赛状态
-        if tournament.status == 'COMPLETED':
-            raise ValueError("Tournament has already been completed")
+        if tournament.seed is None:
+            return None
+        return engine.match_rng(TournamentService.match_seed(tournament, match))
+    
+    @staticmethod
+    def match_seed(tournament: Tournament, match: TournamentMatch):
+        """
+        获取一场比赛的种子
         
-        if tournament.status == 'CREATED':
-            # 如果是新创建的锦标赛，先生成比赛
-            TournamentService.generate_matches(tournament)
+        种子由双方策略和重复次数决定，不依赖比赛ID，因此比赛写入数据库之前
+        也可以确定，相同种子、相同参赛策略的锦标赛结果完全一致。
+        """
+        return engine.match_seed(
+            tournament.seed, match.participant1.strategy_id, match.participant2.strategy_id, match.repetition
+        )
+    
+    @staticmethod
+    def is_vectorisable(strategy: Strategy) -> bool:
+        """判断策略能否由向量化引擎执行"""
+        return bool(strategy.is_preset) and vector_engine.is_compilable(strategy.preset_id)
+    
+    @staticmethod
+    def play_matches_vectorised(tournament: Tournament, matches: List[TournamentMatch], save: bool = True) -> None:
+        """
+        使用向量化引擎执行一批比赛并批量保存结果
         
-        # 获取所有未完成的比赛
-        pending_matches = TournamentMatch.objects.filter(
-            tournament=tournament,
-            status='PENDING'
-        ).order_by('repetition')
+        参数:
+            tournament: 锦标赛对象
+            matches: 双方策略都能编译为查找表的比赛列表
+            save: 是否批量保存比赛结果
+        """
+        if not matches:
+            return
+        
+        settings = engine.match_settings(tournament)
+        specs = [
+            (
+                m.participant1.strategy.preset_id,
+                m.participant2.strategy.preset_id,
+                engine.draw_match_rounds(settings, TournamentService.match_rng(tournament, m) or random)
+            )
+            for m in matches
+        ]
+        results = vector_engine.play_matches(specs, tournament.payoff_matrix, record_moves=True)
+        
+        completed_at = timezone.now()
+        for match, spec, (p1_score, p2_score, p1_moves, p2_moves) in zip(matches, specs, results):
+            match.player1_score = p1_score
+            match.player2_score = p2_score
+            match.status = 'COMPLETED'
+            match.completed_at = completed_at
+            match.actual_rounds = spec[2]
+            match.player1_moves = p1_moves
+            match.player2_moves = p2_moves
+        
+        if save:
+            TournamentMatch.objects.bulk_update(
+                matches,
+                MATCH_RESULT_FIELDS,
+                batch_size=500
+            )
+    
+    @staticmethod
+    def uses_expected_payoffs(tournament: Tournament) -> bool:
+        """判断锦标赛是否精确计算期望得分（只在概率模型下有效）"""
+        return bool(tournament.use_probability_model and tournament.use_expected_payoffs)
+    
+    @staticmethod
+    def is_expected_payoff_computable(match: TournamentMatch) -> bool:
+        """判断比赛双方能否表示为有限状态机，从而精确计算期望得分"""
+        strategy1 = match.participant1.strategy
+        strategy2 = match.participant2.strategy
+        return (bool(strategy1.is_preset) and bool(strategy2.is_preset)
+                and expected_payoffs.can_compute(strategy1.preset_id, strategy2.preset_id))
+    
+    @staticmethod
+    def play_matches_expected(tournament: Tournament, matches: List[TournamentMatch], save: bool = True) -> None:
+        """
+        精确计算一批比赛在概率模型下的期望得分
+        
+        每个对阵只计算一次，所有重复次数得到相同的期望得分；比赛没有具体的选择序列，
+        actual_rounds 记录四舍五入后的期望回合数。
+        
+        参数:
+            tournament: 锦标赛对象
+            matches: 满足 is_expected_payoff_computable 的比赛列表
+            save: 是否批量保存比赛结果
+        """
+        if not matches:
+            return
+        
+        pairing_index = {}
+        for m in matches:
+            pairing_index.setdefault(
+                (m.participant1.strategy.preset_id, m.participant2.strategy.preset_id), len(pairing_index)
+            )
+        payoffs = expected_payoffs.expected_payoffs(
+            list(pairing_index), tournament.rounds_per_match, tournament.continue_probability,
+            tournament.payoff_matrix
+        )
+        rounds = round(expected_payoffs.expected_rounds(tournament.rounds_per_match, tournament.continue_probability))
+        
+        completed_at = timezone.now()
+        for match in matches:
+            p1_score, p2_score = payoffs[pairing_index[
+                (match.participant1.strategy.preset_id, match.participant2.strategy.preset_id)
+            ]]
+            match.player1_score = p1_score
+            match.player2_score = p2_score
+            match.status = 'COMPLETED'
+            match.completed_at = completed_at
+            match.actual_rounds = rounds
+            match.player1_moves = None
+            match.player2_moves = None
+        
+        if save:
+            TournamentMatch.objects.bulk_update(
+                matches,
+                MATCH_RESULT_FIELDS,
+                batch_size=500
+            )
+    
+    @staticmethod
+    def play_matches_parallel(tournament: Tournament, matches: List[TournamentMatch], workers: int,
+                              on_batch_completed=None, save: bool = True) -> None:
+        """
+        在多个工作进程中执行一批比赛，由主进程分批写回结果
+        
+        工作进程不访问数据库，只接收策略描述和锦标赛设置；设置了种子的锦标赛
+        每场比赛的随机数由对阵和重复次数决定，因此结果与串行执行完全相同。
+        
+        参数:
+            tournament: 锦标赛对象
+            matches: 双方策略都可以并行执行的比赛列表
+            workers: 工作进程数量
+            on_batch_completed: 每写回一批结果后调用，参数为本批完成的比赛数
+            save: 是否批量保存比赛结果
+        """
+        if not matches:
+            return
+        
+        settings = engine.match_settings(tournament)
+        # 以比赛在列表中的位置作为任务键，尚未写入数据库的比赛也可以并行执行
+        jobs = [
+            (
+                index,
+                engine.strategy_spec(m.participant1.strategy),
+                engine.strategy_spec(m.participant2.strategy),
+                TournamentService.match_seed(tournament, m)
+            )
+            for index, m in enumerate(matches)
+        ]
+        
+        # 每个进程分到多批任务，避免个别慢批次拖住整体进度
+        chunk_size = max(1, math.ceil(len(jobs) / (workers * 4)))
+        chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+        
+        # 工作进程不使用数据库连接，避免把打开的连接复制到子进程中
+        connections.close_all()
         
-        total_matches = pending_matches.count()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for results in executor.map(engine.run_match_batch, repeat(settings), chunks):
+                completed_at = timezone.now()
+                batch = []
+                for index, p1_score, p2_score, actual_rounds, p1_moves, p2_moves in results:
+                    match = matches[index]
+                    match.player1_score = p1_score
+                    match.player2_score = p2_score
+                    match.status = 'COMPLETED'
+                    match.completed_at = completed_at
+                    match.actual_rounds = actual_rounds
+                    match.player1_moves = p1_moves
+                    match.player2_moves = p2_moves
+                    batch.append(match)
+                
+                if save:
+                    TournamentMatch.objects.bulk_update(
+                        batch,
+                        MATCH_RESULT_FIELDS,
+                        batch_size=500
+                    )
+                if on_batch_completed:
+                    on_batch_completed(len(batch))
+    
+    @staticmethod
+    def play_matches_sandboxed(tournament: Tournament, matches: List[TournamentMatch],
+                               on_batch_completed=None, save: bool = True) -> None:
+        """
+        按回合同步执行包含用户策略的比赛，每回合对沙箱进程池只发送一次批量请求
+        
+        参数:
+            tournament: 锦标赛对象
+            matches: 双方策略都不依赖跨比赛共享状态的比赛列表
+            on_batch_completed: 每完成一批比赛后调用，参数为本批完成的比赛数
+            save: 是否批量保存比赛结果
+        """
+        settings = engine.match_settings(tournament)
+        batch_size = TournamentService.SANDBOX_BATCH_SIZE
+        
+        for start in range(0, len(matches), batch_size):
+            batch = matches[start:start + batch_size]
+            results = engine.simulate_matches(settings, [
+                (
+                    engine.strategy_spec(m.participant1.strategy),
+                    engine.strategy_spec(m.participant2.strategy),
+                    TournamentService.match_rng(tournament, m)
+                )
+                for m in batch
+            ])
+            
+            completed_at = timezone.now()
+            for match, result in zip(batch, results):
+                match.player1_score = result['p1_score']
+                match.player2_score = result['p2_score']
+                match.status = 'COMPLETED'
+                match.completed_at = completed_at
+                match.actual_rounds = len(result['p1_history'])
+                match.set_moves(result['p1_history'], result['p2_history'])
+            
+            if save:
+                TournamentMatch.objects.bulk_update(
+                    batch,
+                    MATCH_RESULT_FIELDS,
+                    batch_size=500
+                )
+            if on_batch_completed:
+                on_batch_completed(len(batch))
+    
+    @staticmethod
+    def play_matches(tournament: Tournament, matches: List[TournamentMatch], workers: int = None,
+                     progress_callback=None) -> None:
+        """
+        分批执行比赛，每批完成后在一个事务中写入结果并保存Q-learning模型检查点
+        
+        每批比赛按策略类型选择向量化引擎、工作进程或逐回合执行（精确计算期望得分的锦标赛中，
+        能表示为有限状态机的对阵直接计算）。已写入数据库的比赛
+        批量更新，尚未写入数据库的比赛批量创建。中断后已提交的批次不需要重新执行。
+        
+        参数:
+            tournament: 锦标赛对象
+            matches: 待执行的比赛列表
+            workers: 并行执行比赛的进程数量，None表示使用锦标赛的设置，1表示串行执行
+            progress_callback: 进度回调，参数为 (已完成比赛数, 比赛总数)，None表示不报告进度
+        """
+        if not matches:
+            return
+        
+        total_matches = len(matches)
+        workers = workers if workers is not None else tournament.workers
         completed_count = 0
         
-        # 执行每场比赛
-        for match in pending_matches:
-            TournamentService.play_match(match)
+        def report_progress(count):
+            nonlocal completed_count
+            completed_count += count
+            if progress_callback:
+                progress_callback(completed_count, total_matches)
+        
+        report_progress(0)
+        
+        for start in range(0, total_matches, TournamentService.CHECKPOINT_SIZE):
+            batch = matches[start:start + TournamentService.CHECKPOINT_SIZE]
             
-            completed_count += 1
+            # 概率模型下双方都能表示为有限状态机的比赛直接计算期望得分，不需要模拟
+            if TournamentService.uses_expected_payoffs(tournament):
+                expected_matches = []
+                simulated_matches = []
+                for match in batch:
+                    if TournamentService.is_expected_payoff_computable(match):
+                        expected_matches.append(match)
+                    else:
+                        simulated_matches.append(match)
+                TournamentService.play_matches_expected(tournament, expected_matches, save=False)
+                report_progress(len(expected_matches))
+            else:
+                simulated_matches = batch
+            
+            # 双方都能编译为查找表的比赛交给向量化引擎一次性完成
+            vector_matches = []
+            scalar_matches = []
+            for match in simulated_matches:
+                if (TournamentService.is_vectorisable(match.participant1.strategy)
+                        and TournamentService.is_vectorisable(match.participant2.strategy)):
+                    vector_matches.append(match)
+                else:
+                    scalar_matches.append(match)
+            TournamentService.play_matches_vectorised(tournament, vector_matches, save=False)
+            report_progress(len(vector_matches))
+            
+            # 不依赖进程内共享状态的比赛：多进程模式下预设策略之间的比赛交给工作进程，
+            # 有用户策略参与的比赛按回合同步执行，批量调用沙箱
+            parallel_matches = []
+            sandboxed_matches = []
+            serial_matches = []
+            for match in scalar_matches:
+                spec1 = engine.strategy_spec(match.participant1.strategy)
+                spec2 = engine.strategy_spec(match.participant2.strategy)
+                if engine.is_parallel_safe(spec1) and engine.is_parallel_safe(spec2):
+                    if workers and workers > 1:
+                        parallel_matches.append(match)
+                    else:
+                        serial_matches.append(match)
+                elif engine.is_lockstep_safe(spec1) and engine.is_lockstep_safe(spec2):
+                    sandboxed_matches.append(match)
+                else:
+                    serial_matches.append(match)
+            TournamentService.play_matches_parallel(
+                tournament, parallel_matches, workers, on_batch_completed=report_progress, save=False
+            )
+            TournamentService.play_matches_sandboxed(
+                tournament, sandboxed_matches, on_batch_completed=report_progress, save=False
+            )
             
-            # 如果设置了更新间隔，则定期更新进度
-            if update_interval and completed_count % update_interval == 0:
-                progress = (completed_count / total_matches) * 100
-                print(f"Tournament progress: {progress:.1f}% ({completed_count}/{total_matches})")
+            # 逐回合执行其余比赛
+            for match in serial_matches:
+                TournamentService.play_match(match, save=False)
+                report_progress(1)
+            
+            # 提交这批比赛结果，并保存Q-learning模型检查点
+            with transaction.atomic():
+                existing = [m for m in batch if m.pk is not None]
+                TournamentMatch.objects.bulk_update(existing, MATCH_RESULT_FIELDS, batch_size=500)
+                new = [m for m in batch if m.pk is None]
+                TournamentMatch.objects.bulk_create(new, batch_size=500)
+                save_q_learning_checkpoint(tournament.id)
+    
+    @staticmethod
+    def run_tournament(tournament: Tournament, progress_callback=None, workers: int = None) -> Dict[str, Any]:
+        """
+        运行完整的锦标赛，执行所有比赛并计算结果
+        
+        参数:
+            tournament: 锦标赛对象
+            progress_callback: 进度回调，参数为 (已完成比赛数, 比赛总数)，None表示不报告进度
+            workers: 并行执行比赛的进程数量，None表示使用锦标赛的设置，1表示串行执行
+            
+        返回:
+            锦标赛结果字典
+        """
+        # 检查锦标赛状态
+        if tournament.status == 'COMPLETED':
+            raise ValueError("Tournament has already been completed")
+        
+        if tournament.status == 'CREATED':
+            # 如果是新创建的锦标赛，直接执行所有比赛，只写入已完成的结果
+            TournamentService.generate_matches(
+                tournament, completed_only=True, workers=workers, progress_callback=progress_callback
+            )
+        else:
+            # 继续执行中断的锦标赛：从检查点恢复Q-learning模型，只执行尚未完成的比赛
+            restore_q_learning_checkpoint(tournament.id)
+            TournamentService.play_matches(
+                tournament, TournamentService.remaining_matches(tournament),
+                workers=workers, progress_callback=progress_callback
+            )
         
         # 计算参赛者的总分和平均分
         TournamentService.calculate_results(tournament)
@@ -446,85 +984,147 @@ class TournamentService:
         tournament.status = 'COMPLETED'
         tournament.completed_at = timezone.now()
         tournament.save()
+        # 写入最终的Q-learning模型，之后不再需要内存中的模型和检查点
+        flush_q_learning_model(tournament.id, release=True)
+        discard_q_learning_checkpoint(tournament.id)
         
         # 返回锦标赛结果
         return TournamentService.get_tournament_results(tournament)
     
     @staticmethod
-    def calculate_results(tournament: Tournament) -> None:
+    def matchup_stats(tournament: Tournament) -> List[Dict[str, Any]]:
         """
-        计算锦标赛结果，更新每个参赛者的得分和排名
+        用一次分组聚合查询统计每个 (玩家1, 玩家2) 对阵的已完成比赛
         
         参数:
             tournament: 锦标赛对象
+            
+        返回:
+            每个对阵一个字典：participant1, participant2, total（比赛数），
+            player1_total / player2_total（双方总分），wins / draws / losses（玩家1视角）
         """
-        # 获取所有参赛者
-        participants = TournamentParticipant.objects.filter(tournament=tournament)
-        
-        # 计算每个参赛者的得分
-        for participant in participants:
-            # 作为玩家1的比赛
-            matches_as_p1 = TournamentMatch.objects.filter(
-                tournament=tournament,
-                participant1=participant,
-                status='COMPLETED'
+        return list(
+            TournamentMatch.objects.filter(tournament=tournament, status='COMPLETED')
+            .values('participant1', 'participant2')
+            .annotate(
+                total=Count('id'),
+                player1_total=Sum('player1_score'),
+                player2_total=Sum('player2_score'),
+                wins=Sum(Case(When(player1_score__gt=F('player2_score'), then=1), default=0, output_field=IntegerField())),
+                draws=Sum(Case(When(player1_score=F('player2_score'), then=1), default=0, output_field=IntegerField())),
+                losses=Sum(Case(When(player1_score__lt=F('player2_score'), then=1), default=0, output_field=IntegerField())),
             )
+            .order_by()
+        )
+    
+    @staticmethod
+    def sample_matches(tournament: Tournament, count: int = 10, rng=None) -> List[TournamentMatch]:
+        """
+        随机抽取已完成的比赛
+        
+        不使用 order_by('?')（需要对锦标赛的所有比赛排序）：在已完成比赛的ID范围内取随机位置，
+        每个位置沿 (tournament, status, id) 索引取第一场ID不小于它的比赛，只需 count+1 次索引查询。
+        比赛ID不连续时抽样不完全均匀，用于展示已经足够。
+        
+        参数:
+            tournament: 锦标赛对象
+            count: 抽取的比赛数量
+            rng: 随机数生成器，默认使用 random 模块
             
-            # 作为玩家2的比赛
-            matches_as_p2 = TournamentMatch.objects.filter(
-                tournament=tournament,
-                participant2=participant,
-                status='COMPLETED'
+        返回:
+            按ID排序、不重复的比赛列表（比赛不足 count 场时返回全部）
+        """
+        completed = TournamentMatch.objects.filter(tournament=tournament, status='COMPLETED')
+        bounds = completed.aggregate(first_id=Min('id'), last_id=Max('id'))
+        if bounds['first_id'] is None:
+            return []
+        
+        rng = rng or random
+        matches = {}
+        while len(matches) < count:
+            position = rng.randint(bounds['first_id'], bounds['last_id'])
+            match = (
+                completed.filter(id__gte=position).exclude(id__in=list(matches))
+                .select_related('participant1', 'participant2').order_by('id').first()
             )
+            if match is None:
+                # 随机位置之后的比赛都已抽到，从头取一场
+                match = (
+                    completed.exclude(id__in=list(matches))
+                    .select_related('participant1', 'participant2').order_by('id').first()
+                )
+                if match is None:
+                    break
+            matches[match.id] = match
+        return [matches[match_id] for match_id in sorted(matches)]
+    
+    @staticmethod
+    def compute_results(tournament: Tournament) -> List[TournamentParticipant]:
+        """
+        计算参赛者的得分、胜负平和排名，但不保存
+        
+        参数:
+            tournament: 锦标赛对象
             
-            # 计算总分和比赛数
-            total_score = sum(m.player1_score for m in matches_as_p1) + sum(m.player2_score for m in matches_as_p2)
-            total_matches = matches_as_p1.count() + matches_as_p2.count()
-            
-            # 计算胜负平
-            wins = 0
-            losses = 0
-            draws = 0
-            
-            # 计算作为玩家1的胜负平
-            for match in matches_as_p1:
-                if match.player1_score > match.player2_score:
-                    wins += 1
-                elif match.player1_score < match.player2_score:
-                    losses += 1
-                else:
-                    draws += 1
-            
-            # 计算作为玩家2的胜负平
-            for match in matches_as_p2:
-                if match.player2_score > match.player1_score:
-                    wins += 1
-                elif match.player2_score < match.player1_score:
-                    losses += 1
-                else:
-                    draws += 1
-            
-            # 计算平均分
-            average_score = total_score / total_matches if total_matches > 0 else 0
+        返回:
+            按排名排序、已更新字段的参赛者列表
+        """
+        participants = list(
+            TournamentParticipant.objects.filter(tournament=tournament).select_related('strategy').order_by('id')
+        )
+        
+        # 每个参赛者的 [总分, 比赛数, 胜, 平, 负]
+        totals = {p.id: [0, 0, 0, 0, 0] for p in participants}
+        for row in TournamentService.matchup_stats(tournament):
+            # 作为玩家1的比赛
+            stats = totals[row['participant1']]
+            stats[0] += row['player1_total']
+            stats[1] += row['total']
+            stats[2] += row['wins']
+            stats[3] += row['draws']
+            stats[4] += row['losses']
             
-            # 更新参赛者的分数和胜负平
+            # 作为玩家2的比赛，胜负对调
+            stats = totals[row['participant2']]
+            stats[0] += row['player2_total']
+            stats[1] += row['total']
+            stats[2] += row['losses']
+            stats[3] += row['draws']
+            stats[4] += row['wins']
+        
+        for participant in participants:
+            total_score, total_matches, wins, draws, losses = totals[participant.id]
             participant.total_score = total_score
-            participant.average_score = average_score
-            
-            # 保存胜负平数据
+            # 计算平均分
+            participant.average_score = total_score / total_matches if total_matches > 0 else 0
             participant.wins = wins
             participant.draws = draws
             participant.losses = losses
-            
-            participant.save()
         
         # 根据平均分对参赛者排名
-        ranked_participants = list(participants.order_by('-average_score'))
-        
-        # 更新排名
-        for rank, participant in enumerate(ranked_participants, 1):
+        participants.sort(key=lambda p: p.average_score, reverse=True)
+        for rank, participant in enumerate(participants, 1):
             participant.rank = rank
-            participant.save()
+        
+        return participants
+    
+    @staticmethod
+    def calculate_results(tournament: Tournament) -> List[TournamentParticipant]:
+        """
+        计算锦标赛结果，更新每个参赛者的得分和排名
+        
+        参数:
+            tournament: 锦标赛对象
+            
+        返回:
+            按排名排序的参赛者列表
+        """
+        participants = TournamentService.compute_results(tournament)
+        TournamentParticipant.objects.bulk_update(
+            participants,
+            ['total_score', 'average_score', 'wins', 'draws', 'losses', 'rank']
+        )
+        return participants
     
     @staticmethod
     def get_tournament_results(tournament: Tournament) -> Dict[str, Any]:
@@ -540,7 +1140,7 @@ class TournamentService:
         # 获取所有参赛者（按排名排序）
         participants = TournamentParticipant.objects.filter(
             tournament=tournament
-        ).order_by('rank')
+        ).select_related('strategy').order_by('rank')
         
         # 构建参赛者结果列表
         participant_results = []
@@ -565,36 +1165,27 @@ class TournamentService:
                 
             participant_results.append(result)
         
-        # 构建详细的对阵矩阵
+        # 构建详细的对阵矩阵，所有对阵的统计来自同一次分组聚合查询
         all_participants = list(participants)
+        matchups = {
+            (row['participant1'], row['participant2']): row
+            for row in TournamentService.matchup_stats(tournament)
+        }
         matchups_matrix = {}
         
         for p1 in all_participants:
             matchups_matrix[p1.strategy.name] = {}
             for p2 in all_participants:
-                # 获取p1和p2之间的所有比赛
-                matches = TournamentMatch.objects.filter(
-                    tournament=tournament,
-                    participant1=p1,
-                    participant2=p2,
-                    status='COMPLETED'
-                )
+                row = matchups.get((p1.id, p2.id))
                 
-                if matches.exists():
-                    # 计算总分和胜负平
-                    total_score = sum(m.player1_score for m in matches)
-                    avg_score = total_score / matches.count()
-                    wins = sum(1 for m in matches if m.player1_score > m.player2_score)
-                    draws = sum(1 for m in matches if m.player1_score == m.player2_score)
-                    losses = sum(1 for m in matches if m.player1_score < m.player2_score)
-                    
+                if row:
                     # 保存更详细的对战数据
                     matchups_matrix[p1.strategy.name][p2.strategy.name] = {
-                        'avg_score': avg_score,
-                        'wins': wins,
-                        'draws': draws,
-                        'losses': losses,
-                        'total': matches.count()
+                        'avg_score': row['player1_total'] / row['total'],
+                        'wins': row['wins'],
+                        'draws': row['draws'],
+                        'losses': row['losses'],
+                        'total': row['total']
                     }
                 else:
                     matchups_matrix[p1.strategy.name][p2.strategy.name] = 'N/A'
@@ -611,6 +1202,7 @@ class TournamentService:
             'max_rounds': tournament.max_rounds,
             'use_probability_model': tournament.use_probability_model,
             'continue_probability': tournament.continue_probability,
+            'use_expected_payoffs': tournament.use_expected_payoffs,
             'created_by': tournament.created_by.username,
             'created_at': tournament.created_at.isoformat(),
             'completed_at': tournament.completed_at.isoformat() if tournament.completed_at else None,
@@ -620,18 +1212,16 @@ class TournamentService:
         }
         
         # 添加比赛的详细信息（最多10场比赛）
-        sample_matches = TournamentMatch.objects.filter(
-            tournament=tournament,
-            status='COMPLETED'
-        ).order_by('?')[:10]
+        sample_matches = TournamentService.sample_matches(tournament, 10)
         
+        payoff_matrix = tournament.payoff_matrix
         match_results = []
         for match in sample_matches:
             # 从数据库获取比赛详情
             match_data = {
                 'id': match.id,
-                'strategy1_id': match.participant1.strategy.id,
-                'strategy2_id': match.participant2.strategy.id,
+                'strategy1_id': match.participant1.strategy_id,
+                'strategy2_id': match.participant2.strategy_id,
                 'player1_score': match.player1_score,
                 'player2_score': match.player2_score,
                 'score1': match.player1_score,  # 为了兼容前端的变量名
@@ -640,36 +1230,334 @@ class TournamentService:
                 'actual_rounds': match.actual_rounds,  # 添加实际回合数
             }
             
-            # 生成回合数据（示例）- 实际上这应该从数据库中获取
-            # 但由于我们不存储具体回合，这里创建一个模拟的回合列表
+            # 解压实际记录的选择序列，旧数据没有记录时返回空列表
             rounds_data = []
-            
-            # 使用实际记录的回合数
-            rounds_count = match.actual_rounds
-            
-            # 如果没有记录回合数（旧数据），则根据锦标赛设置生成一个估算值
-            if rounds_count == 0:
-                if tournament.use_probability_model:
-                    # 使用几何分布的均值公式，μ = 1/p，其中p是停止概率
-                    stop_probability = 1 - tournament.continue_probability
-                    rounds_count = int(1 / stop_probability)
-                elif tournament.use_random_rounds:
-                    # 如果是随机回合数，使用最小和最大回合范围的中间值
-                    rounds_count = (tournament.min_rounds + tournament.max_rounds) // 2
-                else:
-                    # 如果是固定回合数，直接使用设定的回合数
-                    rounds_count = tournament.rounds_per_match
-                
-            # 生成模拟的回合数据
-            for i in range(rounds_count):
-                rounds_data.append({
-                    'moves': ['C', 'C'],  # 示例移动
-                    'scores': [3, 3]      # 示例分数
-                })
+            moves = match.get_moves()
+            if moves:
+                for p1_choice, p2_choice in zip(*moves):
+                    rounds_data.append({
+                        'moves': [p1_choice, p2_choice],
+                        'scores': payoff_matrix[p1_choice + p2_choice]
+                    })
             
             match_data['rounds'] = rounds_data
             match_results.append(match_data)
         
         results['match_results'] = match_results
         
-        return results 
\ No newline at end of file
+        return results 
+
+
+class TournamentJobService:
+    """锦标赛后台任务队列：任务保存在数据库中，由本地工作进程领取执行，不需要外部消息代理"""
+    
+    # 写入进度的最小间隔（秒），避免逐场比赛执行时频繁写数据库
+    PROGRESS_WRITE_INTERVAL = 1.0
+    
+    # 运行中的任务更新心跳的间隔（秒）
+    HEARTBEAT_INTERVAL = 30.0
+    
+    # 心跳超过这个时间（秒）没有更新的运行中任务视为工作进程已退出，可以重新领取
+    HEARTBEAT_TIMEOUT = 300.0
+    
+    @staticmethod
+    def stale_condition() -> Q:
+        """心跳已经过期的运行中任务（没有心跳记录的旧任务按最后更新时间判断）"""
+        cutoff = timezone.now() - timedelta(seconds=TournamentJobService.HEARTBEAT_TIMEOUT)
+        return Q(status='RUNNING') & (Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, updated_at__lt=cutoff))
+    
+    @staticmethod
+    def enqueue(tournament: Tournament, workers: int = None) -> TournamentJob:
+        """
+        把锦标赛加入运行队列
+        
+        参数:
+            tournament: 锦标赛对象
+            workers: 执行比赛的进程数量，None表示使用锦标赛的设置
+            
+        返回:
+            创建的任务对象
+        """
+        with transaction.atomic():
+            # 锁定锦标赛记录，同一锦标赛的并发请求依次检查；不支持行锁的数据库（SQLite）
+            # 由 TournamentJob 的唯一约束保证只有一个请求成功
+            locked = Tournament.objects.select_for_update().get(pk=tournament.pk)
+            if locked.status == 'COMPLETED':
+                raise ValueError("Tournament has already been completed")
+            
+            # 执行它的工作进程已经退出的任务不再阻止重新加入队列
+            TournamentJob.objects.filter(TournamentJobService.stale_condition(), tournament=locked).update(
+                status='FAILED', error='Worker stopped responding', finished_at=timezone.now(), updated_at=timezone.now()
+            )
+            
+            if TournamentJob.objects.filter(tournament=locked, status__in=['QUEUED', 'RUNNING']).exists():
+                raise ValueError("Tournament is already queued or running")
+            
+            try:
+                with transaction.atomic():
+                    job = TournamentJob.objects.create(tournament=locked, workers=workers)
+            except IntegrityError:
+                raise ValueError("Tournament is already queued or running")
+        
+        # 默认自动启动一个本地工作进程（已有工作进程在运行时不启动），队列清空后自动退出；
+        # 在事务提交后启动，工作进程才能看到新任务
+        if getattr(settings, 'TOURNAMENT_JOB_AUTOSTART_WORKER', True):
+            transaction.on_commit(TournamentJobService.start_local_worker)
+        
+        return job
+    
+    @staticmethod
+    def worker_lock_path() -> str:
+        """工作进程锁文件，运行中的工作进程持有它的文件锁"""
+        return str(getattr(settings, 'TOURNAMENT_WORKER_LOCK_FILE', settings.BASE_DIR / 'tournament_worker.lock'))
+    
+    @staticmethod
+    def worker_log_path() -> str:
+        """自动启动的工作进程的输出追加写入这个文件"""
+        return str(getattr(settings, 'TOURNAMENT_WORKER_LOG_FILE', settings.BASE_DIR / 'logs' / 'tournament_worker.log'))
+    
+    @staticmethod
+    def hold_worker_lock(lock_fd: int = None):
+        """
+        工作进程启动时调用：对锁文件加共享锁并持有，表示有工作进程在运行
+        
+        参数:
+            lock_fd: start_local_worker 传给新进程的、已经加了排他锁的描述符
+            
+        返回:
+            锁文件对象（关闭即释放锁），无法加锁时返回None
+        """
+        if lock_fd is not None:
+            return os.fdopen(lock_fd, 'a')
+        try:
+            import fcntl
+        except ImportError:
+            return None
+        lock_file = open(TournamentJobService.worker_lock_path(), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+    
+    @staticmethod
+    def start_local_worker() -> bool:
+        """
+        在后台启动 run_tournament_worker 命令，处理完队列中的任务后退出
+        
+        先对锁文件加排他锁：加锁失败说明已有工作进程在运行（或其他请求正在启动），不再启动。
+        加锁成功时新进程继承锁文件的描述符（--lock-fd），锁一直保持到它退出。没有 fcntl 的平台上总是启动。
+        新进程的标准输出和标准错误追加写入 worker_log_path()。
+        
+        返回:
+            是否启动了新的工作进程
+        """
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        
+        manage_py = settings.BASE_DIR / 'manage.py'
+        log_path = TournamentJobService.worker_log_path()
+        lock_file = None
+        try:
+            if fcntl is not None:
+                lock_file = open(TournamentJobService.worker_lock_path(), 'a')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    logger.info("本地锦标赛工作进程已在运行，不再启动新的进程")
+                    return False
+            
+            command = [sys.executable, str(manage_py), 'run_tournament_worker', '--exit-when-idle']
+            if lock_file is not None:
+                command += ['--lock-fd', str(lock_file.fileno())]
+            
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            with open(log_path, 'ab') as log_file:
+                subprocess.Popen(
+                    command,
+                    cwd=str(settings.BASE_DIR),
+                    stdin=subprocess.DEVNULL,
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                    pass_fds=(lock_file.fileno(),) if lock_file is not None else (),
+                    start_new_session=True
+                )
+            return True
+        except OSError as e:
+            logger.error(f"启动锦标赛工作进程失败: {e}")
+            return False
+        finally:
+            # 新进程持有自己的描述符，关闭后锁仍然保持
+            if lock_file is not None:
+                lock_file.close()
+    
+    @staticmethod
+    def mark_interrupted(tournament: Tournament, force: bool = False) -> int:
+        """
+        在当前进程中继续执行锦标赛之前，把不会再执行的任务标记为失败，以便重新加入队列
+        
+        排队中的任务和心跳已经过期的运行中任务会被标记；心跳仍在更新的运行中任务
+        （工作进程还在执行）保留，除非 force 为True。
+        
+        参数:
+            tournament: 锦标赛对象
+            force: 为True时所有排队或运行中的任务都标记为失败
+            
+        返回:
+            标记的任务数量
+        """
+        interrupted = Q(status='QUEUED') | TournamentJobService.stale_condition()
+        if force:
+            interrupted = Q(status__in=['QUEUED', 'RUNNING'])
+        return TournamentJob.objects.filter(interrupted, tournament=tournament).update(
+            status='FAILED', error='Interrupted', finished_at=timezone.now(), updated_at=timezone.now()
+        )
+    
+    @staticmethod
+    def running_job(tournament: Tournament) -> TournamentJob:
+        """
+        获取锦标赛正在由工作进程执行（心跳未过期）的任务
+        
+        返回:
+            任务对象，没有时返回None
+        """
+        return (
+            TournamentJob.objects.filter(tournament=tournament, status='RUNNING')
+            .exclude(TournamentJobService.stale_condition()).first()
+        )
+    
+    @staticmethod
+    def claim_next_job() -> TournamentJob:
+        """
+        领取最早进入队列的任务，并标记为运行中
+        
+        心跳已经过期的运行中任务（执行它的工作进程已经退出）也可以领取，锦标赛从最后一个检查点继续。
+        多个工作进程同时领取时，只有条件更新成功（同时写入新的心跳）的进程得到该任务。
+        
+        返回:
+            任务对象，队列为空时返回None
+        """
+        while True:
+            claimable = Q(status='QUEUED') | TournamentJobService.stale_condition()
+            job = TournamentJob.objects.filter(claimable).order_by('created_at', 'id').first()
+            if job is None:
+                return None
+            
+            now = timezone.now()
+            claimed = TournamentJob.objects.filter(claimable, id=job.id).update(
+                status='RUNNING', started_at=now, heartbeat_at=now, updated_at=now
+            )
+            if claimed:
+                if job.status == 'RUNNING':
+                    logger.warning(f"锦标赛任务 {job.id} 的工作进程已停止响应，重新领取执行")
+                job.refresh_from_db()
+                return job
+    
+    @staticmethod
+    def run_job(job: TournamentJob) -> TournamentJob:
+        """
+        执行任务，并把进度写入任务记录
+        
+        执行期间由后台线程每隔 HEARTBEAT_INTERVAL 秒更新一次心跳，写入进度时也会更新。
+        
+        参数:
+            job: 已领取（RUNNING）的任务对象
+            
+        返回:
+            执行结束后的任务对象
+        """
+        last_write = 0.0
+        
+        def record_progress(completed, total):
+            nonlocal last_write
+            now = time.monotonic()
+            if completed < total and now - last_write < TournamentJobService.PROGRESS_WRITE_INTERVAL:
+                return
+            last_write = now
+            now = timezone.now()
+            TournamentJob.objects.filter(id=job.id).update(
+                completed_matches=completed, total_matches=total, updated_at=now, heartbeat_at=now
+            )
+        
+        stop_heartbeat = threading.Event()
+        
+        def send_heartbeats():
+            try:
+                while not stop_heartbeat.wait(TournamentJobService.HEARTBEAT_INTERVAL):
+                    try:
+                        TournamentJobService.heartbeat(job)
+                    except Exception:
+                        # 数据库暂时不可写（例如 SQLite 正在写入检查点）时等下一次
+                        logger.warning(f"锦标赛任务 {job.id} 的心跳更新失败", exc_info=True)
+            finally:
+                # 关闭这个线程自己的数据库连接
+                connections.close_all()
+        
+        heartbeat_thread = threading.Thread(target=send_heartbeats, name=f'job-{job.id}-heartbeat', daemon=True)
+        heartbeat_thread.start()
+        try:
+            TournamentService.run_tournament(job.tournament, progress_callback=record_progress, workers=job.workers)
+            job.status = 'COMPLETED'
+        except Exception as e:
+            logger.exception(f"锦标赛任务 {job.id} 执行失败")
+            job.status = 'FAILED'
+            job.error = str(e)
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join()
+        
+        job.refresh_from_db(fields=['completed_matches', 'total_matches'])
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        
+        if job.status == 'COMPLETED':
+            TournamentJobService.prerender_charts(job.tournament)
+        return job
+    
+    @staticmethod
+    def heartbeat(job: TournamentJob) -> None:
+        """更新运行中任务的心跳时间"""
+        TournamentJob.objects.filter(id=job.id, status='RUNNING').update(heartbeat_at=timezone.now())
+    
+    @staticmethod
+    def prerender_charts(tournament: Tournament) -> None:
+        """
+        预先渲染锦标赛的Q-learning图表并写入磁盘缓存，之后的网页请求直接读取缓存
+        
+        渲染失败只记录日志，不影响任务结果。
+        """
+        try:
+            rendered = charts.prerender_charts(tournament.id)
+            if rendered:
+                logger.info(f"锦标赛 {tournament.id} 的图表已预先渲染: {', '.join(rendered)}")
+        except Exception:
+            logger.exception(f"锦标赛 {tournament.id} 的图表预先渲染失败")
+    
+    @staticmethod
+    def job_progress(job: TournamentJob) -> Dict[str, Any]:
+        """
+        获取任务的进度信息
+        
+        参数:
+            job: 任务对象
+            
+        返回:
+            包含已完成/总比赛数、完成百分比和预计剩余时间的字典
+        """
+        return {
+            'job_id': job.id,
+            'tournament_id': job.tournament_id,
+            'status': job.status,
+            'completed_matches': job.completed_matches,
+            'total_matches': job.total_matches,
+            'progress': round(job.progress, 1),
+            'eta_seconds': round(job.eta_seconds, 1) if job.eta_seconds is not None else None,
+            'error': job.error,
+            'created_at': job.created_at.isoformat(),
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'heartbeat_at': job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        }
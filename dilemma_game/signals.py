@@ -0,0 +1,19 @@
+"""
+模型信号处理
+
+游戏可能被直接删除，也可能在删除策略（或用户）时级联删除，
+排行榜数据在这里与每一次游戏删除同步。
+"""
+
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import Game
+
+
+@receiver(pre_delete, sender=Game)
+def remove_deleted_game_from_leaderboard(sender, instance, **kwargs):
+    """已完成的游戏被删除（包括级联删除）前，从双方策略的排行榜数据中减去"""
+    # services 依赖比赛引擎，在这里导入避免应用启动时加载
+    from .services import LeaderboardService
+    LeaderboardService.remove_game(instance)
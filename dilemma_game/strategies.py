@@ -1,10 +1,19 @@
 """
 预设策略定义模块
 
-这个模块包含了囚徒困境游戏中所有预设策略的定义。
-它作为系统中所有策略的单一真实来源。
+这个模块包含了囚徒困境游戏中所有预设策略的定义（名称、描述和源码），
+用于展示和让用户在此基础上编写自己的策略。
+对局时预设策略使用 native_strategies 中的原生实现，
+这里的 execute_strategy 用于执行没有原生实现的策略代码。
 """
 
+import hashlib
+import inspect
+import os
+import pickle
+import random
+import sys
+
 # 策略定义
 # 包含名称、描述、代码和实现函数
 
@@ -805,76 +814,131 @@ def make_move(opponent_history):
     }
 ]
 
+# 预设策略索引，避免每次执行时线性扫描
+PRESET_STRATEGY_INDEX = {s['id']: s for s in PRESET_STRATEGIES}
+
+# 策略持久状态，键为策略ID（锦标赛中为 "策略ID_锦标赛ID"）
+STRATEGY_STATES = {}
+
+# 已编译策略注册表，键为策略ID，值为 CompiledStrategy
+# 只有没有原生实现的预设策略（LegacyStrategy）经过这里，用户策略在沙箱中执行；
+# 传入的代码内容与缓存的不同时重新编译并替换旧条目
+COMPILED_STRATEGIES = {}
+
+
+class CompiledStrategy:
+    """
+    已编译的策略
+
+    保存编译一次后得到的 make_move 可调用对象及其调用约定，
+    之后每一步只需要一次函数调用。
+    """
+
+    def __init__(self, strategy_id, code):
+        self.strategy_id = strategy_id
+        self.code = code
+        # 当前调用绑定的状态字典，策略代码中的 globals() 返回它
+        self.state = {}
+
+        # 创建安全的执行环境，但允许访问持久状态
+        self.namespace = {
+            'random': random,
+            'os': os,
+            'pickle': pickle,
+            'sys': sys,
+            'inspect': inspect,
+            'globals': lambda: self.state,  # 替换全局函数以返回策略特定状态
+            'print': print  # 允许打印调试信息
+        }
+        local_vars = {}
+        exec(compile(code, f'<strategy {strategy_id}>', 'exec'), self.namespace, local_vars)
+
+        make_move = local_vars.get('make_move')
+        if not callable(make_move):
+            raise ValueError(f"策略 {strategy_id} 没有定义 make_move 函数")
+        self.make_move = make_move
+
+        # 判断make_move函数是否接受额外参数（如Q-learning策略的tournament_id）
+        self.accepts_tournament_id = len(inspect.signature(make_move).parameters) > 1
+
+
+def hash_strategy_code(code):
+    """
+    计算策略代码的哈希值
+
+    :param code: 策略代码
+    :return: 十六进制哈希字符串
+    """
+    return hashlib.sha1(code.encode('utf-8')).hexdigest()
+
+
+def get_compiled_strategy(strategy_id, code):
+    """
+    获取已编译的策略，必要时编译并缓存
+
+    :param strategy_id: 策略ID（预设策略ID或用户策略ID）
+    :param code: 策略代码
+    :return: CompiledStrategy 对象
+    """
+    compiled = COMPILED_STRATEGIES.get(strategy_id)
+    # 同一字符串对象直接命中；内容不同说明代码已修改，需要重新编译
+    if compiled is None or (compiled.code is not code and compiled.code != code):
+        compiled = CompiledStrategy(strategy_id, code)
+        COMPILED_STRATEGIES[strategy_id] = compiled
+    return compiled
+
+
+def clear_strategy_cache():
+    """清空已编译策略注册表"""
+    COMPILED_STRATEGIES.clear()
+
+
 # 策略实现函数
-def execute_strategy(strategy_id, opponent_history, **kwargs):
+def execute_strategy(strategy_id, opponent_history, code=None, **kwargs):
     """
     执行指定的策略
     
     :param strategy_id: 策略ID
     :param opponent_history: 对手历史选择的列表
+    :param code: 策略代码，未提供时从预设策略中查找
     :param kwargs: 额外的参数，如tournament_id
     :return: 策略的选择 ('C' 或 'D')
     """
-    # 查找匹配的策略
-    strategy = next((s for s in PRESET_STRATEGIES if s['id'] == strategy_id), None)
-    
-    if not strategy:
-        # 未找到匹配策略，记录错误
-        print(f"策略 {strategy_id} 未找到，默认返回合作")
-        return 'C'
-    
-    # 创建一个持久的全局状态对象，用于保存策略状态
-    # 使用字典，键为策略ID
-    if 'STRATEGY_STATES' not in globals():
-        globals()['STRATEGY_STATES'] = {}
+    if code is None:
+        # 查找匹配的策略
+        strategy = PRESET_STRATEGY_INDEX.get(strategy_id)
+        
+        if not strategy:
+            # 未找到匹配策略，记录错误
+            print(f"策略 {strategy_id} 未找到，默认返回合作")
+            return 'C'
+        code = strategy['code']
     
     # 获取或创建该策略的状态
     strategy_key = f"{strategy_id}"
     if 'tournament_id' in kwargs and kwargs['tournament_id']:
         strategy_key = f"{strategy_id}_{kwargs['tournament_id']}"
     
-    if strategy_key not in globals()['STRATEGY_STATES']:
-        globals()['STRATEGY_STATES'][strategy_key] = {}
-    
-    # 准备执行环境
-    import random
-    import os
-    import pickle
-    import sys
-    import inspect
-    
-    # 创建安全的执行环境，但允许访问持久状态
-    safe_globals = {
-        'random': random,
-        'os': os,
-        'pickle': pickle,
-        'sys': sys,
-        'inspect': inspect,
-        'globals': lambda: globals()['STRATEGY_STATES'][strategy_key],  # 替换全局函数以返回策略特定状态
-        'print': print  # 允许打印调试信息
-    }
-    local_vars = {}
+    state = STRATEGY_STATES.get(strategy_key)
+    if state is None:
+        state = STRATEGY_STATES[strategy_key] = {}
     
     # 执行策略代码
     try:
-        exec(strategy['code'], safe_globals, local_vars)
+        compiled = get_compiled_strategy(strategy_id, code)
+        compiled.state = state
         
-        # 确保make_move函数存在
-        if 'make_move' in local_vars and callable(local_vars['make_move']):
-            # 判断make_move函数是否接受额外参数
-            sig = inspect.signature(local_vars['make_move'])
+        if compiled.accepts_tournament_id and 'tournament_id' in kwargs:
+            # Q-learning策略，传递tournament_id
+            result = compiled.make_move(opponent_history, tournament_id=kwargs.get('tournament_id'))
+        else:
+            # 标准策略，只传递opponent_history
+            result = compiled.make_move(opponent_history)
             
-            if len(sig.parameters) > 1 and 'tournament_id' in kwargs:
-                # Q-learning策略，传递tournament_id
-                result = local_vars['make_move'](opponent_history, tournament_id=kwargs.get('tournament_id'))
-            else:
-                # 标准策略，只传递opponent_history
-                result = local_vars['make_move'](opponent_history)
-                
-            if result in ['C', 'D']:
-                return result
-            else:
-                print(f"策略 {strategy_id} 返回无效结果: {result}，应为 'C' 或 'D'")
+        if result in ['C', 'D']:
+            return result
+        else:
+            print(f"策略 {strategy_id} 返回无效结果: {result}，应为 'C' 或 'D'")
     except Exception as e:
         print(f"执行策略时出错 ({strategy_id}): {e}")
         import traceback
@@ -907,4 +971,4 @@ def get_strategy_by_id(strategy_id):
     :param strategy_id: 策略ID
     :return: 策略对象，如果未找到则返回None
     """
-    return next((s for s in PRESET_STRATEGIES if s['id'] == strategy_id), None) 
\ No newline at end of file
+    return PRESET_STRATEGY_INDEX.get(strategy_id) 
\ No newline at end of file
@@ -1,3 +1,1640 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import itertools
+import json
+import math
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from collections import OrderedDict
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import arrow_export, charts, engine, expected_payoffs, exports, model_store, q_table, vector_engine
+from .models import (
+    Game, Strategy, StrategyStats, Tournament, TournamentJob, TournamentMatch, TournamentParticipant,
+)
+from .native_strategies import NATIVE_STRATEGIES, QLearningModel
+from .sandbox import SandboxPool
+from .services import GameService, LeaderboardService, TournamentJobService, TournamentService
+from .strategies import PRESET_STRATEGIES
+from .serializers import TournamentSerializer
+
+
+class TournamentAPITestCase(TestCase):
+    """锦标赛接口测试的公共数据：一个用户和6个策略"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='player', password='password')
+        cls.strategies = [
+            Strategy.objects.create(name=f'Strategy {i}', description='', code='', created_by=cls.user)
+            for i in range(6)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_tournament(self, participant_count, repetitions=1):
+        """创建一个已生成比赛的锦标赛（循环赛，每对参赛者 repetitions 场）"""
+        tournament = Tournament.objects.create(name='Tournament', created_by=self.user, repetitions=repetitions)
+        participants = [
+            TournamentParticipant.objects.create(tournament=tournament, strategy=strategy)
+            for strategy in self.strategies[:participant_count]
+        ]
+        TournamentMatch.objects.bulk_create([
+            TournamentMatch(tournament=tournament, participant1=p1, participant2=p2, repetition=repetition)
+            for i, p1 in enumerate(participants)
+            for p2 in participants[i + 1:]
+            for repetition in range(repetitions)
+        ])
+        return tournament
+
+
+class TournamentQueryCountTests(TournamentAPITestCase):
+    """锦标赛相关接口的查询次数不随锦标赛、参赛者和比赛的数量增加"""
+
+    def test_list_query_count_is_constant(self):
+        self.create_tournament(2)
+        # 锦标赛、参赛者、比赛预览各一次
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/tournaments/')
+        self.assertEqual(response.status_code, 200)
+
+        for _ in range(4):
+            self.create_tournament(6, repetitions=3)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/tournaments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 5)
+        for tournament in response.data:
+            self.assertLessEqual(len(tournament['matches']), TournamentSerializer.MATCH_PREVIEW_SIZE)
+        self.assertEqual(len(response.data[0]['participants']), 6)
+        self.assertEqual(len(response.data[0]['matches']), TournamentSerializer.MATCH_PREVIEW_SIZE)
+
+    def test_retrieve_query_count_is_constant(self):
+        small = self.create_tournament(2)
+        large = self.create_tournament(6, repetitions=3)
+        for tournament in (small, large):
+            with self.assertNumQueries(3):
+                response = self.client.get(f'/api/tournaments/{tournament.id}/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['created_by_username'], 'player')
+
+        match = response.data['matches'][0]
+        self.assertEqual(match['participant1']['strategy_name'], 'Strategy 0')
+        self.assertEqual(match['participant2']['strategy_name'], 'Strategy 1')
+
+    def test_detail_api_query_count_is_constant(self):
+        small = self.create_tournament(2)
+        large = self.create_tournament(6, repetitions=3)
+        for tournament in (small, large):
+            with self.assertNumQueries(3):
+                response = self.client.get(f'/api/tournaments/{tournament.id}/details/')
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(len(response.data['participants']), 6)
+        self.assertEqual(len(response.data['matches']), TournamentSerializer.MATCH_PREVIEW_SIZE)
+        self.assertEqual(response.data['participants'][5]['strategy']['name'], 'Strategy 5')
+
+    def test_get_participants_query_count_is_constant(self):
+        small = self.create_tournament(2)
+        large = self.create_tournament(6)
+        for tournament, count in ((small, 2), (large, 6)):
+            # 锦标赛和参赛者（含策略）各一次
+            with self.assertNumQueries(2):
+                response = self.client.get(f'/api/tournaments/{tournament.id}/get_participants/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([p['strategy_name'] for p in response.data], [f'Strategy {i}' for i in range(count)])
+
+
+class TournamentMatchListTests(TournamentAPITestCase):
+    """比赛列表接口：游标分页和筛选"""
+
+    def fetch_all(self, url):
+        """沿 next 链接翻完所有页，返回比赛ID列表和每页的查询次数"""
+        ids = []
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(match['id'] for match in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_all_matches_in_id_order(self):
+        tournament = self.create_tournament(6, repetitions=3)
+        ids = self.fetch_all(f'/api/tournaments/{tournament.id}/matches/?page_size=7')
+        expected = list(TournamentMatch.objects.filter(tournament=tournament).order_by('id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_filters(self):
+        tournament = self.create_tournament(6, repetitions=3)
+        other = self.create_tournament(6)
+        participant = tournament.participants.order_by('id')[2]
+        TournamentMatch.objects.filter(tournament=tournament, repetition=1).update(status='COMPLETED')
+
+        response = self.client.get(
+            f'/api/tournaments/{tournament.id}/matches/',
+            {'participant': participant.id, 'repetition': 1, 'status': 'COMPLETED'}
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(len(results), 5)
+        for match in results:
+            self.assertIn(participant.id, (match['participant1']['id'], match['participant2']['id']))
+            self.assertEqual(match['repetition'], 1)
+            self.assertEqual(match['status'], 'COMPLETED')
+
+        ids = self.fetch_all(f'/api/tournaments/{other.id}/matches/?status=PENDING')
+        self.assertEqual(len(ids), 15)
+
+    def test_invalid_filters(self):
+        tournament = self.create_tournament(2)
+        for params in ({'status': 'RUNNING'}, {'repetition': 'first'}, {'participant': 'x'}):
+            response = self.client.get(f'/api/tournaments/{tournament.id}/matches/', params)
+            self.assertEqual(response.status_code, 400)
+
+
+class TournamentResultsTests(TournamentAPITestCase):
+    """一次分组聚合得到的对阵统计、参赛者胜负平和排名与手工计算的结果一致"""
+
+    # (玩家1序号, 玩家2序号, 重复次数) -> 双方得分
+    SCORES = {
+        (0, 1, 0): (3, 1), (0, 1, 1): (2, 2),
+        (0, 2, 0): (0, 5), (0, 2, 1): (1, 4),
+        (1, 2, 0): (4, 4), (1, 2, 1): (5, 0),
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.tournament = self.create_tournament(3, repetitions=2)
+        self.participants = list(self.tournament.participants.order_by('id'))
+        for match in TournamentMatch.objects.filter(tournament=self.tournament):
+            key = (self.participants.index(match.participant1), self.participants.index(match.participant2),
+                   match.repetition)
+            match.player1_score, match.player2_score = self.SCORES[key]
+            match.status = 'COMPLETED'
+            match.save()
+        # 未完成的比赛不计入结果
+        TournamentMatch.objects.create(tournament=self.tournament, participant1=self.participants[2],
+                                       participant2=self.participants[0], repetition=0,
+                                       player1_score=100, player2_score=100)
+
+    def assertResults(self):
+        # 参赛者0: 3胜 2平 0负 1负 1负 -> 6分；参赛者1: 1负 2平 4平 5胜 -> 12分；参赛者2: 5胜 4胜 4平 0负 -> 13分
+        expected = {
+            self.participants[0].id: (6, 1.5, 1, 1, 2, 3),
+            self.participants[1].id: (12, 3.0, 1, 2, 1, 2),
+            self.participants[2].id: (13, 3.25, 2, 1, 1, 1),
+        }
+        actual = {
+            row[0]: row[1:]
+            for row in self.tournament.participants.values_list(
+                'id', 'total_score', 'average_score', 'wins', 'draws', 'losses', 'rank')
+        }
+        self.assertEqual(actual, expected)
+
+    def test_matchup_stats(self):
+        stats = {(row['participant1'], row['participant2']): row for row in TournamentService.matchup_stats(self.tournament)}
+        self.assertEqual(len(stats), 3)
+        row = stats[(self.participants[0].id, self.participants[2].id)]
+        self.assertEqual(
+            (row['total'], row['player1_total'], row['player2_total'], row['wins'], row['draws'], row['losses']),
+            (2, 1, 9, 0, 0, 2)
+        )
+        row = stats[(self.participants[0].id, self.participants[1].id)]
+        self.assertEqual((row['wins'], row['draws'], row['losses']), (1, 1, 0))
+
+    def test_calculate_results(self):
+        ranked = TournamentService.calculate_results(self.tournament)
+        self.assertEqual([p.id for p in ranked], [p.id for p in reversed(self.participants)])
+        self.assertResults()
+
+    def test_recalc_tournament_command(self):
+        TournamentParticipant.objects.filter(tournament=self.tournament).update(
+            total_score=0, average_score=0, wins=99, draws=99, losses=99, rank=None
+        )
+        output = io.StringIO()
+        call_command('recalc_tournament', self.tournament.id, stdout=output)
+        self.assertResults()
+        self.assertIn('Strategy 2: 胜=2, 平=1, 负=1', output.getvalue())
+
+
+class ChartCacheTests(TournamentAPITestCase):
+    """图表按版本缓存：未变化时返回304，锦标赛重新完成后版本改变，重新渲染"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = directory.name
+        settings_override = override_settings(CHART_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # 不调用 matplotlib，每次渲染返回不同的内容
+        self.render = mock.Mock(side_effect=lambda tournament_id: f'png-{self.render.call_count}'.encode())
+        for patcher in (mock.patch.object(charts, '_memory_cache', OrderedDict()),
+                        mock.patch.object(charts, 'renderer', return_value=self.render)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.tournament = self.create_tournament(2)
+        self.tournament.status = 'COMPLETED'
+        self.tournament.completed_at = timezone.now()
+        self.tournament.save()
+        self.url = f'/tournaments/{self.tournament.id}/q_learning/vs_opponents/'
+
+    def cached_files(self):
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.content, response['Content-Type']), (b'png-1', 'image/png'))
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        etag = response['ETag']
+        self.assertEqual(len(self.cached_files()), 1)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        # 没有验证信息时从内存缓存返回，清空内存缓存后从磁盘缓存返回
+        self.assertEqual(self.client.get(self.url).content, b'png-1')
+        charts._memory_cache.clear()
+        self.assertEqual(self.client.get(self.url).content, b'png-1')
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_new_version_invalidates_cache(self):
+        etag = self.client.get(self.url)['ETag']
+        old_files = self.cached_files()
+        # 锦标赛重新执行完成，完成时间改变
+        self.tournament.completed_at += timedelta(seconds=5)
+        self.tournament.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'png-2')
+        self.assertNotEqual(response['ETag'], etag)
+        # 旧版本的磁盘缓存被删除
+        self.assertEqual(len(self.cached_files()), 1)
+        self.assertNotEqual(self.cached_files(), old_files)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_unfinished_tournament_is_not_cached(self):
+        self.tournament.status = 'IN_PROGRESS'
+        self.tournament.save()
+        for expected in (b'png-1', b'png-2'):
+            response = self.client.get(self.url)
+            self.assertEqual(response.content, expected)
+            self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(self.cached_files(), [])
+
+
+class TournamentExportTests(TournamentAPITestCase):
+    """流式导出：包含所有比赛，可选包含每回合的选择"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.tournament = self.create_tournament(4, repetitions=2)
+        match = TournamentMatch.objects.filter(tournament=self.tournament).order_by('id').first()
+        match.actual_rounds = 3
+        match.set_moves(['C', 'D', 'C'], ['D', 'D', 'C'])
+        match.status = 'COMPLETED'
+        match.save()
+
+    def export(self, **params):
+        response = self.client.get(f'/tournaments/{self.tournament.id}/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_jsonl_export_includes_every_match_and_moves(self):
+        records = [json.loads(line) for line in self.export(format='jsonl', moves='1').splitlines()]
+        self.assertEqual(records[0]['type'], 'tournament')
+        self.assertEqual(sum(record['type'] == 'participant' for record in records), 4)
+        matches = [record for record in records if record['type'] == 'match']
+        self.assertEqual(len(matches), 12)
+        self.assertEqual(matches[0]['player1_moves'], 'CDC')
+        self.assertEqual(matches[0]['player2_moves'], 'DDC')
+        self.assertEqual(matches[0]['strategy1_name'], 'Strategy 0')
+
+    def test_csv_export_lists_matches_after_summary(self):
+        rows = list(csv.reader(io.StringIO(self.export().lstrip('\ufeff'))))
+        header = rows.index(exports.MATCH_FIELDS)
+        self.assertEqual(len(rows) - header - 1, 12)
+        self.assertNotIn('player1_moves', rows[header])
+        self.assertEqual(rows[0], ['锦标赛名称', 'Tournament'])
+
+    def test_table_export_closes_temporary_file_on_error(self):
+        output = tempfile.TemporaryFile()
+        with mock.patch('dilemma_game.views.tempfile.TemporaryFile', return_value=output), \
+                mock.patch.object(arrow_export, 'write_table', side_effect=OSError('磁盘已满')):
+            with self.assertRaises(OSError):
+                self.client.get(f'/tournaments/{self.tournament.id}/export/matches.parquet')
+        self.assertTrue(output.closed)
+
+
+@unittest.skipUnless(importlib.util.find_spec('pyarrow'), '需要安装 pyarrow')
+class ColumnarExportTests(TournamentAPITestCase):
+    """Parquet/Arrow 导出：固定的表结构，每回合选择与压缩记录一致"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.tournament = self.create_tournament(3)
+        self.match = TournamentMatch.objects.filter(tournament=self.tournament).order_by('id').first()
+        self.match.actual_rounds = 10
+        self.match.set_moves(list('CDCCDDDDCC'), list('DDCCCCCCCD'))
+        self.match.status = 'COMPLETED'
+        self.match.save()
+
+    def download(self, table, extension):
+        import pyarrow
+        response = self.client.get(f'/tournaments/{self.tournament.id}/export/{table}.{extension}')
+        self.assertEqual(response.status_code, 200)
+        data = pyarrow.py_buffer(b''.join(response.streaming_content))
+        if extension == 'parquet':
+            import pyarrow.parquet
+            return pyarrow.parquet.read_table(pyarrow.BufferReader(data))
+        return pyarrow.ipc.open_file(data).read_all()
+
+    def test_tables_have_stable_schema(self):
+        for table in arrow_export.TABLES:
+            for extension in arrow_export.FILE_FORMATS:
+                self.assertEqual(self.download(table, extension).schema, arrow_export.schemas()[table])
+
+    def test_moves_match_stored_history(self):
+        moves = self.download('moves', 'arrow').to_pydict()
+        self.assertEqual(moves['match_id'], [self.match.id] * 10)
+        self.assertEqual(moves['round'], list(range(1, 11)))
+        self.assertEqual(''.join('D' if d else 'C' for d in moves['player1_defected']), 'CDCCDDDDCC')
+        self.assertEqual(''.join('D' if d else 'C' for d in moves['player2_defected']), 'DDCCCCCCCD')
+
+        matches = self.download('matches', 'parquet')
+        self.assertEqual(matches.num_rows, 3)
+
+    def test_unknown_table(self):
+        response = self.client.get(f'/tournaments/{self.tournament.id}/export/rounds.parquet')
+        self.assertEqual(response.status_code, 404)
+
+
+def create_preset_strategy(preset_id, user):
+    """按预设策略目录创建策略"""
+    preset = next(p for p in PRESET_STRATEGIES if p['id'] == preset_id)
+    return Strategy.objects.create(name=preset['name'], description='', code=preset['code'],
+                                   created_by=user, is_preset=True, preset_id=preset_id)
+
+
+class SandboxLimitTests(SimpleTestCase):
+    """超出 CPU 时间、单次调用内存额度或进程内存上限的实例被停用，工作进程和其他实例不受影响"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pool = SandboxPool(size=1, cpu_seconds=0.2, memory_mb=256, call_memory_mb=32)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        super().tearDownClass()
+
+    def call(self, code, key):
+        return self.pool.moves([(code, key, '', 1, 1)])[0]
+
+    def assertLimitExceeded(self, code, message):
+        healthy = "def make_move(h):\n    return 'D'"
+        healthy_key = self.pool.new_key()
+        self.assertEqual(self.call(healthy, healthy_key), 'D')
+
+        key = self.pool.new_key()
+        with self.assertLogs('dilemma_game.sandbox', 'ERROR') as logs:
+            self.assertIsNone(self.call(code, key))
+        self.assertIn(message, '\n'.join(logs.output))
+        # 失败的实例在本场比赛中不再执行，也不再报告错误
+        with self.assertNoLogs('dilemma_game.sandbox', 'ERROR'):
+            self.assertIsNone(self.call(code, key))
+        # 同一工作进程中的其他实例保留状态继续执行
+        self.assertEqual(self.call(healthy, healthy_key), 'D')
+
+    def test_cpu_time_limit(self):
+        self.assertLimitExceeded("def make_move(h):\n    while True:\n        pass", "超出CPU时间限制")
+
+    def test_cpu_time_limit_cannot_be_caught(self):
+        code = ("def make_move(h):\n    try:\n        while True:\n            pass\n"
+                "    except Exception:\n        return 'C'")
+        self.assertLimitExceeded(code, "超出CPU时间限制")
+
+    def test_memory_limit(self):
+        self.assertLimitExceeded("def make_move(h):\n    data = bytearray(512 * 1024 * 1024)\n    return 'C'", "超出内存限制")
+
+    @unittest.skipUnless(os.path.exists('/proc/self/statm'), '需要 /proc 文件系统')
+    def test_per_call_memory_limit(self):
+        # 64MB 在进程上限之内，但超过单次调用的额度
+        self.assertLimitExceeded("def make_move(h):\n    data = bytearray(64 * 1024 * 1024)\n    return 'C'", "超出内存限制")
+        # 额度按每次调用计算：每次分配并释放 16MB 的实例可以一直执行
+        code = "def make_move(h):\n    data = bytearray(16 * 1024 * 1024)\n    return 'D'"
+        key = self.pool.new_key()
+        self.assertEqual([self.call(code, key) for _ in range(20)], ['D'] * 20)
+
+    @unittest.skipUnless(os.path.exists('/proc/self/environ'), '需要 /proc 文件系统')
+    def test_worker_environment_is_empty(self):
+        # 主进程的环境变量（数据库密码、密钥等）不传给工作进程
+        self.assertTrue(os.environ)
+        self.call("def make_move(h):\n    return 'C'", self.pool.new_key())
+        with open(f'/proc/{self.pool.workers[0].process.pid}/environ', 'rb') as f:
+            self.assertEqual(f.read(), b'')
+
+
+class LeaderboardTests(TournamentAPITestCase):
+    """排行榜数据随游戏完成和删除（包括删除策略时的级联删除）增量更新"""
+
+    def setUp(self):
+        super().setUp()
+        self.cooperator = create_preset_strategy('always_cooperate', self.user)
+        self.defector = create_preset_strategy('always_defect', self.user)
+        self.tit_for_tat = create_preset_strategy('tit_for_tat', self.user)
+        # 10回合：合作者 0:50，针锋相对 0:5（第一回合被背叛后一直背叛），合作者对针锋相对 30:30
+        self.games = [
+            GameService.play_full_game(self.cooperator, self.defector, total_rounds=10),
+            GameService.play_full_game(self.tit_for_tat, self.defector, total_rounds=10),
+            GameService.play_full_game(self.cooperator, self.tit_for_tat, total_rounds=10),
+        ]
+
+    def assertStats(self, strategy, total_games, total_score):
+        stats = StrategyStats.objects.get(strategy=strategy)
+        self.assertEqual((stats.total_games, stats.total_score), (total_games, total_score))
+        self.assertAlmostEqual(stats.avg_score, total_score / total_games)
+
+    def test_completed_games_are_added(self):
+        self.assertStats(self.cooperator, 2, 30)
+        self.assertStats(self.defector, 2, 55)
+        self.assertStats(self.tit_for_tat, 2, 30)
+        # 没有完成过游戏的策略排在后面，平均分为0
+        idle = [s.id for s in self.strategies]
+        self.assertEqual([s.id for s in LeaderboardService.ranking()],
+                         [self.defector.id, self.cooperator.id, self.tit_for_tat.id] + idle)
+
+    def test_game_is_added_once_when_its_last_round_is_played(self):
+        game = GameService.create_game(self.defector, self.tit_for_tat, total_rounds=3)
+        for _ in range(2):
+            GameService.play_round(game)
+            self.assertStats(self.defector, 2, 55)
+        GameService.play_round(game)
+        self.assertStats(self.defector, 3, 60)
+        self.assertStats(self.tit_for_tat, 3, 30)
+
+    def test_self_play_counts_as_two_games(self):
+        GameService.play_full_game(self.cooperator, self.cooperator, total_rounds=10)
+        self.assertStats(self.cooperator, 4, 90)
+
+    def test_incremental_stats_match_rebuild(self):
+        GameService.play_full_game(self.tit_for_tat, self.tit_for_tat, total_rounds=10)
+        self.games[1].delete()
+        incremental = list(StrategyStats.objects.order_by('strategy_id').values_list())
+        LeaderboardService.rebuild()
+        self.assertEqual(list(StrategyStats.objects.order_by('strategy_id').values_list()), incremental)
+
+    def test_deleting_strategy_removes_its_games_from_opponents(self):
+        # 与管理后台的删除相同，游戏随策略级联删除
+        self.defector.delete()
+        self.assertEqual(Game.objects.count(), 1)
+        self.assertFalse(StrategyStats.objects.filter(strategy_id=self.defector.id).exists())
+        self.assertStats(self.cooperator, 1, 30)
+        self.assertStats(self.tit_for_tat, 1, 30)
+        self.assertEqual([s.id for s in LeaderboardService.ranking()][:3],
+                         [self.cooperator.id, self.tit_for_tat.id, self.strategies[0].id])
+
+    def test_strategies_without_games_are_listed(self):
+        self.games[0].delete()
+        self.games[1].delete()
+        # 永远背叛的所有游戏都已删除，统计被删除，但排行榜中仍然列出
+        self.assertFalse(StrategyStats.objects.filter(strategy=self.defector).exists())
+        response = self.client.get('/api/leaderboard/', {'page_size': 3})
+        self.assertEqual(response.data['count'], 9)
+        self.assertEqual([row['strategy_id'] for row in response.data['results']],
+                         [self.cooperator.id, self.tit_for_tat.id, self.strategies[0].id])
+        response = self.client.get('/api/leaderboard/', {'page_size': 3, 'page': 3})
+        self.assertEqual(response.data['results'][-1], {
+            'strategy_id': self.defector.id, 'strategy_name': self.defector.name, 'created_by': 'player',
+            'total_games': 0, 'total_score': 0, 'avg_score': 0.0,
+        })
+        self.client.force_login(self.user)
+        response = self.client.get('/leaderboard/')
+        self.assertEqual(len(response.context['strategy_stats']), 9)
+        self.assertContains(response, self.defector.name)
+
+    def test_deleting_game_is_subtracted_once(self):
+        response = self.client.delete(f'/api/games/{self.games[0].id}/')
+        self.assertIn(response.status_code, (200, 204))
+        self.assertStats(self.cooperator, 1, 30)
+        self.assertStats(self.defector, 1, 5)
+        self.assertStats(self.tit_for_tat, 2, 30)
+
+
+class SandboxSecurityTests(SimpleTestCase):
+    """沙箱中的策略代码不能读写文件、取得 os/sys 模块或导入白名单以外的模块"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pool = SandboxPool(size=1, cpu_seconds=1.0, memory_mb=256)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        super().tearDownClass()
+
+    def assertRejected(self, code, message):
+        """策略执行失败，记录的错误信息包含 message"""
+        with self.assertLogs('dilemma_game.sandbox', 'ERROR') as logs:
+            moves = self.pool.moves([(code, self.pool.new_key(), 'CD', 1, 1)])
+        self.assertEqual(moves, [None])
+        self.assertIn(message, '\n'.join(logs.output))
+
+    def test_allowed_code_runs(self):
+        code = (
+            "import math\nfrom collections import deque\n"
+            "def make_move(opponent_history):\n"
+            "    globals()['rounds'] = globals().get('rounds', 0) + 1\n"
+            "    return 'D' if deque(opponent_history)[-1] == 'D' and math.isfinite(random.random()) else 'C'"
+        )
+        self.assertEqual(self.pool.moves([(code, self.pool.new_key(), 'CD', 1, 1)]), ['D'])
+
+    def test_file_access_is_rejected(self):
+        self.assertRejected("def make_move(h):\n    open('/etc/passwd')\n    return 'D'", "name 'open' is not defined")
+        self.assertRejected(
+            "def make_move(h):\n    __builtins__['open']('/etc/passwd')\n    return 'D'", "KeyError"
+        )
+
+    def test_private_attributes_are_rejected(self):
+        self.assertRejected("import collections\ndef make_move(h):\n    return collections._sys.modules['os']", "_sys")
+        self.assertRejected("def make_move(h):\n    return make_move.__globals__", "__globals__")
+        self.assertRejected(
+            "import collections\ndef make_move(h):\n    return getattr(collections, '_sys')", "'_sys'"
+        )
+        # 代理模块不包含其他模块的引用
+        self.assertRejected("import statistics\ndef make_move(h):\n    return statistics.sys", "no attribute 'sys'")
+
+    def test_format_field_traversal_is_rejected(self):
+        # 格式字符串的字段可以访问以下划线开头的属性，不经过编译时检查
+        code = "import statistics\ndef make_move(h):\n    return '{0.__globals__[sys].modules[os]}'.format(statistics.mean)"
+        self.assertRejected(code, "不允许使用 format")
+        self.assertRejected("def make_move(h):\n    return getattr('{0}', 'format_map')({})", "'format_map'")
+        # f-string 中的属性访问照常检查
+        self.assertRejected("import statistics\ndef make_move(h):\n    return f'{statistics.mean.__globals__}'", "__globals__")
+
+    def test_frame_access_is_rejected(self):
+        code = "def make_move(h):\n    def g():\n        yield frames.gi_frame\n    frames = g()\n    return next(frames)"
+        self.assertRejected(code, "PermissionError")
+
+    def test_imports_outside_allowlist_are_rejected(self):
+        for module in ('os', 'sys', 'subprocess', 'collections.abc'):
+            self.assertRejected(f"import {module}\ndef make_move(h):\n    return 'D'", f"不允许导入模块 {module}")
+        self.assertRejected("def make_move(h):\n    return __import__('socket')", "不允许导入模块 socket")
+
+
+class UserStrategyTests(TestCase):
+    """用户策略（非预设）的代码在游戏和锦标赛中真正执行，而不是按执行失败默认合作"""
+
+    # 每三回合背叛一次，与默认合作的结果不同
+    CODE = "def make_move(opponent_history):\n    return 'D' if len(opponent_history) % 3 == 2 else 'C'"
+    EXPECTED_MOVES = list('CCDCCDCCD')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='player', password='password')
+        cls.strategy = Strategy.objects.create(name='Every third', description='', code=cls.CODE, created_by=cls.user)
+        cls.cooperator = create_preset_strategy('always_cooperate', cls.user)
+        cls.tit_for_tat = create_preset_strategy('tit_for_tat', cls.user)
+
+    def test_game_runs_user_code(self):
+        game = GameService.create_game(self.strategy, self.cooperator, total_rounds=9)
+        with self.assertNoLogs('dilemma_game', 'ERROR'):
+            GameService.play_remaining_rounds(game)
+        self.assertEqual(game.get_moves(), (self.EXPECTED_MOVES, ['C'] * 9))
+        self.assertEqual(list(game.rounds.values_list('player1_choice', flat=True)), self.EXPECTED_MOVES)
+        self.assertEqual((game.player1_score, game.player2_score), (33, 18))
+
+    def test_tournament_runs_user_code(self):
+        tournament = TournamentService.create_tournament(
+            name='User code', description='', user=self.user, rounds_per_match=9, repetitions=1, seed=1
+        )
+        for strategy in (self.strategy, self.tit_for_tat):
+            TournamentService.add_participant(tournament, strategy)
+        with self.assertNoLogs('dilemma_game', 'ERROR'):
+            TournamentService.run_tournament(tournament)
+
+        matches = TournamentMatch.objects.filter(tournament=tournament).select_related('participant1', 'participant2')
+        self.assertEqual(len(matches), 4)
+        for match in matches:
+            player1_moves, player2_moves = match.get_moves()
+            pairing = (match.participant1.strategy_id, match.participant2.strategy_id)
+            with self.subTest(pairing=pairing):
+                if pairing[0] == self.strategy.id:
+                    self.assertEqual(player1_moves, self.EXPECTED_MOVES)
+                if pairing[1] == self.strategy.id:
+                    self.assertEqual(player2_moves, self.EXPECTED_MOVES)
+                if pairing == (self.strategy.id, self.tit_for_tat.id):
+                    # 针锋相对在用户策略每次背叛后的下一回合背叛
+                    self.assertEqual(player2_moves, list('CCCDCCDCC'))
+
+
+@unittest.skipUnless(importlib.util.find_spec('fcntl'), '需要 fcntl')
+class LocalWorkerStartTests(SimpleTestCase):
+    """加入队列时只在没有工作进程运行时启动新的工作进程，工作进程的输出写入日志文件"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log_path = os.path.join(directory.name, 'logs', 'worker.log')
+        settings_override = override_settings(
+            TOURNAMENT_WORKER_LOCK_FILE=os.path.join(directory.name, 'worker.lock'),
+            TOURNAMENT_WORKER_LOG_FILE=self.log_path,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_running_worker_blocks_autostart(self):
+        lock_file = TournamentJobService.hold_worker_lock()
+        self.assertIsNotNone(lock_file)
+        with mock.patch('subprocess.Popen') as popen:
+            self.assertFalse(TournamentJobService.start_local_worker())
+            lock_file.close()
+            self.assertTrue(TournamentJobService.start_local_worker())
+        self.assertEqual(popen.call_count, 1)
+
+    def test_started_worker_keeps_lock_and_logs_output(self):
+        popen = subprocess.Popen
+        processes = []
+
+        def fake_worker(command, **kwargs):
+            # 代替 run_tournament_worker：输出一行后一直运行，继承的锁描述符保持打开
+            script = "import sys, time; print('worker output'); sys.stderr.write('worker error\\n'); time.sleep(30)"
+            process = popen([sys.executable, '-u', '-c', script], **kwargs)
+            processes.append(process)
+            return process
+
+        with mock.patch('subprocess.Popen', side_effect=fake_worker):
+            self.assertTrue(TournamentJobService.start_local_worker())
+            self.assertFalse(TournamentJobService.start_local_worker())
+            self.assertEqual(len(processes), 1)
+            # 等待工作进程写出输出
+            deadline = time.monotonic() + 10
+            while 'worker error' not in self.read_log() and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+            processes[0].kill()
+            processes[0].wait()
+            self.assertTrue(TournamentJobService.start_local_worker())
+            processes[1].kill()
+            processes[1].wait()
+
+        output = self.read_log()
+        self.assertIn('worker output', output)
+        self.assertIn('worker error', output)
+
+    def read_log(self):
+        with open(self.log_path) as f:
+            return f.read()
+
+
+class StartupImportTests(SimpleTestCase):
+    """应用启动（加载模型）时不导入比赛引擎和 NumPy"""
+
+    def test_setup_does_not_import_numpy(self):
+        script = "import sys, django; django.setup(); print('numpy' in sys.modules, 'dilemma_game.engine' in sys.modules)"
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='prisoners_dilemma.settings')
+        result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.split(), ['False', 'False'])
+
+
+# 非对称的收益矩阵，交换双方时得分不同
+TEST_PAYOFF_MATRIX = {'CC': [3, 3], 'CD': [0, 5], 'DC': [5, 1], 'DD': [1, 1]}
+
+
+def preset_spec(preset_id):
+    """预设策略的描述，格式同 engine.strategy_spec"""
+    return {'id': None, 'name': preset_id, 'is_preset': True, 'preset_id': preset_id, 'code': None}
+
+
+def fixed_round_settings(rounds, payoff_matrix=TEST_PAYOFF_MATRIX, **overrides):
+    """固定回合数的比赛设置，格式同 engine.match_settings"""
+    settings = {
+        'tournament_id': None,
+        'payoff_matrix': payoff_matrix,
+        'rounds_per_match': rounds,
+        'use_random_rounds': False,
+        'min_rounds': rounds,
+        'max_rounds': rounds,
+        'use_probability_model': False,
+        'continue_probability': 1.0,
+    }
+    settings.update(overrides)
+    return settings
+
+
+class VectorEngineTests(SimpleTestCase):
+    """向量化引擎与逐回合执行的 engine.simulate_match 结果完全一致"""
+
+    compilable = [sid for sid in NATIVE_STRATEGIES if vector_engine.is_compilable(sid)]
+
+    def simulate(self, strategy1_id, strategy2_id, rounds):
+        result = engine.simulate_match(fixed_round_settings(rounds), preset_spec(strategy1_id), preset_spec(strategy2_id))
+        return (result['p1_score'], result['p2_score'],
+                engine.pack_moves(result['p1_history']), engine.pack_moves(result['p2_history']))
+
+    def assertMatchesSimulation(self, matches):
+        results = vector_engine.play_matches(matches, TEST_PAYOFF_MATRIX, record_moves=True)
+        for (strategy1_id, strategy2_id, rounds), result in zip(matches, results):
+            with self.subTest(strategy1=strategy1_id, strategy2=strategy2_id, rounds=rounds):
+                self.assertEqual(result, self.simulate(strategy1_id, strategy2_id, rounds))
+
+    def test_compilable_presets(self):
+        self.assertIn('tit_for_tat', self.compilable)
+        self.assertNotIn('random', self.compilable)
+        self.assertNotIn('q_learning', self.compilable)
+
+    def test_all_pairings_match_simulation(self):
+        pairings = [(s1, s2) for s1 in self.compilable for s2 in self.compilable]
+        for rounds in (1, 3, 200):
+            self.assertMatchesSimulation([(s1, s2, rounds) for s1, s2 in pairings])
+
+    def test_mixed_round_counts_in_one_batch(self):
+        # 同一对阵不同回合数的比赛从同一次模拟中读取
+        self.assertMatchesSimulation([
+            ('tit_for_tat', 'suspicious_tit_for_tat', 10),
+            ('tit_for_tat', 'suspicious_tit_for_tat', 11),
+            ('pavlov', 'always_defect', 7),
+            ('grudger', 'two_memory', 150),
+            ('tit_for_tat', 'suspicious_tit_for_tat', 0),
+        ])
+
+    def test_cycle_fast_forward_matches_simulation(self):
+        pairings = [(s1, s2) for s1 in self.compilable for s2 in self.compilable]
+        rounds = 2000
+        choose = vector_engine.StrategyTable.choose
+        with mock.patch.object(vector_engine.StrategyTable, 'choose', autospec=True, side_effect=choose) as lookup:
+            player1_scores, player2_scores, player1_moves, player2_moves = vector_engine.play_pairings(
+                pairings, rounds, TEST_PAYOFF_MATRIX, record_moves=True
+            )
+        # 所有对阵很快进入周期：每个策略分组每回合查表一次，只逐回合模拟了不到100回合
+        groups = len(self.compilable) * 2
+        self.assertLess(lookup.call_count, groups * 100)
+
+        settings = fixed_round_settings(rounds)
+        for column, (strategy1_id, strategy2_id) in enumerate(pairings):
+            with self.subTest(strategy1=strategy1_id, strategy2=strategy2_id):
+                result = engine.simulate_match(settings, preset_spec(strategy1_id), preset_spec(strategy2_id))
+                self.assertEqual(''.join('D' if move else 'C' for move in player1_moves[:, column]),
+                                 ''.join(result['p1_history']))
+                self.assertEqual(''.join('D' if move else 'C' for move in player2_moves[:, column]),
+                                 ''.join(result['p2_history']))
+                # 每一行都是前 r 回合的累计得分（play_matches 按回合数读取）
+                payoffs = [TEST_PAYOFF_MATRIX[a + b] for a, b in zip(result['p1_history'], result['p2_history'])]
+                self.assertEqual(player1_scores[:, column].tolist(),
+                                 list(itertools.accumulate((p[0] for p in payoffs), initial=0)))
+                self.assertEqual(player2_scores[:, column].tolist(),
+                                 list(itertools.accumulate((p[1] for p in payoffs), initial=0)))
+
+    def test_scores_without_moves(self):
+        matches = [('graaskamp', 'nydegger', 120), ('pavlov', 'tit_for_two_tats', 33)]
+        scores = vector_engine.play_matches(matches, TEST_PAYOFF_MATRIX)
+        self.assertEqual(scores, [self.simulate(*match)[:2] for match in matches])
+
+
+def match_results(tournament):
+    """(玩家1策略, 玩家2策略, 重复次数) -> (双方得分, 回合数, 双方选择)"""
+    return {
+        (m.participant1.strategy_id, m.participant2.strategy_id, m.repetition):
+            (m.player1_score, m.player2_score, m.actual_rounds, m.get_moves())
+        for m in TournamentMatch.objects.filter(tournament=tournament).select_related('participant1', 'participant2')
+    }
+
+
+def participant_results(tournament):
+    """按策略排列的参赛者总分、胜平负和排名"""
+    return list(tournament.participants.order_by('strategy_id').values_list(
+        'strategy_id', 'total_score', 'wins', 'draws', 'losses', 'rank'))
+
+
+class MoveStorageTests(TestCase):
+    """选择序列按位压缩存储后能原样还原，结果接口回放的是实际记录的选择"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='player', password='password')
+        cls.strategies = [
+            create_preset_strategy(preset_id, cls.user) for preset_id in ('random', 'tit_for_tat', 'pavlov')
+        ]
+
+    def test_pack_round_trip(self):
+        rng = random.Random(8)
+        for length in (0, 1, 7, 8, 9, 16, 17, 200):
+            moves = [rng.choice('CD') for _ in range(length)]
+            with self.subTest(length=length):
+                packed = engine.pack_moves(moves)
+                self.assertEqual(len(packed), math.ceil(length / 8))
+                self.assertEqual(engine.unpack_moves(packed, length), moves)
+                appended = bytearray()
+                for index, move in enumerate(moves):
+                    engine.append_move(appended, index, move)
+                self.assertEqual(bytes(appended), packed)
+        self.assertEqual(engine.pack_moves(['D'] * 9), b'\xff\x80')
+
+    def test_match_moves_round_trip(self):
+        match = TournamentMatch(actual_rounds=11)
+        self.assertIsNone(match.get_moves())
+        p1_history, p2_history = list('CDDCCCDDDCD'), list('DDCCDCCDCCC')
+        match.set_moves(p1_history, p2_history)
+        self.assertEqual(match.get_moves(), (p1_history, p2_history))
+        match.actual_rounds = 0
+        match.set_moves([], [])
+        self.assertEqual(match.get_moves(), ([], []))
+
+    def test_results_replay_stored_moves(self):
+        tournament = TournamentService.create_tournament(
+            name='Moves', description='', user=self.user, rounds_per_match=13, repetitions=1, seed=4
+        )
+        for strategy in self.strategies:
+            TournamentService.add_participant(tournament, strategy)
+        TournamentService.run_tournament(tournament)
+
+        stored = {m.id: m for m in TournamentMatch.objects.filter(tournament=tournament)}
+        results = TournamentService.get_tournament_results(tournament)['match_results']
+        self.assertEqual(len(results), 9)
+        for result in results:
+            match = stored[result['id']]
+            p1_history, p2_history = match.get_moves()
+            self.assertEqual(len(p1_history), 13)
+            self.assertEqual([r['moves'] for r in result['rounds']], [list(pair) for pair in zip(p1_history, p2_history)])
+            self.assertEqual(sum(r['scores'][0] for r in result['rounds']), match.player1_score)
+            self.assertEqual(sum(r['scores'][1] for r in result['rounds']), match.player2_score)
+
+
+class GameStateCacheTests(TestCase):
+    """逐回合进行的游戏的内存状态缓存：被淘汰后根据压缩历史恢复，结果与不经过缓存一次进行完全相同"""
+
+    PAIRS = [('shubik', 'suspicious_tit_for_tat'), ('nydegger', 'pavlov'), ('grudger', 'two_memory')]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='player', password='password')
+        cls.strategies = {
+            preset_id: create_preset_strategy(preset_id, cls.user) for pair in cls.PAIRS for preset_id in pair
+        }
+
+    def setUp(self):
+        patcher = mock.patch.object(GameService, '_game_states', OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_evicted_states_are_rebuilt(self):
+        pairs = [(self.strategies[a], self.strategies[b]) for a, b in self.PAIRS]
+        expected = [GameService.play_full_game(s1, s2, total_rounds=30) for s1, s2 in pairs]
+
+        games = [GameService.create_game(s1, s2, total_rounds=30) for s1, s2 in pairs]
+        create_player = GameService.create_player
+        with mock.patch.object(GameService, 'GAME_STATES_CACHE_SIZE', 2), \
+                mock.patch.object(GameService, 'create_player', side_effect=create_player) as created:
+            # 轮流进行三场游戏，缓存只能容纳两场，每个回合都要恢复被淘汰的游戏
+            for _ in range(30):
+                for game in games:
+                    GameService.play_round(game)
+                    self.assertLessEqual(len(GameService._game_states), 2)
+        # 最后一轮结束的游戏移出缓存，之前每个回合都重新创建双方策略实例
+        self.assertGreaterEqual(created.call_count, 2 * 3 * 29)
+        self.assertEqual(len(GameService._game_states), 0)
+
+        for game, full in zip(games, expected):
+            game.refresh_from_db()
+            with self.subTest(game=str(game)):
+                self.assertEqual(game.status, 'COMPLETED')
+                self.assertEqual(game.get_moves(), full.get_moves())
+                self.assertEqual((game.player1_score, game.player2_score), (full.player1_score, full.player2_score))
+
+    def test_cached_state_is_reused(self):
+        game = GameService.create_game(self.strategies['shubik'], self.strategies['pavlov'], total_rounds=10)
+        create_player = GameService.create_player
+        with mock.patch.object(GameService, 'create_player', side_effect=create_player) as created:
+            for _ in range(10):
+                GameService.play_round(game)
+        self.assertEqual(created.call_count, 2)
+
+
+class SummaryOnlyGameTests(TestCase):
+    """只保存结果的游戏不写入每回合记录，最终得分和压缩历史与完整记录的游戏相同"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='player', password='password')
+        cls.nydegger = create_preset_strategy('nydegger', cls.user)
+        cls.suspicious = create_preset_strategy('suspicious_tit_for_tat', cls.user)
+
+    def test_summary_only_skips_rounds(self):
+        full = GameService.play_full_game(self.nydegger, self.suspicious, total_rounds=40)
+        summary = GameService.play_full_game(self.nydegger, self.suspicious, total_rounds=40, summary_only=True)
+        self.assertEqual(full.rounds.count(), 40)
+        self.assertEqual(summary.rounds.count(), 0)
+        summary.refresh_from_db()
+        self.assertEqual((summary.player1_score, summary.player2_score), (full.player1_score, full.player2_score))
+        self.assertEqual(summary.get_moves(), full.get_moves())
+        self.assertEqual(summary.status, 'COMPLETED')
+
+    def test_summary_only_api(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        scores = {}
+        for summary_only in (False, True):
+            game = GameService.create_game(self.nydegger, self.suspicious, total_rounds=25)
+            # 先逐回合进行几回合，剩余回合一次完成
+            for _ in range(5):
+                GameService.play_round(game)
+            response = client.post(f'/api/games/{game.id}/play_full_game/', {'summary_only': summary_only},
+                                   format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(game.rounds.count(), 5 if summary_only else 25)
+            game.refresh_from_db()
+            scores[summary_only] = (game.player1_score, game.player2_score)
+            self.assertEqual((response.data['player1_score'], response.data['player2_score']), scores[summary_only])
+        self.assertEqual(scores[True], scores[False])
+
+
+class StrategyStateTests(TestCase):
+    """有状态的预设策略每场比赛使用新的实例，上一场比赛的状态不会带到下一场"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='player', password='password')
+        # Shubik 把对手的背叛次数保存在实例上，报复长度随之增加
+        cls.shubik = create_preset_strategy('shubik', cls.user)
+        cls.defector = create_preset_strategy('always_defect', cls.user)
+        cls.tit_for_tat = create_preset_strategy('tit_for_tat', cls.user)
+
+    def test_consecutive_games_start_fresh(self):
+        GameService.play_full_game(self.shubik, self.defector, total_rounds=20)
+        game = GameService.play_full_game(self.shubik, self.tit_for_tat, total_rounds=20)
+        self.assertEqual(game.get_moves(), (['C'] * 20, ['C'] * 20))
+
+    def test_consecutive_tournament_matches_start_fresh(self):
+        tournament = TournamentService.create_tournament(
+            name='State', description='', user=self.user, rounds_per_match=20, repetitions=2, seed=5, workers=1
+        )
+        for strategy in (self.shubik, self.defector, self.tit_for_tat):
+            TournamentService.add_participant(tournament, strategy)
+        play_match = TournamentService.play_match
+        with mock.patch.object(TournamentService, 'play_match', side_effect=play_match) as serial:
+            TournamentService.run_tournament(tournament)
+        # Shubik 不能编译为查找表，它的比赛在同一进程中按顺序逐场执行
+        self.assertEqual(serial.call_count, 10)
+
+        results = match_results(tournament)
+        shubik, defector, tit_for_tat = self.shubik.id, self.defector.id, self.tit_for_tat.id
+        for repetition in (1, 2):
+            with self.subTest(repetition=repetition):
+                # 在同一重复中先与永远背叛比赛，之后与针锋相对的比赛仍然一直合作
+                self.assertEqual(results[(shubik, tit_for_tat, repetition)][3], (['C'] * 20, ['C'] * 20))
+                self.assertEqual(results[(tit_for_tat, shubik, repetition)][3], (['C'] * 20, ['C'] * 20))
+        # 每次重复的结果相同
+        self.assertEqual(results[(shubik, defector, 1)], results[(shubik, defector, 2)])
+        self.assertEqual(results[(shubik, shubik, 1)], results[(shubik, shubik, 2)])
+
+
+class MatchGenerationTests(TestCase):
+    """比赛的批量生成：先写入待执行比赛与直接执行只写入结果两种方式得到相同的比赛"""
+
+    PRESETS = ['random', 'tit_for_tat', 'shubik']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='player', password='password')
+        cls.strategies = [create_preset_strategy(preset_id, cls.user) for preset_id in cls.PRESETS]
+
+    def create_tournament(self):
+        tournament = TournamentService.create_tournament(
+            name='Generation', description='', user=self.user, rounds_per_match=10, repetitions=2, seed=3
+        )
+        for strategy in self.strategies:
+            TournamentService.add_participant(tournament, strategy)
+        return tournament
+
+    def keys(self, matches):
+        return [(m.participant1.strategy_id, m.participant2.strategy_id, m.repetition) for m in matches]
+
+    def test_pending_and_eager_generation_produce_same_matches(self):
+        pending = self.create_tournament()
+        created = TournamentService.generate_matches(pending)
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'IN_PROGRESS')
+        self.assertEqual(len(created), 18)
+        self.assertTrue(all(m.pk is not None and m.status == 'PENDING' for m in created))
+        # 按 重复次数、玩家1、玩家2 的顺序生成，包括自己对自己
+        ids = [s.id for s in self.strategies]
+        expected_keys = [(p1, p2, rep) for rep in (1, 2) for p1 in ids for p2 in ids]
+        self.assertEqual(self.keys(created), expected_keys)
+        self.assertEqual(TournamentService.remaining_matches(pending), created)
+        TournamentService.run_tournament(pending)
+
+        eager = self.create_tournament()
+        TournamentService.run_tournament(eager)
+
+        self.assertEqual(TournamentMatch.objects.filter(tournament=pending).count(), 18)
+        self.assertEqual(match_results(eager), match_results(pending))
+        self.assertEqual([row[1:] for row in participant_results(eager)],
+                         [row[1:] for row in participant_results(pending)])
+
+    def test_remaining_matches_skip_completed(self):
+        tournament = self.create_tournament()
+        matches = TournamentService.generate_matches(tournament)
+        for match in matches[:5]:
+            TournamentService.play_match(match)
+        remaining = TournamentService.remaining_matches(tournament)
+        self.assertEqual([m.pk for m in remaining], [m.pk for m in matches[5:]])
+
+    def test_remaining_matches_include_unwritten_pairings(self):
+        # completed_only 模式只写入已完成的比赛，中断后没有写入的对阵仍然需要执行
+        tournament = self.create_tournament()
+        expected_keys = self.keys(TournamentService.remaining_matches(tournament))
+        matches = TournamentService.remaining_matches(tournament)
+        tournament.status = 'IN_PROGRESS'
+        tournament.save()
+        for match in matches[:4] + matches[10:12]:
+            TournamentService.play_match(match)
+
+        remaining = TournamentService.remaining_matches(tournament)
+        self.assertTrue(all(m.pk is None for m in remaining))
+        self.assertEqual(self.keys(remaining), expected_keys[4:10] + expected_keys[12:])
+
+
+class ParallelTournamentTests(TestCase):
+    """设置了种子的锦标赛在多个工作进程中执行与串行执行的结果完全一致"""
+
+    # 都不能编译为查找表，多进程模式下全部交给工作进程
+    PRESETS = ['random', 'joss', 'tullock', 'shubik', 'downing', 'davis']
+
+    def test_parallel_matches_serial(self):
+        user = User.objects.create_user(username='player', password='password')
+        strategies = [create_preset_strategy(preset_id, user) for preset_id in self.PRESETS]
+        tournaments = {}
+        for workers in (1, 2):
+            tournament = TournamentService.create_tournament(
+                name=f'Workers {workers}', description='', user=user, rounds_per_match=30, repetitions=2,
+                use_random_rounds=True, min_rounds=20, max_rounds=40, seed=11, workers=workers,
+            )
+            for strategy in strategies:
+                TournamentService.add_participant(tournament, strategy)
+            tournaments[workers] = tournament
+
+        play_matches_parallel = TournamentService.play_matches_parallel
+        with mock.patch.object(TournamentService, 'play_matches_parallel', side_effect=play_matches_parallel) as parallel:
+            TournamentService.run_tournament(tournaments[1])
+            self.assertEqual(len(parallel.call_args.args[1]), 0)
+            TournamentService.run_tournament(tournaments[2])
+            self.assertEqual(len(parallel.call_args.args[1]), 72)
+
+        serial = match_results(tournaments[1])
+        self.assertEqual(len(serial), 72)
+        self.assertEqual(match_results(tournaments[2]), serial)
+        self.assertEqual(participant_results(tournaments[2]), participant_results(tournaments[1]))
+
+
+class TournamentResumeTests(TestCase):
+    """中断的锦标赛从最后一个检查点继续，结果与不中断时完全一致"""
+
+    # 随机和Joss逐场执行，其余由向量化引擎执行
+    PRESETS = ['random', 'joss', 'tit_for_tat', 'grudger', 'pavlov']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='player', password='password')
+        cls.strategies = [create_preset_strategy(preset_id, cls.user) for preset_id in cls.PRESETS]
+
+    def create_tournament(self):
+        tournament = TournamentService.create_tournament(
+            name='Resume', description='', user=self.user, rounds_per_match=20, repetitions=2, seed=7
+        )
+        for strategy in self.strategies:
+            TournamentService.add_participant(tournament, strategy)
+        return tournament
+
+    def run_until_interrupted(self, tournament, calls_before_failure):
+        """执行锦标赛，第 calls_before_failure + 1 场逐场执行的比赛抛出异常"""
+        play_match = TournamentService.play_match
+        calls = itertools.count()
+
+        def failing_play_match(match, save=True):
+            if next(calls) == calls_before_failure:
+                raise RuntimeError('工作进程被终止')
+            return play_match(match, save=save)
+
+        with mock.patch.object(TournamentService, 'CHECKPOINT_SIZE', 10), \
+                mock.patch.object(TournamentService, 'play_match', side_effect=failing_play_match):
+            with self.assertRaises(RuntimeError):
+                TournamentService.run_tournament(tournament)
+        tournament.refresh_from_db()
+
+    def test_resume_matches_uninterrupted_run(self):
+        reference = self.create_tournament()
+        TournamentService.run_tournament(reference)
+
+        tournament = self.create_tournament()
+        self.run_until_interrupted(tournament, calls_before_failure=12)
+        self.assertEqual(tournament.status, 'IN_PROGRESS')
+        # 只保留已提交的完整批次
+        completed = TournamentMatch.objects.filter(tournament=tournament, status='COMPLETED').count()
+        self.assertGreater(completed, 0)
+        self.assertLess(completed, 50)
+        self.assertEqual(completed % 10, 0)
+        self.assertEqual(len(TournamentService.remaining_matches(tournament)), 50 - completed)
+
+        TournamentService.run_tournament(tournament)
+        tournament.refresh_from_db()
+        self.assertEqual(tournament.status, 'COMPLETED')
+        self.assertEqual(TournamentMatch.objects.filter(tournament=tournament, status='COMPLETED').count(), 50)
+        self.assertEqual(match_results(tournament), match_results(reference))
+        self.assertEqual(
+            list(tournament.participants.order_by('strategy_id').values_list('total_score', 'wins', 'draws', 'losses')),
+            list(reference.participants.order_by('strategy_id').values_list('total_score', 'wins', 'draws', 'losses'))
+        )
+
+    def test_resume_after_repeated_interruptions(self):
+        tournament = self.create_tournament()
+        self.run_until_interrupted(tournament, calls_before_failure=5)
+        first = TournamentMatch.objects.filter(tournament=tournament, status='COMPLETED').count()
+        self.run_until_interrupted(tournament, calls_before_failure=10)
+        self.assertGreater(TournamentMatch.objects.filter(tournament=tournament, status='COMPLETED').count(), first)
+
+        TournamentService.run_tournament(tournament)
+        self.assertEqual(TournamentMatch.objects.filter(tournament=tournament).count(), 50)
+        self.assertEqual(TournamentService.remaining_matches(tournament), [])
+
+    def test_completed_tournament_cannot_be_run_again(self):
+        tournament = self.create_tournament()
+        TournamentService.run_tournament(tournament)
+        with self.assertRaises(ValueError):
+            TournamentService.run_tournament(tournament)
+
+
+class QTableTests(SimpleTestCase):
+    """旧格式Q表（状态字符串为键的字典）与整数编码Q表之间的转换"""
+
+    LEGACY = {
+        'NNN': {'C': 0.5, 'D': 1.5},
+        'NNC': {'C': 2.0, 'D': -1.0},
+        'NDC': {'C': 0.25, 'D': 0.0},
+        'CCC': {'C': 3.0, 'D': 4.0},
+        'DCD': {'C': -2.5, 'D': 7.0},
+        'DDD': {'C': 1.0, 'D': 1.0},
+    }
+
+    def test_legacy_dict_round_trip(self):
+        table = q_table.QTable.from_dict(self.LEGACY)
+        self.assertEqual(table.memory_length, 3)
+        self.assertEqual(len(table), len(self.LEGACY))
+        self.assertEqual(table.to_dict(), self.LEGACY)
+        self.assertEqual(table.q_values(table.encode(['D', 'C'])), (0.25, 0.0))
+
+    def test_legacy_pickle_round_trip(self):
+        for data in (self.LEGACY, {'q_table': self.LEGACY, 'memory_length': 3, 'epsilon': 0.1}):
+            with self.subTest(wrapped='q_table' in data):
+                table = q_table.load_q_table(pickle.loads(pickle.dumps(data)))
+                self.assertEqual(table.to_dict(), self.LEGACY)
+                # 新格式保存后再加载得到相同的Q表
+                reloaded = q_table.load_q_table(pickle.loads(pickle.dumps({'q_table': table.to_data()})))
+                self.assertEqual(reloaded.to_dict(), self.LEGACY)
+
+    def test_empty_legacy_table(self):
+        table = q_table.load_q_table({}, memory_length=2)
+        self.assertEqual((table.memory_length, len(table), table.to_dict()), (2, 0, {}))
+
+    def test_short_history_encoding(self):
+        table = q_table.QTable(3)
+        self.assertEqual(table.encode([]), q_table.EMPTY_STATE)
+        self.assertEqual([table.decode(table.encode(h)) for h in ([], ['C'], ['C', 'D'], ['D', 'D', 'C'])],
+                         ['NNN', 'NNC', 'NCD', 'DDC'])
+        # 超过记忆长度的历史只保留最近的选择
+        self.assertEqual(table.encode(['D', 'C', 'C', 'D']), table.encode(['C', 'C', 'D']))
+
+    def test_next_state_matches_encode(self):
+        for memory_length in (0, 1, 3):
+            table = q_table.QTable(memory_length)
+            for length in range(memory_length + 3):
+                for history in itertools.product('CD', repeat=length):
+                    for move in 'CD':
+                        with self.subTest(memory_length=memory_length, history=history, move=move):
+                            state = table.encode(list(history))
+                            self.assertEqual(table.next_state(state, move), table.encode(list(history) + [move]))
+                            self.assertLess(table.next_state(state, move), 2 << memory_length)
+
+
+class ModelStoreTests(SimpleTestCase):
+    """Q-learning模型文件：快照 + 只追加的学习曲线和历史日志，兼容旧版本的完整 pickle"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'model.pkl')
+        self.store = model_store.QLearningModelStore(self.path)
+        self.model = QLearningModel()
+
+    def play(self, rounds):
+        for _ in range(rounds):
+            self.model.learning_curve.append(random.choice((0, 1, 3, 5)))
+            self.model.history.append((random.choice('CD'), random.choice('CD')))
+            self.model.round_counter += 1
+
+    def test_flush_appends_new_entries(self):
+        self.play(10)
+        self.store.flush(self.model)
+        # 比赛进行中最后一项历史留到下一次写入
+        self.assertEqual((os.path.getsize(self.store.curve_path), os.path.getsize(self.store.history_path)), (10, 9))
+        # 标记已写入的内容，第二次刷新只追加，不重写已有内容
+        with open(self.store.curve_path, 'r+b') as f:
+            f.write(b'\xff')
+        self.play(5)
+        self.store.flush(self.model, close_history=True)
+
+        data = model_store.load_model_data(self.path)
+        self.assertEqual(data['learning_curve'], [255] + self.model.learning_curve[1:])
+        self.assertEqual((data['curve_length'], data['history_length'], data['round_counter']), (15, 15, 15))
+        self.assertEqual(self.store.read_history(15), self.model.history)
+
+    def test_truncate_logs_drops_later_writes(self):
+        self.play(8)
+        self.store.flush(self.model, close_history=True)
+        checkpoint = self.store.snapshot(self.model)
+        curve, history = list(self.model.learning_curve), list(self.model.history)
+        self.play(6)
+        self.store.flush(self.model, close_history=True)
+
+        self.store.truncate_logs(checkpoint['curve_length'], checkpoint['history_length'])
+        self.assertEqual((os.path.getsize(self.store.curve_path), os.path.getsize(self.store.history_path)), (8, 8))
+        # 从检查点继续时，之后的写入接在检查点的位置
+        self.model.learning_curve, self.model.history = curve, history
+        self.play(3)
+        self.store.flush(self.model, close_history=True)
+        data = model_store.load_model_data(self.path)
+        self.assertEqual(data['learning_curve'], self.model.learning_curve)
+        self.assertEqual(self.store.read_history(data['history_length']), self.model.history)
+
+    def test_log_beyond_snapshot_is_ignored(self):
+        self.play(4)
+        self.store.flush(self.model, close_history=True)
+        # 刷新过程中进程退出：日志已追加但快照没有替换
+        with open(self.store.curve_path, 'ab') as f:
+            f.write(b'\x03\x03')
+        self.assertEqual(model_store.load_model_data(self.path)['learning_curve'], self.model.learning_curve)
+
+    def test_legacy_pickle(self):
+        legacy_q_table = {'NNC': {'C': 1.0, 'D': 2.0}, 'CDD': {'C': -1.0, 'D': 0.5}}
+        legacy = {'q_table': legacy_q_table, 'learning_curve': [3, 0, 5], 'history': [('C', 'D'), ('D', 'D')],
+                  'round_counter': 3}
+        for data in (legacy, legacy_q_table):
+            with self.subTest(wrapped=data is legacy):
+                with open(self.path, 'wb') as f:
+                    pickle.dump(data, f)
+                loaded = model_store.load_model_data(self.path)
+                self.assertEqual(loaded['q_table'].to_dict(), legacy_q_table)
+                if data is legacy:
+                    self.assertEqual(loaded['learning_curve'], [3, 0, 5])
+                    self.assertEqual((loaded['history'], loaded['round_counter']), (legacy['history'], 3))
+
+
+class TrainQLearningCommandTests(SimpleTestCase):
+    """离线训练命令的输出是可以由 load_model_data 读取、作为预训练Q表使用的模型文件"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def train(self, output, *args):
+        call_command('train_q_learning', '--opponents', 'tit_for_tat,always_defect,random', '--environments', '16',
+                     '--episodes', '2', '--rounds', '20', '--seed', '11', '--output', output, *args,
+                     stdout=io.StringIO())
+        return model_store.load_model_data(output)
+
+    def test_training_output_loads(self):
+        first = self.train(os.path.join(self.directory, 'first.pkl'))
+        second = self.train(os.path.join(self.directory, 'second.pkl'))
+        table = first['q_table']
+        self.assertEqual(table.memory_length, QLearningModel.memory_length)
+        self.assertGreater(len(table), 0)
+        self.assertEqual((first['round_counter'], first['learning_curve']), (16 * 2 * 20, []))
+        self.assertEqual(first['training']['opponents'], ['tit_for_tat', 'always_defect', 'random'])
+        self.assertEqual(len(first['training']['episode_rewards']), 2)
+        # 相同的种子得到相同的Q表
+        self.assertEqual(table.to_dict(), second['q_table'].to_dict())
+
+        with override_settings(Q_LEARNING_PRETRAINED_MODEL=os.path.join(self.directory, 'first.pkl')):
+            self.assertEqual(QLearningModel().q_table.to_dict(), table.to_dict())
+
+    def test_resume(self):
+        output = os.path.join(self.directory, 'model.pkl')
+        first = self.train(output)['q_table']
+        resumed = self.train(output, '--resume')['q_table']
+        self.assertNotEqual(resumed.to_dict(), first.to_dict())
+        with self.assertRaises(CommandError):
+            self.train(output, '--resume', '--memory-length', '2')
+
+    def test_unknown_opponent(self):
+        with self.assertRaises(CommandError):
+            call_command('train_q_learning', '--opponents', 'tit_for_tat,unknown',
+                         '--output', os.path.join(self.directory, 'model.pkl'), stdout=io.StringIO())
+
+
+class ExpectedPayoffTests(SimpleTestCase):
+    """概率模型下的精确期望得分与模拟结果一致"""
+
+    ROUNDS = 30
+    CONTINUE_PROBABILITY = 0.8
+    # 随机对阵的蒙特卡洛模拟次数
+    SAMPLES = 10000
+
+    def test_deterministic_pairings_match_weighted_simulation(self):
+        # 第 t 回合（从0开始）被执行的概率是 w^t
+        compilable = VectorEngineTests.compilable
+        pairings = [(s1, s2) for s1 in compilable for s2 in compilable]
+        results = expected_payoffs.expected_payoffs(pairings, self.ROUNDS, self.CONTINUE_PROBABILITY, TEST_PAYOFF_MATRIX)
+        settings = fixed_round_settings(self.ROUNDS)
+        for (strategy1_id, strategy2_id), expected in zip(pairings, results):
+            result = engine.simulate_match(settings, preset_spec(strategy1_id), preset_spec(strategy2_id))
+            weighted = [0.0, 0.0]
+            for t, (a, b) in enumerate(zip(result['p1_history'], result['p2_history'])):
+                for side in (0, 1):
+                    weighted[side] += self.CONTINUE_PROBABILITY ** t * TEST_PAYOFF_MATRIX[a + b][side]
+            with self.subTest(strategy1=strategy1_id, strategy2=strategy2_id):
+                self.assertAlmostEqual(expected[0], weighted[0], places=9)
+                self.assertAlmostEqual(expected[1], weighted[1], places=9)
+
+    def test_stochastic_pairings_match_monte_carlo(self):
+        pairings = [('random', 'tit_for_tat'), ('joss', 'grudger'), ('davis', 'pavlov'), ('random', 'joss')]
+        for pairing in pairings:
+            self.assertTrue(expected_payoffs.can_compute(*pairing))
+        results = expected_payoffs.expected_payoffs(pairings, self.ROUNDS, self.CONTINUE_PROBABILITY, TEST_PAYOFF_MATRIX)
+        settings = fixed_round_settings(
+            self.ROUNDS, use_probability_model=True, continue_probability=self.CONTINUE_PROBABILITY
+        )
+        for (strategy1_id, strategy2_id), expected in zip(pairings, results):
+            samples = [
+                engine.simulate_match(settings, preset_spec(strategy1_id), preset_spec(strategy2_id), rng=random.Random(i))
+                for i in range(self.SAMPLES)
+            ]
+            for side, key in enumerate(('p1_score', 'p2_score')):
+                scores = [sample[key] for sample in samples]
+                mean = sum(scores) / len(scores)
+                std_error = math.sqrt(sum((x - mean) ** 2 for x in scores) / (len(scores) - 1) / len(scores))
+                with self.subTest(strategy1=strategy1_id, strategy2=strategy2_id, side=side):
+                    self.assertLess(abs(mean - expected[side]), 4 * std_error)
+
+    def test_expected_rounds(self):
+        self.assertAlmostEqual(expected_payoffs.expected_rounds(self.ROUNDS, self.CONTINUE_PROBABILITY),
+                               (1 - self.CONTINUE_PROBABILITY ** self.ROUNDS) / (1 - self.CONTINUE_PROBABILITY))
+        self.assertEqual(expected_payoffs.expected_rounds(5, 1.0), 5.0)
+
+
+class ExpectedPayoffTournamentTests(TestCase):
+    """精确计算期望得分的锦标赛：能计算的对阵直接写入期望得分，其余对阵照常模拟"""
+
+    def test_matches_use_expected_payoffs(self):
+        user = User.objects.create_user(username='player', password='password')
+        tournament = TournamentService.create_tournament(
+            name='Expected', description='', user=user, rounds_per_match=50, repetitions=2,
+            payoff_matrix=TEST_PAYOFF_MATRIX, use_probability_model=True, continue_probability=0.9,
+            use_expected_payoffs=True, seed=3,
+        )
+        for preset_id in ('random', 'tit_for_tat', 'shubik'):
+            TournamentService.add_participant(tournament, create_preset_strategy(preset_id, user))
+        TournamentService.run_tournament(tournament)
+
+        matches = TournamentMatch.objects.filter(tournament=tournament).select_related(
+            'participant1__strategy', 'participant2__strategy')
+        self.assertEqual(len(matches), 18)
+        for match in matches:
+            pairing = (match.participant1.strategy.preset_id, match.participant2.strategy.preset_id)
+            with self.subTest(pairing=pairing, repetition=match.repetition):
+                self.assertEqual(match.status, 'COMPLETED')
+                if 'shubik' in pairing:
+                    # Shubik 的报复长度随对手背叛次数增加，不能表示为有限状态机，模拟执行并记录选择
+                    self.assertIsNotNone(match.get_moves())
+                    continue
+                expected = expected_payoffs.expected_payoffs([pairing], 50, 0.9, TEST_PAYOFF_MATRIX)[0]
+                self.assertEqual((match.player1_score, match.player2_score), expected)
+                self.assertIsNone(match.get_moves())
+
+
+@override_settings(TOURNAMENT_JOB_AUTOSTART_WORKER=False)
+class TournamentJobTests(TestCase):
+    """后台任务队列：加入队列、领取、执行并记录进度"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='player', password='password')
+        cls.strategies = [
+            create_preset_strategy(preset_id, cls.user) for preset_id in ('random', 'tit_for_tat', 'grudger')
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_tournament(self):
+        tournament = TournamentService.create_tournament(
+            name='Job', description='', user=self.user, rounds_per_match=10, repetitions=2, seed=1
+        )
+        for strategy in self.strategies:
+            TournamentService.add_participant(tournament, strategy)
+        return tournament
+
+    def progress(self, job):
+        response = self.client.get(f'/api/jobs/{job.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_enqueue_claim_and_run(self):
+        tournament = self.create_tournament()
+        response = self.client.post(f'/api/tournaments/{tournament.id}/run_tournament/')
+        self.assertEqual(response.status_code, 202)
+        job = TournamentJob.objects.get(id=response.data['job_id'])
+        self.assertEqual(self.progress(job)['status'], 'QUEUED')
+        # 同一锦标赛不能重复加入队列
+        response = self.client.post(f'/api/tournaments/{tournament.id}/run_tournament/')
+        self.assertEqual(response.status_code, 400)
+
+        claimed = TournamentJobService.claim_next_job()
+        self.assertEqual((claimed.id, claimed.status), (job.id, 'RUNNING'))
+        self.assertIsNotNone(claimed.started_at)
+        self.assertIsNone(TournamentJobService.claim_next_job())
+
+        job = TournamentJobService.run_job(claimed)
+        self.assertEqual(job.status, 'COMPLETED')
+        progress = self.progress(job)
+        self.assertEqual((progress['completed_matches'], progress['total_matches']), (18, 18))
+        self.assertEqual(progress['progress'], 100.0)
+        self.assertIsNone(progress['eta_seconds'])
+        self.assertIsNotNone(progress['finished_at'])
+        tournament.refresh_from_db()
+        self.assertEqual(tournament.status, 'COMPLETED')
+
+    def test_concurrent_enqueue_creates_one_job(self):
+        tournament = self.create_tournament()
+        TournamentJobService.enqueue(tournament)
+        # 另一个请求在第一个任务写入之前完成了检查：由唯一约束拒绝
+        with mock.patch('django.db.models.query.QuerySet.exists', return_value=False):
+            with self.assertRaisesMessage(ValueError, 'already queued or running'):
+                TournamentJobService.enqueue(tournament)
+        self.assertEqual(TournamentJob.objects.filter(tournament=tournament).count(), 1)
+        # 已结束的任务不影响重新加入队列
+        TournamentJob.objects.filter(tournament=tournament).update(status='FAILED')
+        TournamentJobService.enqueue(tournament)
+        self.assertEqual(TournamentJob.objects.filter(tournament=tournament, status='QUEUED').count(), 1)
+
+    def expire_heartbeat(self, job):
+        """模拟执行任务的工作进程已经退出：心跳停在超时之前"""
+        expired = timezone.now() - timedelta(seconds=TournamentJobService.HEARTBEAT_TIMEOUT + 1)
+        TournamentJob.objects.filter(id=job.id).update(heartbeat_at=expired)
+
+    def test_stale_running_job_is_reclaimed(self):
+        tournament = self.create_tournament()
+        job = TournamentJobService.enqueue(tournament)
+        claimed = TournamentJobService.claim_next_job()
+        self.assertIsNotNone(claimed.heartbeat_at)
+        # 心跳未过期时其他工作进程不能领取
+        self.assertIsNone(TournamentJobService.claim_next_job())
+
+        self.expire_heartbeat(claimed)
+        with self.assertLogs('dilemma_game.services', 'WARNING'):
+            reclaimed = TournamentJobService.claim_next_job()
+        self.assertEqual((reclaimed.id, reclaimed.status), (job.id, 'RUNNING'))
+        self.assertGreater(reclaimed.heartbeat_at, timezone.now() - timedelta(seconds=10))
+        self.assertIsNone(TournamentJobService.claim_next_job())
+
+        self.assertEqual(TournamentJobService.run_job(reclaimed).status, 'COMPLETED')
+        tournament.refresh_from_db()
+        self.assertEqual(tournament.status, 'COMPLETED')
+
+    def test_stale_job_does_not_block_enqueue(self):
+        tournament = self.create_tournament()
+        TournamentJobService.enqueue(tournament)
+        stale = TournamentJobService.claim_next_job()
+        with self.assertRaises(ValueError):
+            TournamentJobService.enqueue(tournament)
+
+        self.expire_heartbeat(stale)
+        job = TournamentJobService.enqueue(tournament)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.error), ('FAILED', 'Worker stopped responding'))
+        self.assertEqual(TournamentJobService.claim_next_job().id, job.id)
+
+    def test_heartbeat_is_sent_while_running(self):
+        TournamentJobService.enqueue(self.create_tournament())
+        job = TournamentJobService.claim_next_job()
+        run_tournament = TournamentService.run_tournament
+
+        def slow_run(tournament, progress_callback=None, workers=None):
+            time.sleep(0.3)
+            return run_tournament(tournament, progress_callback=progress_callback, workers=workers)
+
+        # 后台线程只调用 heartbeat（这里替换掉，测试事务之外的连接看不到任务）
+        with mock.patch.object(TournamentJobService, 'HEARTBEAT_INTERVAL', 0.05), \
+                mock.patch.object(TournamentJobService, 'heartbeat') as heartbeat, \
+                mock.patch.object(TournamentService, 'run_tournament', side_effect=slow_run):
+            job = TournamentJobService.run_job(job)
+        self.assertEqual(job.status, 'COMPLETED')
+        self.assertGreaterEqual(heartbeat.call_count, 3)
+        # 写入进度时也会更新心跳
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, job.started_at)
+
+    def resume(self, tournament, *args):
+        output = io.StringIO()
+        call_command('resume_tournament', tournament.id, *args, stdout=output)
+        tournament.refresh_from_db()
+        return output.getvalue()
+
+    def test_resume_skips_tournament_with_running_job(self):
+        tournament = self.create_tournament()
+        TournamentService.generate_matches(tournament)
+        TournamentJobService.enqueue(tournament)
+        job = TournamentJobService.claim_next_job()
+
+        self.assertIn('正在由工作进程执行', self.resume(tournament))
+        job.refresh_from_db()
+        self.assertEqual((job.status, tournament.status), ('RUNNING', 'IN_PROGRESS'))
+
+        # 工作进程退出后（心跳过期）可以继续执行
+        self.expire_heartbeat(job)
+        self.resume(tournament)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, tournament.status), ('FAILED', 'Interrupted', 'COMPLETED'))
+
+    def test_resume_force_fails_running_job(self):
+        tournament = self.create_tournament()
+        TournamentService.generate_matches(tournament)
+        queued = TournamentJobService.enqueue(tournament)
+        TournamentJobService.claim_next_job()
+        self.resume(tournament, '--force')
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, tournament.status), ('FAILED', 'COMPLETED'))
+
+    def test_resume_fails_queued_job(self):
+        tournament = self.create_tournament()
+        TournamentService.generate_matches(tournament)
+        queued = TournamentJobService.enqueue(tournament)
+        self.resume(tournament)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, tournament.status), ('FAILED', 'COMPLETED'))
+        self.assertIsNone(TournamentJobService.claim_next_job())
+
+    def test_jobs_are_claimed_in_queue_order(self):
+        jobs = [TournamentJobService.enqueue(self.create_tournament()) for _ in range(3)]
+        claimed = [TournamentJobService.claim_next_job() for _ in range(3)]
+        self.assertEqual([job.id for job in claimed], [job.id for job in jobs])
+        self.assertIsNone(TournamentJobService.claim_next_job())
+
+    def test_progress_is_written_while_running(self):
+        TournamentJobService.enqueue(self.create_tournament())
+        job = TournamentJobService.claim_next_job()
+        run_tournament = TournamentService.run_tournament
+        written = []
+
+        def recording_run(tournament, progress_callback=None, workers=None):
+            def callback(completed, total):
+                progress_callback(completed, total)
+                written.append(TournamentJob.objects.values_list('completed_matches', 'total_matches').get(id=job.id))
+            return run_tournament(tournament, progress_callback=callback, workers=workers)
+
+        with mock.patch.object(TournamentJobService, 'PROGRESS_WRITE_INTERVAL', 0), \
+                mock.patch.object(TournamentService, 'run_tournament', side_effect=recording_run):
+            TournamentJobService.run_job(job)
+        self.assertEqual(written[0], (0, 18))
+        self.assertEqual(written[-1], (18, 18))
+        self.assertEqual(written, sorted(written))
+
+    def test_failed_job_records_error(self):
+        tournament = self.create_tournament()
+        job = TournamentJobService.enqueue(tournament)
+        TournamentService.run_tournament(tournament)
+        with self.assertLogs('dilemma_game.services', 'ERROR'):
+            job = TournamentJobService.run_job(TournamentJobService.claim_next_job())
+        self.assertEqual(job.status, 'FAILED')
+        self.assertIn('already been completed', self.progress(job)['error'])
+        # 已完成的锦标赛不能再加入队列
+        with self.assertRaises(ValueError):
+            TournamentJobService.enqueue(tournament)
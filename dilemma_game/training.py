@@ -0,0 +1,165 @@
+"""
+Q-learning策略的离线训练
+
+在许多个并行环境中同时与预设策略对局：每个环境是 Q-learning 与一个对手的一场比赛，
+所有环境按回合同步推进，动作选择、对手选择和Q值更新都是对整个环境数组的 NumPy 运算。
+
+对手的执行方式与 vector_engine 相同：能编译为查找表的策略按查找表执行，
+随机策略直接抽样，其余预设策略（带随机性或复杂状态）每个环境一个原生策略实例逐回合执行。
+
+同一回合中多个环境可能更新同一个 (状态, 动作)，批量更新使用这些环境时间差分误差的平均值：
+Q(s,a) ← Q(s,a) + α·mean[r + γ·max_a'Q(s',a') - Q(s,a)]。
+"""
+
+import random
+
+import numpy as np
+
+from . import vector_engine
+from .native_strategies import NATIVE_STRATEGIES, QLearningModel, create_strategy
+from .q_table import EMPTY_STATE, QTable
+
+# 与 QLearningModel.get_reward 相同的奖励，按 (我的选择*2 + 对手选择) 索引
+REWARDS = np.array([
+    QLearningModel.get_reward('C', 'C'),
+    QLearningModel.get_reward('C', 'D'),
+    QLearningModel.get_reward('D', 'C'),
+    QLearningModel.get_reward('D', 'D'),
+], dtype=np.float64)
+
+
+def training_opponents():
+    """可以作为训练对手的预设策略ID（Q-learning 自身除外）"""
+    return [strategy_id for strategy_id in NATIVE_STRATEGIES if strategy_id != 'q_learning']
+
+
+class OpponentGroup:
+    """使用同一个对手策略的一组环境"""
+
+    def __init__(self, strategy_id, rows, rng):
+        self.strategy_id = strategy_id
+        self.rows = rows
+        self.rng = rng
+        if vector_engine.is_compilable(strategy_id):
+            self.kind = 'table'
+            self.table = vector_engine.compile_strategy(strategy_id)
+        elif strategy_id == 'random':
+            self.kind = 'random'
+        else:
+            self.kind = 'native'
+
+    def start_episode(self, python_rng):
+        if self.kind == 'native':
+            self.players = [create_strategy(self.strategy_id, rng=python_rng) for _ in self.rows]
+            # Q-learning 一方的历史选择（对手策略看到的对手历史）
+            self.histories = [[] for _ in self.rows]
+
+    def choose(self, round_index, own_bits, learner_bits):
+        """返回本组环境中对手在本回合的选择（1表示背叛）"""
+        if self.kind == 'table':
+            return self.table.choose(round_index, own_bits[self.rows], learner_bits[self.rows])
+        if self.kind == 'random':
+            return self.rng.integers(0, 2, size=len(self.rows))
+        return np.array([
+            1 if player.move(history) == 'D' else 0
+            for player, history in zip(self.players, self.histories)
+        ], dtype=np.int64)
+
+    def record(self, learner_actions):
+        if self.kind == 'native':
+            for history, action in zip(self.histories, learner_actions[self.rows].tolist()):
+                history.append('D' if action else 'C')
+
+
+def train_q_table(opponents, environments=1024, episodes=10, rounds=200,
+                  learning_rate=QLearningModel.learning_rate,
+                  discount_factor=QLearningModel.discount_factor,
+                  exploration_rate=QLearningModel.exploration_rate,
+                  memory_length=QLearningModel.memory_length,
+                  seed=None, q_table=None, progress_callback=None):
+    """
+    离线训练Q表
+
+    参数:
+        opponents: 对手策略ID列表，环境按顺序轮流分配给各个对手
+        environments: 并行环境数量
+        episodes: 训练轮数，每轮所有环境各进行一场 rounds 回合的比赛
+        rounds: 每场比赛的回合数
+        learning_rate / discount_factor / exploration_rate: Q-learning 超参数
+        memory_length: 状态使用的对手历史长度（提供 q_table 时使用它的记忆长度）
+        seed: 随机种子
+        q_table: 继续训练的Q表，默认从空Q表开始
+        progress_callback: 每轮结束后调用，参数为 (已完成轮数, 总轮数, 本轮平均每回合奖励)
+
+    返回:
+        (QTable 对象, 每轮平均每回合奖励的列表)
+    """
+    if not opponents:
+        raise ValueError("至少需要一个训练对手")
+
+    table = q_table if q_table is not None else QTable(memory_length)
+    values = table.values
+    flat_values = values.reshape(-1)
+    state_count = values.shape[0]
+
+    rng = np.random.default_rng(seed)
+    python_rng = random.Random(seed)
+
+    assignment = np.arange(environments) % len(opponents)
+    groups = [
+        OpponentGroup(strategy_id, np.flatnonzero(assignment == index), rng)
+        for index, strategy_id in enumerate(opponents)
+    ]
+    groups = [group for group in groups if len(group.rows)]
+    history_mask = (1 << max([g.table.memory_depth for g in groups if g.kind == 'table'] + [1])) - 1
+
+    episode_rewards = []
+    for episode in range(episodes):
+        for group in groups:
+            group.start_episode(python_rng)
+
+        states = np.full(environments, EMPTY_STATE, dtype=np.int64)
+        learner_bits = np.zeros(environments, dtype=np.int64)
+        opponent_bits = np.zeros(environments, dtype=np.int64)
+        opponent_actions = np.zeros(environments, dtype=np.int64)
+        total_reward = 0.0
+
+        for round_index in range(rounds):
+            # ε-贪心选择动作，Q值相同时随机选择
+            q_values = values[states]
+            actions = (q_values[:, 1] > q_values[:, 0]).astype(np.int64)
+            ties = q_values[:, 0] == q_values[:, 1]
+            explore = (rng.random(environments) < exploration_rate) | ties
+            actions[explore] = rng.integers(0, 2, size=int(explore.sum()))
+            table.visited[states] = True
+
+            for group in groups:
+                opponent_actions[group.rows] = group.choose(round_index, opponent_bits, learner_bits)
+                group.record(actions)
+
+            rewards = REWARDS[actions * 2 + opponent_actions]
+            total_reward += rewards.sum()
+
+            next_states = (states << 1) | opponent_actions
+            overflow = next_states >= table.full_state << 1
+            next_states[overflow] = (next_states[overflow] & table.mask) | table.full_state
+
+            # 与在线学习一致，最后一回合之后没有下一步，不更新
+            if round_index < rounds - 1:
+                table.visited[next_states] = True
+                index = states * 2 + actions
+                errors = rewards + discount_factor * values[next_states].max(axis=1) - flat_values[index]
+                error_sums = np.bincount(index, weights=errors, minlength=state_count * 2)
+                counts = np.bincount(index, minlength=state_count * 2)
+                updated = counts > 0
+                flat_values[updated] += learning_rate * error_sums[updated] / counts[updated]
+
+            states = next_states
+            learner_bits = ((learner_bits << 1) | actions) & history_mask
+            opponent_bits = ((opponent_bits << 1) | opponent_actions) & history_mask
+
+        episode_rewards.append(total_reward / (environments * rounds))
+        if progress_callback:
+            progress_callback(episode + 1, episodes, episode_rewards[-1])
+
+    return table, episode_rewards
@@ -9,7 +9,7 @@ from .views import (
     tournament_add_participant, tournament_start, tournament_run, tournament_results, api_preset_strategies,
     tournament_detail_api, recalculate_tournament_stats, api_deleted_preset_strategies, fix_tournaments,
     emergency_fix_tournaments, reset_all_tournaments, visualize_q_learning_results, q_learning_curve, q_value_heatmap,
-    q_learning_vs_opponents, export_tournament_results, debug_q_learning_tournament
+    q_learning_vs_opponents, export_tournament_results, export_tournament_table, debug_q_learning_tournament, tournament_job_progress
 )
 
 # Register API URLs
@@ -28,6 +28,7 @@ urlpatterns = [
     path('api/preset-strategies/', api_preset_strategies, name='api-preset-strategies'),
     path('api/deleted-preset-strategies/', api_deleted_preset_strategies, name='api-deleted-preset-strategies'),
     path('api/tournaments/<int:pk>/details/', tournament_detail_api, name='api-tournament-detail'),
+    path('api/jobs/<int:job_id>/', tournament_job_progress, name='api-tournament-job'),
     
     # Template URLs
     path('', home, name='home'),
@@ -50,6 +51,8 @@ urlpatterns = [
     path('tournaments/<int:pk>/run/', tournament_run, name='tournament_run'),
     path('tournaments/<int:tournament_id>/results/', tournament_results, name='tournament_results'),
     path('tournaments/<int:tournament_id>/export/', export_tournament_results, name='export_tournament_results'),
+    path('tournaments/<int:tournament_id>/export/<str:table>.<str:extension>', export_tournament_table,
+         name='export_tournament_table'),
     
     # Q-learning结果可视化
     path('tournaments/<int:tournament_id>/q_learning/', visualize_q_learning_results, name='q_learning_results'),
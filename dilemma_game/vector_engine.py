@@ -0,0 +1,264 @@
+"""
+记忆型确定性策略的向量化对局引擎
+
+把 memory_depth 不为 None 的策略（始终合作/背叛、针锋相对、永不原谅、Pavlov 等）
+编译成以"回合序号 + 最近 n 轮选择"为索引的查找表，然后用 NumPy 数组
+同时推进所有对阵。无法编译的策略（随机策略、Q-learning、用户代码等）
+由 TournamentService.play_match 逐回合执行。
+
+确定性策略的同一对阵每次重复的选择序列完全相同，只是回合数可能不同，
+所以每个对阵只模拟一次（模拟到所需的最大回合数），每场比赛的得分
+从累计得分数组中按该场的回合数读取。对阵进入周期后不再逐回合模拟，
+剩余回合的得分和选择按周期计算。
+"""
+
+import numpy as np
+
+from .native_strategies import NATIVE_STRATEGIES
+
+# 选择的数值编码
+COOPERATE = 0
+DEFECT = 1
+
+# 已编译的查找表缓存，键为策略ID
+_COMPILED_TABLES = {}
+
+
+class StrategyTable:
+    """
+    编译后的策略查找表
+
+    tables[t] 是第 t 回合（t 超过 warmup 时取 warmup）使用的查找表，
+    索引为最近 memory_depth 轮选择的位编码（最近一轮在最低位，1 表示背叛）；
+    uses_own_history 为 True 时高位是自己的选择，低位是对手的选择。
+    """
+
+    def __init__(self, strategy_class):
+        self.strategy_id = strategy_class.strategy_id
+        self.memory_depth = strategy_class.memory_depth
+        self.warmup = strategy_class.warmup if strategy_class.warmup is not None else self.memory_depth
+        self.uses_own_history = strategy_class.uses_own_history
+        self.mask = (1 << self.memory_depth) - 1
+
+        depth = self.memory_depth
+        index_bits = depth * 2 if self.uses_own_history else depth
+        tables = np.zeros((self.warmup + 1, 1 << index_bits), dtype=np.uint8)
+
+        for round_index in range(self.warmup + 1):
+            # 前几回合历史不足 memory_depth，只取实际存在的部分
+            window_length = min(round_index, depth)
+            for index in range(1 << index_bits):
+                opponent_bits = index & self.mask
+                my_bits = index >> depth
+                choice = strategy_class.lookup(
+                    round_index,
+                    decode_window(my_bits, depth)[depth - window_length:] if self.uses_own_history else [],
+                    decode_window(opponent_bits, depth)[depth - window_length:],
+                )
+                tables[round_index, index] = DEFECT if choice == 'D' else COOPERATE
+
+        self.tables = tables
+
+    def choose(self, round_index, my_bits, opponent_bits):
+        """根据双方最近的选择位编码，返回一组对局在本回合的选择数组"""
+        table = self.tables[min(round_index, self.warmup)]
+        if self.uses_own_history:
+            return table[((my_bits & self.mask) << self.memory_depth) | (opponent_bits & self.mask)]
+        return table[opponent_bits & self.mask]
+
+
+def decode_window(bits, depth):
+    """把位编码还原为从旧到新的选择列表"""
+    return ['D' if (bits >> offset) & 1 else 'C' for offset in range(depth - 1, -1, -1)]
+
+
+def is_compilable(strategy_id):
+    """
+    判断策略能否编译为查找表
+
+    参数:
+        strategy_id: 预设策略ID
+
+    返回:
+        bool
+    """
+    strategy_class = NATIVE_STRATEGIES.get(strategy_id)
+    return strategy_class is not None and strategy_class.memory_depth is not None
+
+
+def compile_strategy(strategy_id):
+    """
+    获取策略的查找表，首次使用时编译并缓存
+
+    参数:
+        strategy_id: 预设策略ID
+
+    返回:
+        StrategyTable 对象
+    """
+    table = _COMPILED_TABLES.get(strategy_id)
+    if table is None:
+        if not is_compilable(strategy_id):
+            raise ValueError(f"策略 {strategy_id} 无法编译为查找表")
+        table = _COMPILED_TABLES[strategy_id] = StrategyTable(NATIVE_STRATEGIES[strategy_id])
+    return table
+
+
+def payoff_arrays(payoff_matrix):
+    """把收益矩阵字典转换为按 (玩家1选择*2 + 玩家2选择) 索引的两个数组"""
+    keys = ['CC', 'CD', 'DC', 'DD']
+    player1_payoffs = np.array([payoff_matrix[key][0] for key in keys], dtype=np.float64)
+    player2_payoffs = np.array([payoff_matrix[key][1] for key in keys], dtype=np.float64)
+    return player1_payoffs, player2_payoffs
+
+
+def play_pairings(pairings, rounds, payoff_matrix, record_moves=False):
+    """
+    同时模拟多个对阵
+
+    warmup 之后每个对阵的选择只取决于双方最近的选择（联合状态），联合状态一旦重复，
+    之后的选择就按周期重复。模拟过程中检测每个对阵的周期（Brent 算法：在 warmup 之后的
+    第 1、2、4、8……回合记录联合状态，之后与记录的状态比较），所有对阵都进入周期后
+    停止逐回合模拟，剩余回合的得分按周期直接计算，因此模拟的回合数只与周期长度有关。
+
+    参数:
+        pairings: (玩家1策略ID, 玩家2策略ID) 的列表
+        rounds: 模拟的回合数
+        payoff_matrix: 收益矩阵字典
+        record_moves: 是否同时返回每回合的选择
+
+    返回:
+        (玩家1累计得分, 玩家2累计得分)，形状均为 (rounds + 1, 对阵数)，
+        第 r 行是前 r 回合的总分；record_moves 为 True 时额外返回
+        (玩家1选择, 玩家2选择)，形状均为 (rounds, 对阵数)，1 表示背叛
+    """
+    pairing_count = len(pairings)
+    player1_payoffs, player2_payoffs = payoff_arrays(payoff_matrix)
+
+    # 按策略分组，每回合每个策略只做一次数组查找
+    tables = {}
+    player1_groups = {}
+    player2_groups = {}
+    for index, (strategy1_id, strategy2_id) in enumerate(pairings):
+        for strategy_id in (strategy1_id, strategy2_id):
+            if strategy_id not in tables:
+                tables[strategy_id] = compile_strategy(strategy_id)
+        player1_groups.setdefault(strategy1_id, []).append(index)
+        player2_groups.setdefault(strategy2_id, []).append(index)
+    player1_groups = [(tables[sid], np.array(rows, dtype=np.intp)) for sid, rows in player1_groups.items()]
+    player2_groups = [(tables[sid], np.array(rows, dtype=np.intp)) for sid, rows in player2_groups.items()]
+
+    # 双方最近选择的位编码，只需保留最大记忆长度
+    history_depth = max([table.memory_depth for table in tables.values()] + [1])
+    history_mask = (1 << history_depth) - 1
+    warmup = max([table.warmup for table in tables.values()] + [0])
+    player1_bits = np.zeros(pairing_count, dtype=np.int64)
+    player2_bits = np.zeros(pairing_count, dtype=np.int64)
+    player1_moves = np.zeros(pairing_count, dtype=np.int64)
+    player2_moves = np.zeros(pairing_count, dtype=np.int64)
+
+    player1_scores = np.zeros((rounds + 1, pairing_count), dtype=np.float64)
+    player2_scores = np.zeros((rounds + 1, pairing_count), dtype=np.float64)
+    player1_record = np.zeros((rounds, pairing_count), dtype=np.uint8)
+    player2_record = np.zeros((rounds, pairing_count), dtype=np.uint8)
+
+    # 周期检测：saved_state 是第 saved_round 回合开始前的联合状态，period 为0表示尚未检测到周期
+    saved_state = np.full(pairing_count, -1, dtype=np.int64)
+    saved_round = warmup
+    next_save = warmup
+    period = np.zeros(pairing_count, dtype=np.int64)
+
+    simulated = rounds
+    for round_index in range(rounds):
+        if round_index >= warmup:
+            state = (player1_bits << history_depth) | player2_bits
+            found = (period == 0) & (state == saved_state)
+            period[found] = round_index - saved_round
+            if period.all():
+                simulated = round_index
+                break
+            if round_index == next_save:
+                saved_state = state
+                saved_round = round_index
+                next_save = warmup + 2 * (round_index - warmup) if round_index > warmup else warmup + 1
+
+        for table, rows in player1_groups:
+            player1_moves[rows] = table.choose(round_index, player1_bits[rows], player2_bits[rows])
+        for table, rows in player2_groups:
+            player2_moves[rows] = table.choose(round_index, player2_bits[rows], player1_bits[rows])
+
+        outcome = player1_moves * 2 + player2_moves
+        player1_scores[round_index + 1] = player1_scores[round_index] + player1_payoffs[outcome]
+        player2_scores[round_index + 1] = player2_scores[round_index] + player2_payoffs[outcome]
+        player1_record[round_index] = player1_moves
+        player2_record[round_index] = player2_moves
+
+        player1_bits = ((player1_bits << 1) | player1_moves) & history_mask
+        player2_bits = ((player2_bits << 1) | player2_moves) & history_mask
+
+    if simulated < rounds:
+        # 第 simulated 回合之后的每一回合与上一个周期中对应的回合相同：
+        # 第 t 回合对应第 start + (t - start) % period 回合，start = simulated - period
+        columns = np.arange(pairing_count)
+        start = simulated - period
+        offsets = np.arange(1, rounds - simulated + 1)[:, None]
+        cycles, remainder = np.divmod(offsets, period)
+        for scores in (player1_scores, player2_scores):
+            cycle_total = scores[simulated] - scores[start, columns]
+            scores[simulated + 1:] = (
+                scores[simulated] + cycles * cycle_total
+                + scores[start + remainder, columns] - scores[start, columns]
+            )
+        if record_moves:
+            source = start + (offsets - 1) % period
+            player1_record[simulated:] = player1_record[source, columns]
+            player2_record[simulated:] = player2_record[source, columns]
+
+    if record_moves:
+        return player1_scores, player2_scores, player1_record, player2_record
+    return player1_scores, player2_scores
+
+
+def play_matches(matches, payoff_matrix, record_moves=False):
+    """
+    计算一批比赛的得分
+
+    参数:
+        matches: (玩家1策略ID, 玩家2策略ID, 回合数) 的列表
+        payoff_matrix: 收益矩阵字典
+        record_moves: 是否同时返回双方按位压缩的选择序列（与 engine.pack_moves 格式相同）
+
+    返回:
+        与 matches 顺序对应的 (玩家1得分, 玩家2得分) 列表；record_moves 为 True 时
+        每项为 (玩家1得分, 玩家2得分, 玩家1压缩选择, 玩家2压缩选择)
+    """
+    if not matches:
+        return []
+
+    pairing_index = {}
+    for strategy1_id, strategy2_id, _ in matches:
+        pairing_index.setdefault((strategy1_id, strategy2_id), len(pairing_index))
+
+    max_rounds = max(rounds for _, _, rounds in matches)
+    simulation = play_pairings(list(pairing_index), max_rounds, payoff_matrix, record_moves=record_moves)
+    player1_scores, player2_scores = simulation[:2]
+
+    columns = np.array([pairing_index[(s1, s2)] for s1, s2, _ in matches], dtype=np.intp)
+    rows = np.array([rounds for _, _, rounds in matches], dtype=np.intp)
+    scores = zip(player1_scores[rows, columns].tolist(), player2_scores[rows, columns].tolist())
+    if not record_moves:
+        return list(scores)
+
+    # 同一对阵、相同回合数的重复比赛共用压缩结果
+    player1_record, player2_record = simulation[2:]
+    packed = {}
+    results = []
+    for column, rounds, (score1, score2) in zip(columns.tolist(), rows.tolist(), scores):
+        key = (column, rounds)
+        if key not in packed:
+            packed[key] = (
+                np.packbits(player1_record[:rounds, column]).tobytes(),
+                np.packbits(player2_record[:rounds, column]).tobytes(),
+            )
+        results.append((score1, score2) + packed[key])
+    return results
@@ -2,16 +2,19 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, CreateView, UpdateView, DetailView
+from django.core.paginator import Paginator
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.conf import settings
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
-from .models import Strategy, Game, Round, Tournament, TournamentParticipant, TournamentMatch
-from .services import GameService, TournamentService
-from .serializers import StrategySerializer, GameSerializer, TournamentSerializer
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from .models import Strategy, Game, Round, Tournament, TournamentParticipant, TournamentMatch, TournamentJob
+from .services import GameService, LeaderboardService, TournamentService, TournamentJobService
+from .serializers import StrategySerializer, GameSerializer, TournamentSerializer, TournamentMatchListSerializer
 from django.db import connection
 from django.db import models
 from django.http import JsonResponse
@@ -21,26 +24,18 @@ import json
 import random
 import math
 import time
-import numpy as np
 from collections import defaultdict
 import logging
 # 导入策略模块
 from .strategies import get_all_strategies
+from . import arrow_export, charts, exports
 from rest_framework import serializers
-import matplotlib
-matplotlib.use('Agg')  # 设置为非交互式后端
-import matplotlib.pyplot as plt
-# 设置matplotlib中文字体支持
-import matplotlib
-matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'Microsoft YaHei', 'Heiti TC', 'sans-serif']  # 用来正常显示中文标签
-matplotlib.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
 
-import io
-import pickle
 import os
-from django.http import HttpResponse
-from matplotlib.colors import LinearSegmentedColormap
-import csv
+import tempfile
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
 # 设置日志记录器
 logger = logging.getLogger(__name__)
@@ -190,9 +185,12 @@ class GameViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def play_full_game(self, request, pk=None):
         game = self.get_object()
+        # summary_only 为真时只返回最终得分，不写入每回合记录
+        summary_only = str(request.data.get('summary_only', '')).lower() in ('1', 'true', 'yes')
         try:
-            while game.current_round < game.total_rounds:
-                GameService.play_round(game)
+            GameService.play_remaining_rounds(game, summary_only=summary_only)
+            if summary_only:
+                return Response(GameService.get_game_summary(game))
             serializer = self.get_serializer(game)
             return Response(serializer.data)
         except ValueError as e:
@@ -364,67 +362,46 @@ def delete_game(request, pk):
     
     return redirect('game_detail', pk=game.id)
 
+def leaderboard_page_size():
+    return getattr(settings, 'LEADERBOARD_PAGE_SIZE', 50)
+
 @login_required
 def leaderboard(request):
-    strategies = Strategy.objects.all()
-    strategy_stats = []
-    
-    for strategy in strategies:
-        games_as_p1 = Game.objects.filter(strategy1=strategy, status='COMPLETED')
-        games_as_p2 = Game.objects.filter(strategy2=strategy, status='COMPLETED')
-        
-        total_score = sum(g.player1_score for g in games_as_p1) + sum(g.player2_score for g in games_as_p2)
-        total_games = games_as_p1.count() + games_as_p2.count()
-        
-        if total_games > 0:
-            avg_score = total_score / total_games
-        else:
-            avg_score = 0
-            
-        strategy_stats.append({
-            'strategy': strategy,
-            'total_games': total_games,
-            'total_score': total_score,
-            'avg_score': avg_score
-        })
-    
-    strategy_stats.sort(key=lambda x: x['avg_score'], reverse=True)
+    # 排行榜数据在游戏完成时增量更新，每页只需一次查询
+    paginator = Paginator(LeaderboardService.ranking(), leaderboard_page_size())
+    page = paginator.get_page(request.GET.get('page'))
     
     return render(request, 'dilemma_game/leaderboard.html', {
-        'strategy_stats': strategy_stats
+        'strategy_stats': page.object_list,
+        'page_obj': page,
     })
 
+class LeaderboardPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_page_size(self, request):
+        self.page_size = leaderboard_page_size()
+        return super().get_page_size(request)
+
 # API视图
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def api_leaderboard(request):
-    strategies = Strategy.objects.all()
-    strategy_stats = []
-    
-    for strategy in strategies:
-        games_as_p1 = Game.objects.filter(strategy1=strategy, status='COMPLETED')
-        games_as_p2 = Game.objects.filter(strategy2=strategy, status='COMPLETED')
-        
-        total_score = sum(g.player1_score for g in games_as_p1) + sum(g.player2_score for g in games_as_p2)
-        total_games = games_as_p1.count() + games_as_p2.count()
-        
-        if total_games > 0:
-            avg_score = total_score / total_games
-        else:
-            avg_score = 0
-            
-        strategy_stats.append({
-            'strategy_id': strategy.id,
-            'strategy_name': strategy.name,
-            'created_by': strategy.created_by.username,
-            'total_games': total_games,
-            'total_score': total_score,
-            'avg_score': avg_score
-        })
-    
-    strategy_stats.sort(key=lambda x: x['avg_score'], reverse=True)
-    
-    return Response(strategy_stats)
+    """分页返回排行榜：{count, next, previous, results}，支持 page 和 page_size 参数"""
+    paginator = LeaderboardPagination()
+    page = paginator.paginate_queryset(LeaderboardService.ranking(), request)
+    
+    strategy_stats = [{
+        'strategy_id': stat.id,
+        'strategy_name': stat.name,
+        'created_by': stat.created_by.username,
+        'total_games': stat.total_games,
+        'total_score': stat.total_score,
+        'avg_score': stat.avg_score
+    } for stat in page]
+    
+    return paginator.get_paginated_response(strategy_stats)
 
 # 添加预设策略的API
 @api_view(['GET'])
@@ -509,6 +486,13 @@ def register_user(request):
 
 # 添加锦标赛相关视图
 
+class MatchCursorPagination(CursorPagination):
+    """比赛列表的游标分页：按ID翻页（WHERE id > 游标），翻到多深都不需要 OFFSET 扫描"""
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
 class TournamentViewSet(viewsets.ModelViewSet):
     """
     锦标赛API视图集
@@ -517,7 +501,11 @@ class TournamentViewSet(viewsets.ModelViewSet):
     serializer_class = TournamentSerializer
     
     def get_queryset(self):
-        return Tournament.objects.all().order_by('-created_at')
+        queryset = Tournament.objects.all().order_by('-created_at')
+        if self.action in ('list', 'retrieve'):
+            # 返回完整序列化数据时预先加载参赛者和比赛，查询次数与锦标赛数量无关
+            queryset = TournamentSerializer.setup_eager_loading(queryset)
+        return queryset
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -581,6 +569,8 @@ class TournamentViewSet(viewsets.ModelViewSet):
         if use_probability_model:
             # 概率模型设置
             continue_probability = float(request.data.get('continue_probability', 0.95))
+            # 可选：精确计算能表示为有限状态机的对阵的期望得分
+            use_expected_payoffs = bool(request.data.get('use_expected_payoffs', False))
             # 设置默认值，但在概率模型下不会使用
             rounds_per_match = 200
             min_rounds = 100
@@ -592,6 +582,7 @@ class TournamentViewSet(viewsets.ModelViewSet):
             # 设置默认值，但在随机模式下不会使用
             rounds_per_match = 200
             continue_probability = 0.95
+            use_expected_payoffs = False
         else:
             # 固定回合数设置
             rounds_per_match = int(request.data.get('rounds_per_match', 200))
@@ -599,9 +590,15 @@ class TournamentViewSet(viewsets.ModelViewSet):
             min_rounds = 100
             max_rounds = 300
             continue_probability = 0.95
+            use_expected_payoffs = False
             
         repetitions = int(request.data.get('repetitions', 5))
         
+        # 可选的随机种子和并行进程数量
+        seed = request.data.get('seed')
+        seed = int(seed) if seed not in (None, '') else None
+        workers = int(request.data.get('workers', 1))
+        
         # 检查自定义收益矩阵
         payoff_matrix = None
         if 'payoff_matrix' in request.data:
@@ -623,7 +620,10 @@ class TournamentViewSet(viewsets.ModelViewSet):
                 min_rounds=min_rounds,
                 max_rounds=max_rounds,
                 use_probability_model=use_probability_model,
-                continue_probability=continue_probability
+                continue_probability=continue_probability,
+                use_expected_payoffs=use_expected_payoffs,
+                seed=seed,
+                workers=workers
             )
             
             return Response({
@@ -661,7 +661,7 @@ class TournamentViewSet(viewsets.ModelViewSet):
     def get_participants(self, request, pk=None):
         """获取锦标赛的所有参赛者"""
         tournament = self.get_object()
-        participants = TournamentParticipant.objects.filter(tournament=tournament)
+        participants = TournamentParticipant.objects.filter(tournament=tournament).select_related('strategy').order_by('id')
         
         result = []
         for p in participants:
@@ -679,13 +679,54 @@ class TournamentViewSet(viewsets.ModelViewSet):
         
         return Response(result)
     
+    @action(detail=True, methods=['get'])
+    def matches(self, request, pk=None):
+        """
+        分页列出锦标赛的比赛，按ID排序，使用游标（keyset）分页
+        
+        查询参数:
+            participant: 参赛者ID，只返回该参赛者参加的比赛
+            repetition: 重复次数
+            status: PENDING 或 COMPLETED
+            cursor / page_size: 分页参数，游标取自上一页返回的 next/previous 链接
+        """
+        tournament = self.get_object()
+        matches = TournamentSerializer.match_preview_queryset().filter(tournament=tournament)
+        
+        try:
+            participant = request.query_params.get('participant')
+            if participant:
+                participant = int(participant)
+                matches = matches.filter(Q(participant1_id=participant) | Q(participant2_id=participant))
+            repetition = request.query_params.get('repetition')
+            if repetition:
+                matches = matches.filter(repetition=int(repetition))
+        except ValueError:
+            return Response({'error': 'participant 和 repetition 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        match_status = request.query_params.get('status')
+        if match_status:
+            if match_status not in dict(TournamentMatch.MATCH_STATUS):
+                return Response(
+                    {'error': f'status 必须是 {" 或 ".join(dict(TournamentMatch.MATCH_STATUS))}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            matches = matches.filter(status=match_status)
+        
+        paginator = MatchCursorPagination()
+        page = paginator.paginate_queryset(matches, request, view=self)
+        return paginator.get_paginated_response(TournamentMatchListSerializer(page, many=True).data)
+    
     @action(detail=True, methods=['post'])
     def start_tournament(self, request, pk=None):
         """开始锦标赛，生成所有比赛"""
         tournament = self.get_object()
         
+        # completed_only 为真时直接执行所有比赛，只写入已完成的结果
+        completed_only = str(request.data.get('completed_only', '')).lower() in ('1', 'true', 'yes')
+        
         try:
-            matches = TournamentService.generate_matches(tournament)
+            matches = TournamentService.generate_matches(tournament, completed_only=completed_only)
             
             return Response({
                 'tournament_id': tournament.id,
@@ -699,18 +740,22 @@ class TournamentViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def run_tournament(self, request, pk=None):
-        """运行整个锦标赛，执行所有比赛"""
+        """把锦标赛加入后台运行队列，立即返回任务ID，进度通过 /api/jobs/<job_id>/ 查询"""
         tournament = self.get_object()
         
         try:
-            results = TournamentService.run_tournament(tournament)
+            # 可以在请求中临时指定并行进程数量，否则使用锦标赛的设置
+            workers = request.data.get('workers')
+            workers = int(workers) if workers not in (None, '') else None
+            job = TournamentJobService.enqueue(tournament, workers=workers)
             
             return Response({
                 'tournament_id': tournament.id,
                 'status': tournament.status,
-                'message': 'Tournament completed successfully',
-                'results': results
-            })
+                'job_id': job.id,
+                'job_status': job.status,
+                'message': 'Tournament queued successfully'
+            }, status=status.HTTP_202_ACCEPTED)
         
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -938,8 +983,8 @@ def tournament_run(request, pk):
     tournament = get_object_or_404(Tournament, pk=pk)
     
     try:
-        TournamentService.run_tournament(tournament)
-        messages.success(request, 'Tournament completed successfully!')
+        job = TournamentJobService.enqueue(tournament)
+        messages.success(request, f'Tournament queued (job #{job.id}), results will appear when it completes.')
     except Exception as e:
         messages.error(request, f'Error running tournament: {str(e)}')
     
@@ -1019,6 +1064,14 @@ def tournament_results(request, tournament_id):
     }
     return render(request, 'dilemma_game/tournament_results.html', context)
 
+# 锦标赛后台任务进度API
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def tournament_job_progress(request, job_id):
+    """返回锦标赛运行任务的状态、已完成/总比赛数和预计剩余时间"""
+    job = get_object_or_404(TournamentJob, pk=job_id)
+    return Response(TournamentJobService.job_progress(job))
+
 # 添加专门的API视图函数获取锦标赛详情
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -1027,11 +1080,11 @@ def tournament_detail_api(request, pk):
     获取单个锦标赛的详细信息，包含完整的参赛者和比赛数据
     """
     try:
-        tournament = get_object_or_404(Tournament, pk=pk)
+        tournament = get_object_or_404(TournamentSerializer.setup_eager_loading(Tournament.objects.all()), pk=pk)
         
         # 获取参赛者信息
         participants = []
-        for p in TournamentParticipant.objects.filter(tournament=tournament):
+        for p in tournament.participants.all():
             try:
                 participants.append({
                     'id': p.id,
@@ -1052,7 +1105,7 @@ def tournament_detail_api(request, pk):
         
         # 获取比赛信息
         matches = []
-        for m in TournamentMatch.objects.filter(tournament=tournament)[:10]:
+        for m in tournament.preview_matches:
             try:
                 matches.append({
                     'id': m.id,
@@ -1085,6 +1138,7 @@ def tournament_detail_api(request, pk):
             'max_rounds': tournament.max_rounds,
             'use_probability_model': tournament.use_probability_model,
             'continue_probability': tournament.continue_probability,
+            'use_expected_payoffs': tournament.use_expected_payoffs,
             'repetitions': tournament.repetitions,
             'status': tournament.status,
             'created_at': tournament.created_at,
@@ -1295,91 +1349,47 @@ def visualize_q_learning_results(request, tournament_id):
     
     return render(request, 'dilemma_game/q_learning_results.html', context)
 
-def q_learning_curve(request, tournament_id):
+def chart_response(request, chart, tournament_id):
     """
-    生成Q-learning策略的学习曲线图
+    返回缓存的图表PNG，带 ETag/Last-Modified，浏览器重新验证时未变化则返回304
     
     参数:
         request: HTTP请求对象
+        chart: 图表名称（charts.CHARTS 的键）
         tournament_id: 锦标赛ID
     """
-    try:
-        tournament = Tournament.objects.get(id=tournament_id)
-    except Tournament.DoesNotExist:
-        return HttpResponse("锦标赛不存在", status=404)
-    
-    # 查找使用Q-learning策略的参与者
-    try:
-        q_learning_strategy = Strategy.objects.get(preset_id='q_learning')
-        q_learning_participant = TournamentParticipant.objects.get(
-            tournament=tournament,
-            strategy=q_learning_strategy
+    version = charts.chart_version(chart, tournament_id)
+    if version is not None:
+        etag = charts.chart_etag(chart, tournament_id, version)
+        last_modified = charts.chart_last_modified(version)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified.timestamp())
         )
-    except (Strategy.DoesNotExist, TournamentParticipant.DoesNotExist):
-        return HttpResponse("该锦标赛中没有Q-learning策略参与者", status=404)
-    
-    # 尝试加载特定锦标赛的学习数据
-    model_dir = os.path.join('models')
-    base_filename = 'q_learning_model.pkl'
-    tournament_filename = f'q_learning_model_tournament_{tournament_id}.pkl'
-    model_path = os.path.join(model_dir, tournament_filename)
-    
-    # 如果锦标赛特定的模型文件不存在，尝试使用全局模型文件
-    if not os.path.exists(model_path):
-        model_path = os.path.join(model_dir, base_filename)
-        if not os.path.exists(model_path):
-            return HttpResponse("找不到Q-Learning模型文件", status=404)
+        if not_modified is not None:
+            return not_modified
     
     try:
-        with open(model_path, 'rb') as f:
-            data = pickle.load(f)
-        
-        # 检查数据结构，提取学习曲线数据
-        if isinstance(data, dict) and 'learning_curve' in data:
-            learning_curve = data['learning_curve']
-        else:
-            # 旧模型文件可能只包含Q表，创建模拟的学习曲线
-            learning_curve = [3.0] * 10  # 占位数据
-    except Exception as e:
-        return HttpResponse(f"无法读取模型文件: {str(e)}", status=500)
-    
-    if not learning_curve:
-        return HttpResponse("学习曲线数据为空", status=404)
-    
-    # 创建学习曲线数据
-    rounds = list(range(1, len(learning_curve) + 1))
-    scores = learning_curve
+        png = charts.get_chart(chart, tournament_id, version)
+    except charts.ChartUnavailable as e:
+        return HttpResponse(str(e), status=e.status)
+    
+    response = HttpResponse(png, content_type='image/png')
+    if version is not None:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+        # 每次使用前向服务器重新验证，模型更新后立即看到新图表
+        response['Cache-Control'] = 'no-cache'
+    return response
+
+def q_learning_curve(request, tournament_id):
+    """
+    生成Q-learning策略的学习曲线图
     
-    # 计算移动平均分数，窗口大小为5
-    window_size = min(5, len(scores))
-    if window_size > 0:
-        moving_avg = np.convolve(scores, np.ones(window_size)/window_size, mode='valid')
-        moving_avg_rounds = rounds[window_size-1:]
-    else:
-        moving_avg = []
-        moving_avg_rounds = []
-    
-    # 生成图表
-    plt.figure(figsize=(10, 6))
-    plt.plot(rounds, scores, 'o-', alpha=0.7, label='每场比赛得分')
-    
-    if len(moving_avg) > 1:
-        plt.plot(moving_avg_rounds, moving_avg, 'r-', linewidth=2, label='移动平均')
-    
-    plt.title(f'锦标赛 #{tournament_id} Q-learning策略学习曲线', fontsize=14)
-    plt.xlabel('回合数', fontsize=12)
-    plt.ylabel('得分', fontsize=12)
-    plt.grid(True, alpha=0.3)
-    plt.legend()
-    
-    # 保存图表到内存
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=80)
-    buffer.seek(0)
-    plt.close()
-    
-    # 返回图表
-    return HttpResponse(buffer.getvalue(), content_type='image/png')
+    参数:
+        request: HTTP请求对象
+        tournament_id: 锦标赛ID
+    """
+    return chart_response(request, 'curve', tournament_id)
 
 def q_value_heatmap(request, tournament_id):
     """
@@ -1389,90 +1399,7 @@ def q_value_heatmap(request, tournament_id):
         request: HTTP请求对象
         tournament_id: 锦标赛ID
     """
-    # 尝试加载特定锦标赛的Q表
-    model_dir = os.path.join('models')
-    base_filename = 'q_learning_model.pkl'
-    tournament_filename = f'q_learning_model_tournament_{tournament_id}.pkl'
-    model_path = os.path.join(model_dir, tournament_filename)
-    
-    # 如果锦标赛特定的模型文件不存在，尝试使用全局模型文件
-    if not os.path.exists(model_path):
-        model_path = os.path.join(model_dir, base_filename)
-        if not os.path.exists(model_path):
-            return HttpResponse("找不到Q表文件", status=404)
-    
-    try:
-        with open(model_path, 'rb') as f:
-            data = pickle.load(f)
-        
-        # 检查数据结构，提取Q表
-        if isinstance(data, dict) and 'q_table' in data:
-            q_table = data['q_table']
-        else:
-            # 旧模型文件可能直接是Q表
-            q_table = data
-    except Exception as e:
-        return HttpResponse(f"无法加载Q表: {str(e)}", status=500)
-    
-    if not q_table:
-        return HttpResponse("Q表为空", status=404)
-    
-    # 筛选出有意义的状态（例如，排除全N的状态）
-    meaningful_states = [state for state in q_table.keys() if 'N' not in state or (state.count('N') < len(state))]
-    
-    # 如果状态太多，只选择前20个
-    if len(meaningful_states) > 20:
-        meaningful_states = sorted(meaningful_states)[:20]
-    
-    # 生成热力图数据
-    q_values_c = [q_table[state]['C'] for state in meaningful_states]
-    q_values_d = [q_table[state]['D'] for state in meaningful_states]
-    
-    # 计算热力图的值范围
-    min_q = min(min(q_values_c), min(q_values_d))
-    max_q = max(max(q_values_c), max(q_values_d))
-    
-    # 创建热力图
-    fig, ax = plt.subplots(figsize=(12, 8))
-    
-    # 创建数据矩阵
-    data = np.array([q_values_c, q_values_d])
-    
-    # 定义自定义颜色映射：负值为红色，正值为绿色，零值为白色
-    cmap = LinearSegmentedColormap.from_list(
-        'RdWtGn', [(0.8, 0, 0), (1, 1, 1), (0, 0.8, 0)], N=100
-    )
-    
-    # 绘制热力图
-    im = ax.imshow(data, cmap=cmap, aspect='auto', vmin=min_q, vmax=max_q)
-    
-    # 添加颜色条
-    cbar = plt.colorbar(im, ax=ax)
-    cbar.set_label('Q值', fontsize=12)
-    
-    # 添加标签
-    ax.set_yticks([0, 1])
-    ax.set_yticklabels(['合作', '背叛'])
-    ax.set_xticks(range(len(meaningful_states)))
-    ax.set_xticklabels(meaningful_states, rotation=90)
-    
-    # 在每个单元格中显示Q值
-    for i in range(2):
-        for j in range(len(meaningful_states)):
-            text = ax.text(j, i, f"{data[i, j]:.2f}",
-                          ha="center", va="center", color="black", fontsize=8)
-    
-    plt.title(f'锦标赛 #{tournament_id} Q-learning策略的状态-动作值热力图', fontsize=14)
-    plt.tight_layout()
-    
-    # 保存图表到内存
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=100)
-    buffer.seek(0)
-    plt.close()
-    
-    # 返回图表
-    return HttpResponse(buffer.getvalue(), content_type='image/png')
+    return chart_response(request, 'heatmap', tournament_id)
 
 def q_learning_vs_opponents(request, tournament_id):
     """
@@ -1482,136 +1409,16 @@ def q_learning_vs_opponents(request, tournament_id):
         request: HTTP请求对象
         tournament_id: 锦标赛ID
     """
-    try:
-        tournament = Tournament.objects.get(id=tournament_id)
-    except Tournament.DoesNotExist:
-        return HttpResponse("锦标赛不存在", status=404)
-    
-    # 查找使用Q-learning策略的参与者
-    try:
-        q_learning_strategy = Strategy.objects.get(preset_id='q_learning')
-        q_learning_participant = TournamentParticipant.objects.get(
-            tournament=tournament,
-            strategy=q_learning_strategy
-        )
-    except (Strategy.DoesNotExist, TournamentParticipant.DoesNotExist):
-        return HttpResponse("该锦标赛中没有Q-learning策略参与者", status=404)
-    
-    # 获取所有涉及Q-learning策略的比赛
-    q_learning_matches = TournamentMatch.objects.filter(
-        Q(participant1=q_learning_participant) | Q(participant2=q_learning_participant),
-        tournament=tournament,
-        status='COMPLETED'
-    )
-    
-    # 按对手分组统计比赛结果
-    opponent_results = {}
-    
-    for match in q_learning_matches:
-        if match.participant1 == q_learning_participant:
-            q_score = match.player1_score
-            opp_score = match.player2_score
-            opponent_name = match.participant2.strategy.name
-        else:
-            q_score = match.player2_score
-            opp_score = match.player1_score
-            opponent_name = match.participant1.strategy.name
-        
-        if opponent_name not in opponent_results:
-            opponent_results[opponent_name] = {
-                'q_scores': [],
-                'opp_scores': [],
-                'wins': 0,
-                'draws': 0,
-                'losses': 0
-            }
-        
-        opponent_results[opponent_name]['q_scores'].append(q_score)
-        opponent_results[opponent_name]['opp_scores'].append(opp_score)
-        
-        if q_score > opp_score:
-            opponent_results[opponent_name]['wins'] += 1
-        elif q_score < opp_score:
-            opponent_results[opponent_name]['losses'] += 1
-        else:
-            opponent_results[opponent_name]['draws'] += 1
-    
-    # 计算平均分数
-    for opponent in opponent_results:
-        opponent_results[opponent]['avg_q_score'] = sum(opponent_results[opponent]['q_scores']) / len(opponent_results[opponent]['q_scores'])
-        opponent_results[opponent]['avg_opp_score'] = sum(opponent_results[opponent]['opp_scores']) / len(opponent_results[opponent]['opp_scores'])
-    
-    # 按照Q-learning的平均分从高到低排序
-    sorted_opponents = sorted(
-        opponent_results.items(),
-        key=lambda x: x[1]['avg_q_score'],
-        reverse=True
-    )
-    
-    # 准备作图数据
-    opponents = [opp[0] for opp in sorted_opponents]
-    q_scores = [opp[1]['avg_q_score'] for opp in sorted_opponents]
-    opp_scores = [opp[1]['avg_opp_score'] for opp in sorted_opponents]
-    
-    # 准备胜负平数据
-    wins = [opp[1]['wins'] for opp in sorted_opponents]
-    draws = [opp[1]['draws'] for opp in sorted_opponents]
-    losses = [opp[1]['losses'] for opp in sorted_opponents]
-    
-    # 创建双子图
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 8))
-    
-    # 设置柱状图的宽度
-    bar_width = 0.35
-    
-    # 绘制平均得分对比
-    x = np.arange(len(opponents))
-    ax1.bar(x - bar_width/2, q_scores, bar_width, label='Q-learning', color='royalblue')
-    ax1.bar(x + bar_width/2, opp_scores, bar_width, label='对手', color='lightcoral')
-    
-    # 设置标题和标签
-    ax1.set_title(f'锦标赛 #{tournament_id} Q-learning与各对手平均得分对比', fontsize=14)
-    ax1.set_xlabel('对手策略', fontsize=12)
-    ax1.set_ylabel('平均得分', fontsize=12)
-    ax1.set_xticks(x)
-    ax1.set_xticklabels(opponents, rotation=45, ha='right')
-    ax1.legend()
-    ax1.grid(axis='y', alpha=0.3)
-    
-    # 绘制胜负平统计
-    bottom_draws = np.array(wins)
-    bottom_losses = bottom_draws + np.array(draws)
-    
-    ax2.bar(opponents, wins, label='胜利', color='forestgreen')
-    ax2.bar(opponents, draws, bottom=bottom_draws, label='平局', color='gold')
-    ax2.bar(opponents, losses, bottom=bottom_losses, label='失败', color='firebrick')
-    
-    # 设置标题和标签
-    ax2.set_title(f'锦标赛 #{tournament_id} Q-learning与各对手胜负平统计', fontsize=14)
-    ax2.set_xlabel('对手策略', fontsize=12)
-    ax2.set_ylabel('场次', fontsize=12)
-    ax2.set_xticklabels(opponents, rotation=45, ha='right')
-    ax2.legend()
-    
-    # 调整布局
-    plt.tight_layout()
-    
-    # 保存图表到内存
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=100)
-    buffer.seek(0)
-    plt.close()
-    
-    # 返回图表
-    return HttpResponse(buffer.getvalue(), content_type='image/png')
+    return chart_response(request, 'vs_opponents', tournament_id)
 
 @login_required
 def export_tournament_results(request, tournament_id):
     """
-    导出锦标赛结果为CSV文件
+    流式导出锦标赛的完整数据（参赛者结果和所有比赛）
     
     参数:
-        request: HTTP请求对象
+        request: HTTP请求对象，查询参数 format 为 csv（默认）或 jsonl，
+                 moves=1 时包含每场比赛双方每回合的选择
         tournament_id: 锦标赛ID
     """
     try:
@@ -1620,95 +1427,46 @@ def export_tournament_results(request, tournament_id):
         messages.error(request, "锦标赛不存在")
         return redirect('tournament_list')
     
-    # 获取参赛者数据，按排名排序
-    participants = TournamentParticipant.objects.filter(
-        tournament=tournament
-    ).order_by('rank')
-    
-    # 创建CSV响应
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="tournament_{tournament_id}_results.csv"'
-    
-    # 使用UTF-8 BOM确保Excel正确显示中文
-    response.write(u'\ufeff')
-    
-    writer = csv.writer(response)
-    # 写入标题行
-    writer.writerow(['锦标赛名称', tournament.name])
-    writer.writerow(['描述', tournament.description])
-    writer.writerow(['创建时间', tournament.created_at.strftime('%Y-%m-%d %H:%M')])
-    writer.writerow(['完成时间', tournament.completed_at.strftime('%Y-%m-%d %H:%M') if tournament.completed_at else 'N/A'])
-    writer.writerow([])  # 空行
-    
-    # 写入收益矩阵
-    writer.writerow(['收益矩阵'])
-    writer.writerow(['', '玩家2合作(C)', '玩家2背叛(D)'])
-    writer.writerow(['玩家1合作(C)', 
-                    f"{tournament.payoff_matrix['CC'][0]}, {tournament.payoff_matrix['CC'][1]}",
-                    f"{tournament.payoff_matrix['CD'][0]}, {tournament.payoff_matrix['CD'][1]}"])
-    writer.writerow(['玩家1背叛(D)', 
-                    f"{tournament.payoff_matrix['DC'][0]}, {tournament.payoff_matrix['DC'][1]}",
-                    f"{tournament.payoff_matrix['DD'][0]}, {tournament.payoff_matrix['DD'][1]}"])
-    writer.writerow([])  # 空行
-    
-    # 写入参赛者结果
-    writer.writerow(['排名', '策略名称', '总分', '平均分', '胜场数', '平局数', '负场数'])
-    for participant in participants:
-        strategy_name = participant.strategy.name.split('(')[0].strip()  # 取策略名称的第一部分
-        writer.writerow([
-            participant.rank,
-            strategy_name,
-            f"{participant.total_score:.1f}",
-            f"{participant.average_score:.2f}",
-            participant.wins,
-            participant.draws,
-            participant.losses
-        ])
-    
-    # 如果有Q-learning策略，添加Q-learning模型的简要分析
-    try:
-        q_learning_strategy = Strategy.objects.get(preset_id='q_learning')
-        q_learning_participant = TournamentParticipant.objects.filter(
-            tournament=tournament,
-            strategy=q_learning_strategy
-        ).first()
-        
-        if q_learning_participant:
-            writer.writerow([])  # 空行
-            writer.writerow(['Q-learning策略分析'])
-            writer.writerow(['排名', q_learning_participant.rank])
-            writer.writerow(['总分', f"{q_learning_participant.total_score:.1f}"])
-            writer.writerow(['平均分', f"{q_learning_participant.average_score:.2f}"])
-            writer.writerow(['胜/平/负', f"{q_learning_participant.wins}/{q_learning_participant.draws}/{q_learning_participant.losses}"])
-            
-            # 如果存在模型文件，添加一些Q值信息
-            model_path = os.path.join('models', 'q_learning_model.pkl')
-            if os.path.exists(model_path):
-                try:
-                    with open(model_path, 'rb') as f:
-                        q_table = pickle.load(f)
-                    
-                    # 选择一些典型状态的Q值
-                    typical_states = ['CCC', 'CCD', 'CDC', 'CDD', 'DCC', 'DCD', 'DDC', 'DDD']
-                    writer.writerow([])
-                    writer.writerow(['典型状态Q值'])
-                    writer.writerow(['状态', '合作(C)的Q值', '背叛(D)的Q值', '最优动作'])
-                    
-                    for state in typical_states:
-                        if state in q_table:
-                            c_value = q_table[state]['C']
-                            d_value = q_table[state]['D']
-                            best_action = 'C' if c_value > d_value else 'D'
-                            writer.writerow([state, f"{c_value:.2f}", f"{d_value:.2f}", best_action])
-                
-                except Exception as e:
-                    writer.writerow(['无法加载Q表数据', str(e)])
-    
-    except (Strategy.DoesNotExist, TournamentParticipant.DoesNotExist):
-        pass  # 没有Q-learning策略，跳过
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in exports.EXPORT_FORMATS:
+        messages.error(request, f"不支持的导出格式: {export_format}")
+        return redirect('tournament_results', tournament_id=tournament_id)
+    include_moves = request.GET.get('moves', '').lower() in ('1', 'true', 'yes')
     
+    content_type, extension = exports.EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        exports.stream_export(tournament, export_format, include_moves), content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="tournament_{tournament_id}_results.{extension}"'
     return response
 
+@login_required
+def export_tournament_table(request, tournament_id, table, extension):
+    """
+    把锦标赛的一张表（participants、matches 或 moves）导出为 Parquet 或 Arrow 文件
+    
+    文件先按批写入临时文件（Parquet 的元数据在文件末尾，不能边写边发送），再流式返回。
+    """
+    tournament = get_object_or_404(Tournament, id=tournament_id)
+    if table not in arrow_export.TABLES or extension not in arrow_export.FILE_FORMATS:
+        return JsonResponse({'error': f'不支持的导出: {table}.{extension}'}, status=404)
+    
+    output = tempfile.TemporaryFile()
+    try:
+        arrow_export.write_table(tournament, table, output, extension)
+        output.seek(0)
+    except arrow_export.ColumnarExportUnavailable as e:
+        output.close()
+        return JsonResponse({'error': str(e)}, status=501)
+    except Exception:
+        output.close()
+        raise
+    
+    content_type = 'application/vnd.apache.parquet' if extension == 'parquet' else 'application/vnd.apache.arrow.file'
+    return FileResponse(
+        output, as_attachment=True, filename=f'tournament_{tournament_id}_{table}.{extension}', content_type=content_type
+    )
+
 @login_required
 def debug_q_learning_tournament(request, tournament_id):
     """
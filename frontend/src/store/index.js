@@ -264,9 +264,10 @@ export default createStore({
         },
 
         // 排行榜
-        async fetchLeaderboard({ commit }) {
-            const response = await axios.get('leaderboard/')
-            commit('setLeaderboard', response.data)
+        // 返回分页结果 {count, next, previous, results}
+        async fetchLeaderboard({ commit }, params = {}) {
+            const response = await axios.get('leaderboard/', { params })
+            commit('setLeaderboard', response.data.results)
             return response.data
         },
 
@@ -382,9 +383,18 @@ export default createStore({
         },
 
         async runTournament({ commit }, tournamentId) {
+            // 锦标赛在后台任务中运行，轮询任务进度直到完成
             const response = await axios.post(`tournaments/${tournamentId}/run_tournament/`)
+            let job = { status: response.data.job_status }
+            while (job.status === 'QUEUED' || job.status === 'RUNNING') {
+                await new Promise(resolve => setTimeout(resolve, 1000))
+                job = (await axios.get(`jobs/${response.data.job_id}/`)).data
+            }
+            if (job.status !== 'COMPLETED') {
+                throw new Error(job.error || '锦标赛运行失败')
+            }
             commit('updateCurrentTournament', { status: 'COMPLETED' })
-            return response.data
+            return job
         },
 
         async getTournamentResults({ commit }, tournamentId) {
@@ -9,6 +9,8 @@ import pickle
 import os
 from typing import List, Dict, Tuple, Union
 
+from dilemma_game.q_table import QTable, load_q_table
+
 class QLearningStrategy:
     """
     基于Q-learning的强化学习策略。
@@ -51,8 +53,8 @@ class QLearningStrategy:
         else:
             self.save_path = save_path
         
-        # Q表: 将状态-动作对映射到Q值
-        self.q_table: Dict[str, Dict[str, float]] = {}
+        # Q表: 将状态-动作对映射到Q值（按整数状态编码索引的NumPy数组）
+        self.q_table = QTable(memory_length)
         
         # 历史记录
         self.history: List[Tuple[str, str]] = []  # (我的选择，对手的选择)
@@ -66,50 +68,38 @@ class QLearningStrategy:
         if self.save_path and os.path.exists(self.save_path):
             try:
                 with open(self.save_path, 'rb') as f:
-                    self.q_table = pickle.load(f)
+                    # 兼容以字典保存Q表的旧模型文件
+                    self.q_table = load_q_table(pickle.load(f), memory_length)
                 print(f"已加载Q表 {self.save_path}，包含{len(self.q_table)}个状态")
             except Exception as e:
                 print(f"加载Q表失败: {e}")
     
-    def get_state(self, opponent_history: List[str]) -> str:
+    def get_state(self, opponent_history: List[str]) -> int:
         """
-        根据对手历史选择生成当前状态的字符串表示。
+        根据对手最近memory_length个选择生成当前状态的整数编码。
         
         参数:
             opponent_history: 对手的历史选择列表
             
         返回:
-            代表当前状态的字符串
+            状态编码（编码方式见 dilemma_game/q_table.py）
         """
-        # 如果对手历史不足memory_length，用'N'（None）填充
-        if len(opponent_history) < self.memory_length:
-            padded_history = ['N'] * (self.memory_length - len(opponent_history)) + opponent_history
-        else:
-            # 只取最近的memory_length个选择
-            padded_history = opponent_history[-self.memory_length:]
-        
-        # 生成状态字符串
-        return ''.join(padded_history)
+        return self.q_table.encode(opponent_history)
     
-    def get_q_values(self, state: str) -> Dict[str, float]:
+    def get_q_values(self, state: int) -> Dict[str, float]:
         """
-        获取指定状态的Q值。如果状态不存在，则初始化。
+        获取指定状态的Q值。未访问过的状态Q值为0。
         
         参数:
-            state: 状态字符串
+            state: 状态编码
             
         返回:
             状态对应的动作-值字典
         """
-        if state not in self.q_table:
-            # 初始化新状态的Q值
-            self.q_table[state] = {
-                'C': 0.0,  # 合作的初始Q值
-                'D': 0.0   # 欺骗的初始Q值
-            }
-        return self.q_table[state]
+        q_cooperate, q_defect = self.q_table.q_values(state)
+        return {'C': q_cooperate, 'D': q_defect}
     
-    def choose_action(self, state: str) -> str:
+    def choose_action(self, state: int) -> str:
         """
         根据当前状态选择动作（合作或欺骗）。
         使用ε-贪心策略平衡探索与利用。
@@ -125,16 +115,16 @@ class QLearningStrategy:
             return random.choice(['C', 'D'])
         
         # 利用：选择Q值最高的动作
-        q_values = self.get_q_values(state)
+        q_cooperate, q_defect = self.q_table.q_values(state)
         
         # 如果两个动作的Q值相同，随机选择
-        if q_values['C'] == q_values['D']:
+        if q_cooperate == q_defect:
             return random.choice(['C', 'D'])
         
         # 选择Q值最高的动作
-        return 'C' if q_values['C'] > q_values['D'] else 'D'
+        return 'C' if q_cooperate > q_defect else 'D'
     
-    def update_q_value(self, state: str, action: str, reward: float, next_state: str):
+    def update_q_value(self, state: int, action: str, reward: float, next_state: int):
         """
         更新Q表中的Q值。
         使用Q-learning更新公式: Q(s,a) ← Q(s,a) + α[r + γ·max_a'Q(s',a') - Q(s,a)]
@@ -145,19 +135,7 @@ class QLearningStrategy:
             reward: 获得的奖励
             next_state: 执行动作后的新状态
         """
-        # 获取当前状态-动作的Q值
-        q_values = self.get_q_values(state)
-        current_q = q_values[action]
-        
-        # 获取下一状态的最大Q值
-        next_q_values = self.get_q_values(next_state)
-        max_next_q = max(next_q_values.values())
-        
-        # 计算新的Q值
-        new_q = current_q + self.learning_rate * (reward + self.discount_factor * max_next_q - current_q)
-        
-        # 更新Q表
-        self.q_table[state][action] = new_q
+        self.q_table.update(state, action, reward, next_state, self.learning_rate, self.discount_factor)
     
     def get_reward(self, my_choice: str, opponent_choice: str) -> float:
         """
@@ -241,7 +219,7 @@ class QLearningStrategy:
                 
                 # 创建要保存的数据，包括Q表和学习曲线
                 save_data = {
-                    'q_table': self.q_table,
+                    'q_table': self.q_table.to_data(),
                     'learning_curve': self.learning_curve,
                     'tournament_id': self.tournament_id,
                     'history': self.history
@@ -297,7 +275,7 @@ def make_move(opponent_history, tournament_id=None):
         'C'表示合作，'D'表示欺骗
     """
     # 获取或创建全局QLearningStrategy实例
-    global ql_strategy
+    global ql_strategy, last_history_length
     if 'ql_strategy' not in globals() or (tournament_id is not None and getattr(ql_strategy, 'tournament_id', None) != tournament_id):
         save_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
         os.makedirs(save_dir, exist_ok=True)
@@ -311,7 +289,6 @@ def make_move(opponent_history, tournament_id=None):
             ql_strategy.update_opponent_action(new_opponent_action)
     
     # 记录当前历史长度
-    global last_history_length
     last_history_length = len(opponent_history)
     
     # 做出决策
@@ -350,7 +327,7 @@ if __name__ == "__main__":
     # 打印部分Q表
     print("\n部分Q表:")
     count = 0
-    for state, actions in ql.q_table.items():
+    for state, actions in ql.q_table.to_dict().items():
         print(f"状态 {state}: {actions}")
         count += 1
         if count >= 10:  # 只显示前10个状态